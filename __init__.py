@@ -1,9 +1,22 @@
 import os
 import sys
+import time
+
+register_start = time.perf_counter()
 
 ap_dir = os.path.dirname(os.path.abspath(__file__))
 if ap_dir not in sys.path:
     sys.path.insert(0, ap_dir)
 
 from laser_action import Laser
-Laser().register()
\ No newline at end of file
+from core.settings import PluginConfig
+from core.startup import IMPORT_TIMES, schedule_warm_up
+
+Laser().register()
+# Время регистрации попадает в .metrics.json вместе с остальными замерами импорта
+IMPORT_TIMES["register"] = time.perf_counter() - register_start
+
+startup_config = PluginConfig()
+startup_config.load_config()
+if startup_config.warm_up_imports:
+    schedule_warm_up()
@@ -0,0 +1,335 @@
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+from shapely import (MultiPolygon, LineString, Point, Polygon, area, box, convex_hull, get_num_coordinates,
+                     get_num_interior_rings, get_parts, length, unary_union)
+from shapely.affinity import rotate, translate
+
+from core.geometry import GeometryTool
+from core.primitives import PrimitiveInset
+
+COST_MODEL_FILE = os.path.join(os.path.dirname(__file__), "cost_model.json")
+# Границы гистограммы числа вершин фигур
+VERTEX_BINS = (0, 8, 32, 128, 512, 2048, 8192, math.inf)
+# Порог предсказанного времени отступов, после которого включаются потоки (с на поток)
+WORKER_TIME = 0.5
+
+ENGINES = ("primitive", "buffer", "tiled", "raster")
+
+
+class CostModel:
+    """
+    Модель времени колец одной фигуры: отступы движка c + a * W и сортировка колец c + s * L ** 2 * V,
+    где V - число вершин фигуры, L - оценка числа уровней отступа, W = L * V ** p
+    (для тайлов - по вершинам одного тайла, для растра - число пикселей).
+    Коэффициенты хранятся в JSON и подбираются калибровкой (python -m core.autotune calibrate).
+    """
+
+    def __init__(self, coefficients):
+        self.coefficients = coefficients
+
+    @classmethod
+    def load(cls, filename=COST_MODEL_FILE):
+        with open(filename, "r") as f:
+            return cls(json.load(f))
+
+    def save(self, filename=COST_MODEL_FILE):
+        with open(filename, "w") as f:
+            json.dump(self.coefficients, f, indent=4)
+
+    @staticmethod
+    def get_terms(engine, features, p=1.0):
+        """Слагаемые модели (N x 2) для массивов признаков"""
+        vertices, levels = features["vertices"], features["levels"]
+        if engine == "sort":
+            work = levels ** 2 * vertices
+        elif engine == "raster":
+            work = features["pixels"]
+        elif engine == "tiled":
+            # Тайлы режут фигуру на части, степень применяется к вершинам одной части
+            tiles = features["tiles"]
+            work = levels * tiles * (vertices / tiles) ** p
+        else:
+            work = levels * vertices ** p
+        return np.column_stack((np.ones_like(vertices), work))
+
+    def predict_part(self, engine, features):
+        coefficients = self.coefficients.get(engine)
+        if coefficients is None:
+            return np.full(len(features["vertices"]), np.inf)
+        terms = self.get_terms(engine, features, coefficients.get("p", 1.0))
+        return terms @ np.array((coefficients["c"], coefficients["a"]))
+
+    def predict(self, engine, features):
+        """Предсказанное время (с) отступов и сортировки для каждой фигуры; inf, где движок неприменим"""
+        cost = self.predict_part(engine, features)
+        if "sort" in self.coefficients:
+            cost = cost + self.predict_part("sort", features)
+        if engine == "primitive":
+            cost[~features["convex"]] = np.inf
+        elif engine == "tiled":
+            cost[features["tiles"] < 2] = np.inf
+        return cost
+
+    @classmethod
+    def fit(cls, engine, features, times):
+        """
+        Коэффициенты по замерам: перебор степени p и наименьшие квадраты с весами 1 / время,
+        то есть по относительной ошибке, чтобы мелкие фигуры не терялись на фоне крупных
+        """
+        best = None
+        weights = 1 / np.maximum(times, 1e-6)
+        for p in (np.arange(0.8, 1.61, 0.05) if engine in ("buffer", "tiled") else (1.0,)):
+            terms = cls.get_terms(engine, features, p) * weights[:, np.newaxis]
+            solution, *_ = np.linalg.lstsq(terms, times * weights, rcond=None)
+            solution = np.maximum(solution, 0)
+            error = np.sum((terms @ solution - times * weights) ** 2)
+            if best is None or error < best[0]:
+                best = (error, p, solution)
+        _, p, (c, a) = best
+        return {"c": float(c), "a": float(a), "p": float(p)}
+
+
+class AutoTune:
+    """
+    Автовыбор числа потоков по статистике платы после извлечения. Движок каждой фигуры тот же,
+    что выберет Pipeline по настройкам (аналитический для выпуклых, buffer, тайлы, растр), модель
+    предсказывает время этих движков; по сумме выбирается число потоков. Результат от потоков
+    не зависит. Предсказанное и фактическое время пишутся в метрики и журнал для уточнения модели.
+    """
+
+    def __init__(self, config, model=None):
+        self.config = config
+        self.model = model or CostModel.load()
+        self.step = config.laser_beam_wide
+        self.tile_size = config.inset_tile_mm * 1000000
+        self.pixel = config.round_um * 1000 * max(1, config.raster_scale)
+        self.workers = config.workers
+        self.decisions = {}
+        self.predicted = {}
+
+    def get_features(self, figures):
+        """Признаки фигур для модели, векторно по массиву фигур"""
+        figures = np.asarray(figures)
+        figure_area = area(figures)
+        figure_length = length(figures)
+        bounds = np.array([figure.bounds for figure in figures]).reshape(-1, 4)
+        size = np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])
+        # Ширина по площади и периметру: точная для полосок, для круга дает радиус
+        width = 2 * figure_area / np.maximum(figure_length, 1)
+        tiles = np.ones(len(figures))
+        if self.tile_size:
+            tiles = np.where(size > 2 * self.tile_size, np.ceil(size / self.tile_size) ** 2, 1)
+        return {
+            "vertices": get_num_coordinates(figures).astype(float),
+            "levels": np.maximum(np.ceil(width / 2 / self.step), 1),
+            "area": figure_area,
+            "width": width,
+            "pixels": (bounds[:, 2] - bounds[:, 0]) * (bounds[:, 3] - bounds[:, 1]) / self.pixel ** 2,
+            "tiles": tiles,
+            "convex": (get_num_interior_rings(figures) == 0) &
+                      (area(convex_hull(figures)) <= figure_area * (1 + 1e-9)),
+        }
+
+    def get_engines(self, features):
+        """Движок каждой фигуры по настройкам, как Pipeline.choose_engine: индексы в ENGINES"""
+        config = self.config
+        if config.inset_engine:
+            return np.full(len(features["vertices"]), ENGINES.index("raster"))
+        engines = np.where(features["tiles"] >= 2, ENGINES.index("tiled"), ENGINES.index("buffer"))
+        if config.primitive_insets:
+            engines[features["convex"]] = ENGINES.index("primitive")
+        return engines
+
+    def predict(self, features):
+        """Предсказанное время каждой фигуры (с) на ее движке и индексы движков"""
+        engines = self.get_engines(features)
+        costs = np.zeros(len(engines))
+        for index in np.unique(engines):
+            selected = engines == index
+            costs[selected] = self.model.predict(ENGINES[index], {key: value[selected]
+                                                                 for key, value in features.items()})
+        return costs, engines
+
+    def get_stats(self, geom, item_count=None):
+        """Дешевая статистика слоя: числа объектов и фигур, гистограмма вершин, площади и ширины"""
+        figures = get_parts(geom)
+        features = self.get_features(figures)
+        histogram, _ = np.histogram(features["vertices"], bins=VERTEX_BINS)
+        stats = {
+            "items": item_count,
+            "figures": len(figures),
+            "vertices": int(features["vertices"].sum()),
+            "vertex_histogram": {f"<{edge}": int(count) for edge, count in zip(VERTEX_BINS[1:], histogram)},
+            "convex": int(features["convex"].sum()),
+        }
+        for key in ("area", "width"):
+            if len(figures):
+                stats[f"{key}_percentiles"] = np.percentile(features[key], (10, 50, 90, 100)).round().tolist()
+        return stats, features
+
+    def plan(self, geom, item_count=None):
+        """
+        Статистика и число потоков для слоя (self.workers).
+        Возвращает строки отчета.
+        """
+        stats, features = self.get_stats(geom, item_count)
+        if not stats["figures"]:
+            return []
+        costs, engines = self.predict(features)
+        total = float(costs.sum())
+
+        cpu_count = os.cpu_count() or 1
+        workers = int(min(cpu_count, max(1, math.ceil(total / WORKER_TIME))))
+        self.workers = workers
+
+        used = np.unique(engines)
+        self.predicted = {ENGINES[index]: float(costs[engines == index].sum()) for index in used}
+        self.decisions = {
+            "stats": stats,
+            "workers": workers,
+            "engines": {ENGINES[index]: int((engines == index).sum()) for index in used},
+            "predicted_s": self.predicted,
+            "predicted_total_s": total,
+            "predicted_wall_s": total / workers,
+        }
+        return [f"Автовыбор: потоков {workers}, прогноз {total / workers:.1f} с"]
+
+    def get_metrics(self, actual):
+        """Решения с предсказанным и фактическим временем движков (с) для метрик и журнала"""
+        metrics = dict(self.decisions)
+        metrics["actual_s"] = actual
+        return metrics
+
+    def log(self, actual, filename=None):
+        """Дописывает решения и время в журнал autotune_log.jsonl рабочей директории"""
+        filename = filename or os.path.join(self.config.user_dir, "autotune_log.jsonl")
+        try:
+            with open(filename, "a") as f:
+                f.write(json.dumps(self.get_metrics(actual), ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Ошибка при записи журнала автовыбора: {e}")
+
+
+def get_synthetic_figures(count=200, seed=0, pour_size_mm=(3, 12)):
+    """
+    Набор фигур для калибровки и сравнения движков (нм): пады-прямоугольники, круги, овалы,
+    дорожки ломаными и полигоны с отверстиями размером pour_size_mm - в пропорциях, близких к реальным платам
+    """
+    rng = np.random.default_rng(seed)
+    columns = math.ceil(math.sqrt(count))
+    figures = []
+    for index in range(count):
+        kind = index % 5
+        if kind == 0:
+            figure = box(0, 0, rng.uniform(0.3e6, 2.5e6), rng.uniform(0.3e6, 2.5e6))
+            figure = rotate(figure, rng.choice((0, 45, rng.uniform(0, 90))))
+        elif kind == 1:
+            figure = Point(0, 0).buffer(rng.uniform(0.2e6, 1.5e6), 8)
+        elif kind == 2:
+            figure = LineString([(0, 0), (rng.uniform(0.2e6, 2e6), 0)]).buffer(rng.uniform(0.15e6, 0.8e6), 8)
+        elif kind == 3:
+            steps = rng.normal(0, 2e6, (int(rng.integers(3, 30)), 2))
+            figure = LineString(np.cumsum(steps, axis=0)).buffer(rng.uniform(0.1e6, 0.5e6), 8)
+        else:
+            size = rng.uniform(pour_size_mm[0] * 1e6, pour_size_mm[1] * 1e6)
+            points = rng.uniform(0, size, (int(rng.integers(5, 40)), 2))
+            figure = unary_union([Point(x, y).buffer(size / 6, 8) for x, y in points])
+            holes = [Point(x, y).buffer(0.4e6, 8) for x, y in rng.uniform(0, size, (10, 2))]
+            figure = figure.difference(unary_union(holes))
+        if isinstance(figure, MultiPolygon):
+            figure = max(figure.geoms, key=lambda geom: geom.area)
+        if isinstance(figure, Polygon) and not figure.is_empty:
+            # Сеткой с шагом 50 мм: координаты остаются в пределах int32 файла путей и для тысяч фигур
+            figures.append(translate(figure, index % columns * 50e6, index // columns * 50e6))
+    return figures
+
+
+def calibrate(config, figures, engines=ENGINES, tile_size_mm=2, sort_max_levels=40):
+    """
+    Замеры движков на фигурах и подбор коэффициентов модели: CostModel.
+    Отступы и сортировка замеряются отдельно: сортировка одинакова для всех движков и на крупных
+    полигонах квадратична, поэтому она замеряется только на фигурах до sort_max_levels уровней.
+    Тайлы при калибровке мельче рабочих, чтобы тайловый движок замерялся и на небольших полигонах.
+    """
+    tune = AutoTune(config, CostModel({}))
+    tune.tile_size = tile_size_mm * 1000000
+    features = tune.get_features(figures)
+    raster = None
+    if "raster" in engines:
+        from core.raster import RasterInset
+        raster = RasterInset
+
+    def get_inset_levels(engine, figure):
+        if engine == "raster":
+            return raster.get_inset_levels(figure, tune.step, config.min_length_um, tune.pixel)
+        if engine == "primitive":
+            return PrimitiveInset.get_inset_levels(
+                PrimitiveInset.get_vertices(figure), tune.step, config.min_length_um)
+        if engine == "tiled":
+            return GeometryTool.get_inset_levels_tiled(figure, tune.step, config.min_length_um, tune.tile_size)
+        return GeometryTool.get_inset_levels(figure, tune.step, config.min_length_um)
+
+    coefficients = {}
+    for engine in engines + ("sort",):
+        if engine == "primitive":
+            selected = np.flatnonzero(features["convex"])
+        elif engine == "tiled":
+            selected = np.flatnonzero(features["tiles"] >= 2)
+        elif engine == "sort":
+            selected = np.flatnonzero(features["levels"] <= sort_max_levels)
+        else:
+            selected = np.arange(len(figures))
+        times = []
+        for index in selected:
+            if engine == "sort":
+                inset_levels = get_inset_levels("buffer", figures[index])
+                start = time.perf_counter()
+                GeometryTool.sort_inset_levels(inset_levels, config.sort_type)
+            else:
+                start = time.perf_counter()
+                get_inset_levels(engine, figures[index])
+            times.append(time.perf_counter() - start)
+        if len(selected) >= 3:
+            engine_features = {key: value[selected] for key, value in features.items()}
+            coefficients[engine] = CostModel.fit(engine, engine_features, np.array(times))
+    return CostModel(coefficients)
+
+
+def refit(model, log_filename):
+    """Поправка модели по журналу: коэффициенты движка умножаются на медиану отношения факт / прогноз"""
+    ratios = {}
+    with open(log_filename, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            for engine, predicted in record.get("predicted_s", {}).items():
+                actual = record.get("actual_s", {}).get(engine)
+                if predicted > 0 and actual:
+                    ratios.setdefault(engine, []).append(actual / predicted)
+    for engine, values in ratios.items():
+        if engine in model.coefficients:
+            scale = float(np.median(values))
+            for key in ("c", "a"):
+                model.coefficients[engine][key] *= scale
+    return model
+
+
+if __name__ == '__main__':
+    # Калибровка модели на синтетических фигурах: python -m core.autotune calibrate [число фигур]
+    # Поправка по журналу запусков: python -m core.autotune refit autotune_log.jsonl
+    from core.settings import PluginConfig
+
+    config = PluginConfig()
+    config.load_config()
+    if sys.argv[1] == "calibrate":
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        cost_model = calibrate(config, get_synthetic_figures(count))
+    else:
+        cost_model = refit(CostModel.load(), sys.argv[2])
+    cost_model.save()
+    print(json.dumps(cost_model.coefficients, indent=4))
+    print(f"Сохранен файл {COST_MODEL_FILE}")
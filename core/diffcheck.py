@@ -0,0 +1,477 @@
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from shapely import (STRtree, area, buffer, get_parts, is_missing, length, linestrings, multilinestrings, simplify,
+                     symmetric_difference, union_all)
+from shapely import points as shapely_points
+
+from core.estimator import Estimator
+from core.geometry import GeometryTool
+from core.machine import Machine
+from core.primitives import PrimitiveInset
+from core.toolpath import Toolpath
+from core.tools import sort_paths, sort_paths_minimize_transitions
+
+STAGES = ("inset", "sort", "gcode")
+# Эталон каждой стадии - текущая реализация
+REFERENCES = {"inset": "buffer", "sort": "kopt", "gcode": "machine"}
+# Размер тайла встроенного кандидата "tiled", если в настройках тайлы выключены (нм)
+TILE_SIZE = 2000000
+# Полигоны синтетического набора (мм): мельче, чем для калибровки, чтобы тысячи фигур проверялись за минуты
+POUR_SIZE_MM = (1.5, 4)
+
+
+class DiffCheck:
+    """
+    Дифференциальная проверка быстрых реализаций против эталонных на одних и тех же фигурах:
+    отступы (GeometryTool.generate_inset_paths), сортировка колец (sort_paths_minimize_transitions)
+    и выпуск G-кода (Machine.generate_gcode_to_file). Реализация - имя встроенной
+    (см. get_implementations) или "модуль:объект" с той же сигнатурой, что у эталона.
+    Метрики считаются векторно по всем фигурам сразу, отчет - время и отклонения рядом.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.step = config.laser_beam_wide
+        self.grid_size = config.round_um * 1000 if config.snap_grid else None
+        self.implementations = self.get_implementations()
+
+    def get_implementations(self):
+        """Встроенные реализации стадий: {стадия: {имя: функция с сигнатурой эталона}}"""
+        tile_size = (self.config.inset_tile_mm * 1000000) or TILE_SIZE
+
+        def inset_primitive(current_geom, step, min_length_um, sort_type, grid_size=None):
+            return GeometryTool.generate_inset_paths(
+                current_geom, step, min_length_um, sort_type, grid_size,
+                convex_vertices=PrimitiveInset.get_vertices(current_geom))
+
+        def inset_tiled(current_geom, step, min_length_um, sort_type, grid_size=None):
+            return GeometryTool.generate_inset_paths(
+                current_geom, step, min_length_um, sort_type, grid_size, tile_size=tile_size)
+
+        def inset_raster(current_geom, step, min_length_um, sort_type, grid_size=None):
+            from core.raster import RasterInset
+            pixel = self.config.round_um * 1000 * max(1, self.config.raster_scale)
+            return RasterInset.generate_inset_paths(current_geom, step, min_length_um, sort_type, pixel)
+
+        def gcode_toolpath(paths, filename, **machine_settings):
+            # Через бинарный файл путей: координаты округляются до нм и читаются из memmap
+            toolpath_filename = os.path.splitext(filename)[0] + ".ltp"
+            Toolpath.save(paths, toolpath_filename)
+            Toolpath(toolpath_filename).to_gcode(filename, **machine_settings)
+
+        return {
+            "inset": {
+                "buffer": GeometryTool.generate_inset_paths,
+                "primitive": inset_primitive,
+                "tiled": inset_tiled,
+                "raster": inset_raster,
+            },
+            "sort": {"kopt": sort_paths_minimize_transitions, "nna": sort_paths},
+            "gcode": {"machine": Machine.generate_gcode_to_file, "toolpath": gcode_toolpath},
+        }
+
+    def get_implementation(self, stage, name):
+        if name in self.implementations[stage]:
+            return self.implementations[stage][name]
+        if ":" not in name:
+            raise ValueError(f"Неизвестная реализация '{name}' для '{stage}': "
+                             f"ожидается {', '.join(self.implementations[stage])} или 'модуль:объект'")
+        module_name, attr_path = name.split(":", 1)
+        implementation = importlib.import_module(module_name)
+        for attr in attr_path.split("."):
+            implementation = getattr(implementation, attr)
+        return implementation
+
+    @staticmethod
+    def pack(figures_paths):
+        """
+        Пути фигур одним массивом: точки (N x 2), начала контуров (R + 1) и номер фигуры каждого контура.
+        Контуры короче двух точек пропускаются
+        """
+        contours = []
+        figure_index = []
+        for index, figure_paths in enumerate(figures_paths):
+            for contour in figure_paths or []:
+                if len(contour) >= 2:
+                    contours.append(np.asarray(contour, dtype=float)[:, :2])
+                    figure_index.append(index)
+        counts = np.array([len(contour) for contour in contours], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        points = np.concatenate(contours) if contours else np.empty((0, 2))
+        return points, offsets, np.array(figure_index, dtype=np.int64)
+
+    @staticmethod
+    def get_lines(points, offsets):
+        counts = np.diff(offsets)
+        return linestrings(points, indices=np.repeat(np.arange(len(counts)), counts))
+
+    @staticmethod
+    def get_travel(points, offsets, figure_index, figure_count):
+        """Холостой ход (нм): по каждой фигуре между ее контурами и общий с переходами между фигурами"""
+        if len(offsets) < 3:
+            return np.zeros(figure_count), 0.0
+        starts = points[offsets[1:-1]]
+        ends = points[offsets[1:-1] - 1]
+        jumps = np.hypot(*(starts - ends).T)
+        same = figure_index[1:] == figure_index[:-1]
+        per_figure = np.bincount(figure_index[1:][same], weights=jumps[same], minlength=figure_count)
+        return per_figure, float(jumps.sum())
+
+    @staticmethod
+    def get_segments(points, offsets):
+        """Отрезки контуров (начала и концы, M x 2) и номер контура каждого отрезка"""
+        counts = np.diff(offsets) - 1
+        contour_index = np.repeat(np.arange(len(counts)), counts)
+        is_last = np.zeros(len(points), dtype=bool)
+        is_last[offsets[1:] - 1] = True
+        starts = np.flatnonzero(~is_last)
+        return points[starts], points[starts + 1], contour_index
+
+    @staticmethod
+    def get_point_keys(points, offsets, figure_index):
+        """
+        Точки каждой фигуры без повторов подряд и замыкающей, округленные до нм и упорядоченные:
+        (номер фигуры, x, y) для сравнения наборов колец без учета порядка и точки старта
+        """
+        counts = np.diff(offsets)
+        point_figure = np.repeat(figure_index, counts)
+        closing = offsets[1:] - 1
+        closed = (points[closing] == points[offsets[:-1]]).all(axis=1)
+        keep = np.ones(len(points), dtype=bool)
+        keep[closing[closed]] = False
+        # Поворот кольца (rotate_path_to_start_at) повторяет бывшую точку замыкания
+        repeated = np.concatenate(([False], (points[1:] == points[:-1]).all(axis=1)))
+        repeated[offsets[:-1]] = False
+        keep &= ~repeated
+        keys = np.column_stack((point_figure[keep], np.rint(points[keep]).astype(np.int64)))
+        return keys[np.lexsort(keys.T[::-1])]
+
+    @staticmethod
+    def get_equal_figures(reference_keys, candidate_keys, figure_count):
+        """Фигуры, у которых наборы точек обеих реализаций совпадают (с точностью до нм)"""
+        reference_counts = np.bincount(reference_keys[:, 0], minlength=figure_count)
+        candidate_counts = np.bincount(candidate_keys[:, 0], minlength=figure_count)
+        equal = reference_counts == candidate_counts
+        # У фигур с одинаковым числом точек упорядоченные точки идут одна против другой
+        reference_keys = reference_keys[equal[reference_keys[:, 0]]]
+        candidate_keys = candidate_keys[equal[candidate_keys[:, 0]]]
+        mismatch = (reference_keys != candidate_keys).any(axis=1)
+        equal[np.unique(reference_keys[mismatch, 0])] = False
+        return equal
+
+    def get_directed_hausdorff(self, source, target, selected, figure_count):
+        """
+        Наибольшее расстояние от вершин source до отрезков target той же фигуры, по фигурам selected.
+        Фигуры разносятся сдвигом по X, чтобы один STRtree отвечал на все фигуры сразу
+        """
+        points, offsets, figure_index = source
+        target_points, target_offsets, target_figure_index = target
+        distances = np.zeros(figure_count)
+        all_points = np.concatenate((points, target_points))
+        if not len(all_points):
+            return distances
+        shift = np.ptp(all_points[:, 0]) + 1e9
+
+        point_figure = np.repeat(figure_index, np.diff(offsets))
+        point_mask = selected[point_figure]
+        starts, ends, contour_index = self.get_segments(target_points, target_offsets)
+        segment_figure = target_figure_index[contour_index]
+        segment_mask = selected[segment_figure]
+        if not point_mask.any() or not segment_mask.any():
+            return distances
+
+        moved = points[point_mask] + np.column_stack((point_figure[point_mask] * shift, np.zeros(point_mask.sum())))
+        offset = np.column_stack((segment_figure[segment_mask] * shift, np.zeros(segment_mask.sum())))
+        segments = linestrings(np.stack((starts[segment_mask] + offset, ends[segment_mask] + offset), axis=1))
+        _, nearest = STRtree(segments).query_nearest(
+            shapely_points(moved), return_distance=True, all_matches=False)
+        np.maximum.at(distances, point_figure[point_mask], nearest)
+        return distances
+
+    def get_exposures(self, packed, selected):
+        """Засвет (кольца с шириной луча) фигур selected, у остальных None"""
+        points, offsets, figure_index = packed
+        exposures = np.full(len(selected), None, dtype=object)
+        contour_mask = selected[figure_index]
+        if contour_mask.any():
+            lines = self.get_lines(points, offsets)[contour_mask]
+            exposed = buffer(lines, self.step / 2, quad_segs=4)
+            selected_index = figure_index[contour_mask]
+            bounds = np.searchsorted(selected_index, np.arange(len(selected) + 1))
+            for i in np.unique(selected_index):
+                exposures[i] = union_all(exposed[bounds[i]:bounds[i + 1]])
+        return exposures
+
+    def compare_paths(self, reference_paths, candidate_paths):
+        """
+        Метрики двух наборов путей по фигурам: расстояние Хаусдорфа между кольцами, разница засвеченной
+        площади (симметрическая разность засветов - колец с шириной луча), длины реза и холостого хода.
+        Фигуры с одинаковыми точками колец (порядок колец и точка старта не важны) отсеиваются сразу:
+        для них отклонения нулевые, и дорогие метрики считаются только по отличающимся фигурам
+        """
+        figure_count = len(reference_paths)
+        packed = {"reference": self.pack(reference_paths), "candidate": self.pack(candidate_paths)}
+        result = {}
+        for key, (points, offsets, figure_index) in packed.items():
+            cut = np.bincount(figure_index, weights=length(self.get_lines(points, offsets)), minlength=figure_count)
+            travel, total_travel = self.get_travel(points, offsets, figure_index, figure_count)
+            result[key] = {
+                "cut": cut,
+                "travel": travel,
+                "total_travel": total_travel,
+                "has_paths": np.bincount(figure_index, minlength=figure_count) > 0,
+                "keys": self.get_point_keys(points, offsets, figure_index),
+            }
+
+        equal = self.get_equal_figures(result["reference"]["keys"], result["candidate"]["keys"], figure_count)
+        has_reference, has_candidate = result["reference"]["has_paths"], result["candidate"]["has_paths"]
+        both = ~equal & has_reference & has_candidate
+        hausdorff = np.maximum(
+            self.get_directed_hausdorff(packed["reference"], packed["candidate"], both, figure_count),
+            self.get_directed_hausdorff(packed["candidate"], packed["reference"], both, figure_count))
+        # Кольца есть только у одной из реализаций: отклонение не меньше шага
+        hausdorff[has_reference != has_candidate] = self.step
+
+        differ = ~equal
+        reference_exposures = self.get_exposures(packed["reference"], differ)
+        candidate_exposures = self.get_exposures(packed["candidate"], differ)
+        exposed_area = np.zeros(figure_count)
+        difference = np.zeros(figure_count)
+        # Засвет фигуры без колец - пустой, разница равна засвету другой реализации
+        exposed_area[differ] = area(reference_exposures[differ])
+        exposed_area = np.nan_to_num(exposed_area)
+        candidate_area = np.nan_to_num(area(candidate_exposures))
+        only_one = differ & (has_reference != has_candidate)
+        difference[only_one] = np.maximum(exposed_area, candidate_area)[only_one]
+        both = differ & has_reference & has_candidate
+        difference[both] = area(symmetric_difference(reference_exposures[both], candidate_exposures[both]))
+        return {
+            "equal": equal,
+            "hausdorff": hausdorff,
+            "exposed_area": exposed_area,
+            "area_difference": difference,
+            "cut": (result["reference"]["cut"], result["candidate"]["cut"]),
+            "travel": (result["reference"]["travel"], result["candidate"]["travel"]),
+            "total_travel": (result["reference"]["total_travel"], result["candidate"]["total_travel"]),
+        }
+
+    def run_figures(self, implementation, figures_input, call):
+        """Пути каждой фигуры и суммарное время вызовов (с)"""
+        figures_paths = []
+        elapsed = 0.0
+        for item in figures_input:
+            start = time.perf_counter()
+            figure_paths = call(implementation, item)
+            elapsed += time.perf_counter() - start
+            figures_paths.append(figure_paths or [])
+        return figures_paths, elapsed
+
+    def check_inset(self, figures, reference, candidate):
+        config = self.config
+
+        def call(implementation, figure):
+            return implementation(
+                current_geom=figure, step=self.step, min_length_um=config.min_length_um,
+                sort_type=config.sort_type, grid_size=self.grid_size)
+
+        reference_paths, reference_time = self.run_figures(reference, figures, call)
+        candidate_paths, candidate_time = self.run_figures(candidate, figures, call)
+        metrics = self.compare_paths(reference_paths, candidate_paths)
+        metrics["time"] = (reference_time, candidate_time)
+        return metrics
+
+    def check_sort(self, figures_rings, reference, candidate):
+        """figures_rings - несортированные замкнутые кольца каждой фигуры"""
+        def call(implementation, rings):
+            # Сортировки могут менять список на месте и возвращают None для одного кольца
+            return implementation([list(ring) for ring in rings]) or rings
+
+        reference_paths, reference_time = self.run_figures(reference, figures_rings, call)
+        candidate_paths, candidate_time = self.run_figures(candidate, figures_rings, call)
+        metrics = self.compare_paths(reference_paths, candidate_paths)
+        metrics["time"] = (reference_time, candidate_time)
+        return metrics
+
+    @staticmethod
+    def get_cut_segments(moves, round_um):
+        """Отрезки реза из разобранного G-кода в целых шагах округления, без учета направления и порядка"""
+        x, y, _, _, laser_on = moves
+        segments = np.column_stack((x[:-1], y[:-1], x[1:], y[1:]))[laser_on]
+        segments = np.rint(segments * 1000 / round_um).astype(np.int64)
+        segments = segments[(segments[:, :2] != segments[:, 2:]).any(axis=1)]
+        # Направление отрезка не важно: первым идет меньший конец
+        swap = (segments[:, 0] > segments[:, 2]) | ((segments[:, 0] == segments[:, 2]) & (segments[:, 1] > segments[:, 3]))
+        segments[swap] = segments[swap][:, [2, 3, 0, 1]]
+        return segments
+
+    @staticmethod
+    def get_segment_deviation(source, target):
+        """Наибольшее расстояние от концов отрезков source до отрезков target (в единицах координат)"""
+        if not len(source):
+            return 0.0
+        if not len(target):
+            return float("inf")
+        tree = STRtree(linestrings(target.reshape(-1, 2, 2).astype(float)))
+        _, distances = tree.query_nearest(
+            shapely_points(source.reshape(-1, 2).astype(float)), return_distance=True, all_matches=False)
+        return float(distances.max())
+
+    def check_gcode(self, paths, reference, candidate):
+        """
+        G-код обеих реализаций разбирается Estimator: совпадение отрезков реза как мультимножеств,
+        отклонение отрезков без пары, длины, переходы и оценка времени
+        """
+        config = self.config
+        settings = config.get_machine_settings()
+        estimator = Estimator(
+            acceleration=config.acceleration, junction_deviation=config.junction_um / 1000,
+            rapid_rate=config.rapid_rate)
+        result = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for key, implementation in (("reference", reference), ("candidate", candidate)):
+                filename = os.path.join(directory, f"{key}.gcode")
+                start = time.perf_counter()
+                implementation(paths=paths, filename=filename, **settings)
+                elapsed = time.perf_counter() - start
+                with open(filename, "rb") as f:
+                    data = f.read()
+                words, present = Estimator.parse_gcode(data)
+                moves = estimator.get_moves(words, present)
+                result[key] = {
+                    "time": elapsed,
+                    "moves": moves,
+                    "segments": self.get_cut_segments(moves, config.round_um),
+                    "job": estimator.get_metrics(*moves, line_count=len(words)),
+                }
+
+        reference_segments = result["reference"]["segments"]
+        candidate_segments = result["candidate"]["segments"]
+        segments = np.concatenate((reference_segments, candidate_segments))
+        _, inverse = np.unique(segments, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        reference_counts = np.bincount(inverse[:len(reference_segments)], minlength=inverse.max(initial=-1) + 1)
+        candidate_counts = np.bincount(inverse[len(reference_segments):], minlength=inverse.max(initial=-1) + 1)
+
+        # Отклонение: от концов отрезков без пары до ближайшего отрезка реза другой реализации
+        unmatched = (reference_counts != candidate_counts)[inverse]
+        point_deviation = max(
+            self.get_segment_deviation(reference_segments[unmatched[:len(reference_segments)]], candidate_segments),
+            self.get_segment_deviation(candidate_segments[unmatched[len(reference_segments):]], reference_segments))
+        point_deviation *= config.round_um / 1000
+        return {
+            "time": (result["reference"]["time"], result["candidate"]["time"]),
+            "segments": (len(reference_segments), len(candidate_segments)),
+            "unmatched_segments": int(np.abs(reference_counts - candidate_counts).sum()),
+            "point_deviation_mm": point_deviation,
+            "job": (result["reference"]["job"], result["candidate"]["job"]),
+        }
+
+    @staticmethod
+    def get_speedup(times):
+        reference_time, candidate_time = times
+        return reference_time / candidate_time if candidate_time > 0 else float("inf")
+
+    def format_report(self, stage, reference_name, candidate_name, metrics):
+        """Строки отчета: время и отклонения эталона и кандидата рядом"""
+        reference_time, candidate_time = metrics["time"]
+        report = [
+            f"{stage}: {reference_name} -> {candidate_name}",
+            f"Время: {reference_time:.3f} с -> {candidate_time:.3f} с, ускорение x{self.get_speedup(metrics['time']):.2f}",
+        ]
+        if stage == "gcode":
+            reference_job, candidate_job = metrics["job"]
+            deviation = metrics["point_deviation_mm"]
+            report += [
+                f"Отрезков реза: {metrics['segments'][0]} -> {metrics['segments'][1]}, "
+                f"без пары: {metrics['unmatched_segments']}",
+                f"Отклонение отрезков без пары: {deviation:.3f} мм",
+            ]
+            for key, label in (("cut_length_mm", "Рез, мм"), ("rapid_length_mm", "Холостые, мм"),
+                               ("laser_transitions", "Включений лазера"), ("time_s", "Оценка времени, с")):
+                report.append(f"{label}: {reference_job[key]:.1f} -> {candidate_job[key]:.1f}")
+            return report
+
+        figure_count = len(metrics["hausdorff"])
+        hausdorff = metrics["hausdorff"]
+        worst = int(np.argmax(hausdorff)) if figure_count else 0
+        exposed_area = metrics["exposed_area"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relative = np.where(exposed_area > 0, metrics["area_difference"] / exposed_area, 0)
+        reference_travel, candidate_travel = metrics["total_travel"]
+        report += [
+            f"Фигур: {figure_count}, совпадают точно: {int(metrics['equal'].sum())}, "
+            f"отличаются больше 1 мкм: {int((hausdorff > 1000).sum())}",
+            f"Хаусдорф колец: макс. {hausdorff.max(initial=0) / 1000:.2f} мкм (фигура {worst})",
+            f"Разница засвета: {metrics['area_difference'].sum() / 1e12:.6f} мм², "
+            f"макс. по фигуре {relative.max(initial=0) * 100:.3f}%",
+            f"Рез: {metrics['cut'][0].sum() / 1e6:.1f} мм -> {metrics['cut'][1].sum() / 1e6:.1f} мм",
+            f"Холостой ход: {reference_travel / 1e6:.1f} мм -> {candidate_travel / 1e6:.1f} мм",
+        ]
+        return report
+
+    def run(self, stage, candidate_name, figures=None, toolpaths=None, reference_name=None):
+        """
+        Проверка стадии на фигурах (синтетических) или путях из файлов .ltp. Для отступов по файлам путей
+        фигуры восстанавливаются по записанным кольцам. Возвращает (метрики, строки отчета)
+        """
+        reference_name = reference_name or REFERENCES[stage]
+        reference = self.get_implementation(stage, reference_name)
+        candidate = self.get_implementation(stage, candidate_name)
+        recorded = [[contour.tolist() for contour in figure] for toolpath in toolpaths or []
+                    for figure in toolpath.iter_paths()]
+        if stage == "inset":
+            if recorded:
+                figures = self.get_recorded_figures(recorded)
+            metrics = self.check_inset(figures, reference, candidate)
+        elif stage == "sort":
+            if recorded:
+                # Сортируются только замкнутые кольца: открытые пути уже связаны в спирали
+                figures_rings = [[contour for contour in figure if contour[0] == contour[-1]] for figure in recorded]
+            else:
+                figures_rings = [GeometryTool.get_inset_levels(figure, self.step, self.config.min_length_um,
+                                                               self.grid_size) for figure in figures]
+            metrics = self.check_sort(figures_rings, reference, candidate)
+        else:
+            paths = recorded or [GeometryTool.generate_inset_paths(
+                figure, self.step, self.config.min_length_um, 0, self.grid_size,
+                convex_vertices=PrimitiveInset.get_vertices(figure)) or [] for figure in figures]
+            metrics = self.check_gcode(paths, reference, candidate)
+        return metrics, self.format_report(stage, reference_name, candidate_name, metrics)
+
+    def get_recorded_figures(self, recorded):
+        """
+        Фигуры из записанных путей: кольца с отступом на шаг луча. Первый уровень отстоит от края меди
+        на шаг, соседние уровни - на шаг друг от друга, поэтому отступ наружу на шаг возвращает фигуру
+        (с точностью до скругления острых углов) - реальную форму для проверки отступов
+        """
+        points, offsets, figure_index = self.pack(recorded)
+        multilines = np.full(len(recorded), None, dtype=object)
+        if len(figure_index):
+            multilinestrings(self.get_lines(points, offsets), indices=figure_index, out=multilines)
+        figures = simplify(buffer(multilines[~is_missing(multilines)], self.step, quad_segs=4),
+                           self.config.round_um * 1000)
+        return [figure for figure in get_parts(figures) if not figure.is_empty]
+
+
+if __name__ == '__main__':
+    # Сравнение с эталоном: python -m core.diffcheck inset|sort|gcode кандидат [число фигур | файлы .ltp]
+    # Кандидат - встроенное имя (inset: primitive, tiled, raster; sort: nna; gcode: toolpath) или модуль:объект
+    from core.autotune import get_synthetic_figures
+    from core.settings import PluginConfig
+
+    config = PluginConfig()
+    config.load_config()
+    stage, candidate_name = sys.argv[1], sys.argv[2]
+    if stage not in STAGES:
+        sys.exit(f"Неизвестная стадия '{stage}': ожидается {', '.join(STAGES)}")
+    sources = sys.argv[3:]
+    toolpaths = [Toolpath(filename) for filename in sources if filename.endswith(".ltp")]
+    count = int(sources[0]) if sources and not toolpaths else 1000
+    figures = None if toolpaths else get_synthetic_figures(count, pour_size_mm=POUR_SIZE_MM)
+    _, report = DiffCheck(config).run(stage, candidate_name, figures=figures, toolpaths=toolpaths)
+    print("\n".join(report))
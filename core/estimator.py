@@ -0,0 +1,176 @@
+import mmap
+import os
+import re
+
+import numpy as np
+
+from core.machine import Machine
+
+# Одна строка G-кода: модальные слова в том порядке, в котором их пишет Machine.iter_gcode
+GCODE_LINE = re.compile(
+    rb"^[ \t]*(?:G(\d+))?[ \t]*(?:X(-?[\d.]+))?[ \t]*(?:Y(-?[\d.]+))?[ \t]*(?:F([\d.]+))?[ \t]*(?:S([\d.]+))?[^\n]*$",
+    re.M)
+# Выдержка G4 (метки кернения), секунды
+GCODE_DWELL = re.compile(rb"G4[ \t]*P([\d.]+)")
+PARSE_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+class Estimator:
+    """
+    Оценка времени работы станка по G-коду.
+    Планировщик повторяет GRBL: ограничение скорости на стыках по отклонению (junction deviation)
+    и трапецеидальный профиль с постоянным ускорением. Все расчеты векторные.
+    """
+
+    def __init__(self, acceleration=1500.0, junction_deviation=0.01, rapid_rate=3000.0):
+        self.acceleration = acceleration  # мм/с²
+        self.junction_deviation = junction_deviation  # мм
+        self.rapid_rate = rapid_rate  # мм/мин
+
+    @staticmethod
+    def parse_gcode(data: bytes, chunk_size=PARSE_CHUNK_SIZE):
+        """
+        Модальные значения G, X, Y, F, S для каждой строки
+        и признак строк, в которых задана хотя бы одна координата.
+        Текст разбирается кусками, чтобы промежуточные строки Python не занимали всю память.
+        """
+        chunks = []
+        start = 0
+        while start < len(data):
+            end = data.find(b"\n", start + chunk_size)
+            end = len(data) if end < 0 else end
+            rows = GCODE_LINE.findall(data, start, end)
+            if rows:
+                words = np.array(rows, dtype=bytes)
+                # Ширина dtype - по самому длинному слову куска, b"nan" может в нее не влезть
+                words = np.where(words == b"", b"nan", words)
+                chunks.append(words.astype(np.float64))
+            start = end + 1
+        if not chunks:
+            return np.empty((0, 5)), np.empty(0, dtype=bool)
+        words = np.concatenate(chunks)
+        present = ~np.isnan(words[:, 1]) | ~np.isnan(words[:, 2])
+        return Estimator.fill_modal(words), present
+
+    @staticmethod
+    def fill_modal(words):
+        """Протягивает последнее заданное значение каждого слова вниз по строкам"""
+        lines = np.arange(len(words))[:, np.newaxis]
+        index = np.where(np.isnan(words), 0, lines)
+        np.maximum.accumulate(index, axis=0, out=index)
+        filled = np.take_along_axis(words, index, axis=0)
+        # До первого упоминания: G0, координаты 0, подача 0, лазер выключен
+        filled[np.isnan(filled)] = 0
+        return filled
+
+    def get_moves(self, words, present):
+        """Отрезки перемещений из модальной таблицы. present - строки, где задана X или Y"""
+        motion = words[:, 0]
+        is_motion = present & ((motion == 0) | (motion == 1))
+        x = np.concatenate(([0.0], words[is_motion, 1]))
+        y = np.concatenate(([0.0], words[is_motion, 2]))
+        is_rapid = motion[is_motion] == 0
+        feed = np.where(is_rapid, self.rapid_rate, words[is_motion, 3])
+        laser_on = ~is_rapid & (words[is_motion, 4] > 0)
+        return x, y, feed, is_rapid, laser_on
+
+    def plan(self, x, y, feed):
+        """
+        Время каждого отрезка. Скорости входа считаются точно, как в двух проходах планировщика GRBL:
+        ограничения по разгону/торможению сводятся к накопленным минимумам по префиксным суммам длин.
+        """
+        dx = np.diff(x)
+        dy = np.diff(y)
+        length = np.hypot(dx, dy)
+        keep = length > 0
+        dx, dy, length, feed = dx[keep], dy[keep], length[keep], feed[keep]
+        if not len(length):
+            return length, length
+
+        accel = self.acceleration
+        v_max = np.maximum(feed, 1.0) / 60.0
+        ux = dx / length
+        uy = dy / length
+
+        # Квадраты скоростей на стыках, GRBL junction deviation
+        cos_theta = -(ux[:-1] * ux[1:] + uy[:-1] * uy[1:])
+        sin_half = np.sqrt(np.clip(0.5 * (1.0 - cos_theta), 0.0, 1.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            junction = accel * self.junction_deviation * sin_half / (1.0 - sin_half)
+        junction = np.where(cos_theta > 0.999999, 0.0, junction)
+        junction = np.where(cos_theta < -0.999999, np.inf, junction)
+        junction = np.minimum(junction, np.minimum(v_max[:-1], v_max[1:]) ** 2)
+        # Старт и финиш с нулевой скоростью
+        limit = np.concatenate(([0.0], junction, [0.0]))
+
+        travel = 2.0 * accel * np.concatenate(([0.0], np.cumsum(length)))
+        # Обратный проход: e[i] <= min(limit[k] + travel[k]) по k >= i, минус travel[i]
+        backward = np.minimum.accumulate((limit + travel)[::-1])[::-1] - travel
+        # Прямой проход: e[i] <= min(e[k] - travel[k]) по k <= i, плюс travel[i]
+        entry = np.minimum.accumulate(backward - travel) + travel
+        entry = np.maximum(entry, 0.0)
+
+        v0 = np.sqrt(entry[:-1])
+        v1 = np.sqrt(entry[1:])
+        accel_dist = (v_max ** 2 - v0 ** 2) / (2 * accel)
+        decel_dist = (v_max ** 2 - v1 ** 2) / (2 * accel)
+        cruise = length - accel_dist - decel_dist
+
+        trapezoid = (v_max - v0) / accel + (v_max - v1) / accel + np.maximum(cruise, 0.0) / v_max
+        v_peak = np.sqrt(np.maximum((2 * accel * length + v0 ** 2 + v1 ** 2) / 2, 0.0))
+        triangle = (np.maximum(v_peak - v0, 0.0) + np.maximum(v_peak - v1, 0.0)) / accel
+        seconds = np.where(cruise >= 0, trapezoid, triangle)
+        return length, seconds
+
+    def estimate_bytes(self, data: bytes):
+        words, present = self.parse_gcode(data)
+        x, y, feed, is_rapid, laser_on = self.get_moves(words, present)
+        metrics = self.get_metrics(x, y, feed, is_rapid, laser_on, line_count=len(words))
+        metrics["time_s"] += sum(float(seconds) for seconds in GCODE_DWELL.findall(data))
+        return metrics
+
+    def estimate_file(self, filename):
+        """
+        Оценка по готовому файлу Machine.generate_gcode_to_file.
+        Файл отображается в память (mmap), разбор кусками читает его страницами, а не целиком
+        """
+        with open(filename, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return self.estimate_bytes(b"")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self.estimate_bytes(data)
+
+    def estimate_paths(self, paths, **machine_settings):
+        """Оценка по путям в памяти, с теми же настройками, что у Machine.iter_gcode"""
+        data = "\n".join(Machine.iter_gcode(paths, **machine_settings)).encode()
+        return self.estimate_bytes(data)
+
+    def get_metrics(self, x, y, feed, is_rapid, laser_on, line_count):
+        if len(x) < 2:
+            return {"lines": line_count, "cut_length_mm": 0.0, "rapid_length_mm": 0.0,
+                    "laser_transitions": 0, "rapid_count": 0, "time_s": 0.0}
+        segment_length = np.hypot(np.diff(x), np.diff(y))
+        keep = segment_length > 0
+        # Включение лазера - переход от холостого/выключенного отрезка к рабочему
+        on = laser_on[keep]
+        transitions = int(np.count_nonzero(on[1:] & ~on[:-1]) + (1 if len(on) and on[0] else 0))
+
+        _, seconds = self.plan(x, y, feed)
+        return {
+            "lines": line_count,
+            "cut_length_mm": float(segment_length[laser_on].sum()),
+            "rapid_length_mm": float(segment_length[is_rapid].sum()),
+            "laser_transitions": transitions,
+            "rapid_count": int(np.count_nonzero(is_rapid & keep)),
+            "time_s": float(seconds.sum()),
+        }
+
+    @staticmethod
+    def format_metrics(metrics):
+        minutes, seconds = divmod(int(round(metrics["time_s"])), 60)
+        hours, minutes = divmod(minutes, 60)
+        return "\n".join([
+            f"Оценка времени: {hours}:{minutes:02d}:{seconds:02d}",
+            f"Рез: {metrics['cut_length_mm'] / 1000:.2f} м, холостые: {metrics['rapid_length_mm'] / 1000:.2f} м",
+            f"Включений лазера: {metrics['laser_transitions']}, переходов G0: {metrics['rapid_count']}",
+        ])
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 import pcbnew
 from pcbnew import ERROR_INSIDE
 
@@ -25,6 +26,16 @@ class PCB:
         min_y = min(p[1] for p in points)
         return min_x, min_y
 
+    @classmethod
+    def get_board_bounds_from_edges(cls, board):
+        """Габарит границ платы (Edge.Cuts): (min_x, min_y, max_x, max_y) в нм, None без границ"""
+        points = cls.get_edge_cuts_points(board)
+        if not points:
+            return None
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        return min(xs), min(ys), max(xs), max(ys)
+
     @staticmethod
     def get_edge_cuts_points(board):
         layer = pcbnew.Edge_Cuts  # слой Edge.Cuts
@@ -199,6 +210,24 @@ class PCB:
         poly_set.AddOutline(outline)
         return poly_set
 
+    @classmethod
+    def get_item_bounds(cls, item, lay):
+        """Точный габарит объекта в полигонах на слое lay (как при извлечении меди), None - пусто"""
+        item_class = item.GetClass()
+        if item_class == "PAD":
+            # Сквозные пады переводятся на своем слое, как в get_cu_layers_geometry
+            if item.GetAttribute() in [pcbnew.PAD_ATTRIB_PTH, pcbnew.PAD_ATTRIB_NPTH]:
+                lay = item.GetLayer()
+            poly_set = cls.pad_to_poly_set(item, lay)
+        elif item_class in ("PCB_TRACK", "PCB_VIA"):
+            poly_set = cls.track_to_poly_set(item, lay)
+        else:
+            poly_set = cls.draw_to_poly_set(item, lay)
+        if not poly_set or poly_set.IsEmpty():
+            return None
+        bbox = poly_set.BBox()
+        return bbox.GetLeft(), bbox.GetTop(), bbox.GetRight(), bbox.GetBottom()
+
     @staticmethod
     def union_poly_sets(poly_sets):
         if not poly_sets:
@@ -226,63 +255,111 @@ class PCB:
             polygons.append(points)
         return polygons
 
+    @staticmethod
+    def get_hole_centers(board, tent_via=False, tent_th=False):
+        """Центры отверстий падов и переходных (нм) массивом N x 2 для задания кернения"""
+        centers = []
+        if not tent_th:
+            for fp in board.GetFootprints():
+                for pad in fp.Pads():
+                    if pad.HasDrilledHole() and pad.GetDrillSizeX() > 0 and pad.GetDrillSizeY() > 0:
+                        pos = pad.GetPosition()
+                        centers.append((pos.x, pos.y))
+        if not tent_via:
+            for track in board.GetTracks():
+                if track.GetClass() == "PCB_VIA" and track.GetDrill() > 0:
+                    pos = track.GetPosition()
+                    centers.append((pos.x, pos.y))
+        return np.array(centers, dtype=float).reshape(-1, 2)
+
     @classmethod
     def get_cu_geometry(cls, board, copper_layer, tent_via=False, tent_th=False, only_pad=False, punch_holes=False, arc_segments=32):
-        poly_sets = []
+        layers_coords, holy_sets_coords, _ = cls.get_cu_layers_geometry(
+            board, [copper_layer], tent_via, tent_th, only_pad, punch_holes, arc_segments)
+        return layers_coords[copper_layer], holy_sets_coords
+
+    @classmethod
+    def get_cu_layers_geometry(cls, board, copper_layers, tent_via=False, tent_th=False, only_pad=False,
+                               punch_holes=False, arc_segments=32, skip_holes=False, centerline_widths=None,
+                               items=None):
+        """
+        Медь нескольких слоев за один обход платы. Отверстия общие для всех слоев,
+        поэтому строятся и объединяются один раз. skip_holes - отверстия не вырезаются
+        (кернение идет отдельным заданием, см. get_hole_centers).
+        centerline_widths - (min, max]: дорожки такой ширины не переводятся в полигоны,
+        а возвращаются отрезками осевых линий (см. TrackPaths).
+        items - только эти объекты (пары (футпринт, пад), дорожки, рисунки), см. BoardIndex.query.
+
+        :return: ({слой: координаты полигонов}, координаты отверстий, {слой: отрезки дорожек N x 5})
+        """
+        poly_sets = {layer: [] for layer in copper_layers}
+        track_sets = {layer: [] for layer in copper_layers}
         hole_sets = []
         clearance = 0
-        for fp in board.GetFootprints():
-            for pad in fp.Pads():
-                attrs = pad.GetAttribute()
+        if items is None:
+            pads = [(fp, pad) for fp in board.GetFootprints() for pad in fp.Pads()]
+            tracks, drawings = board.GetTracks(), board.Drawings()
+        else:
+            pads, tracks, drawings = items
+        for fp, pad in pads:
+            attrs = pad.GetAttribute()
+            for copper_layer in copper_layers:
                 # THROUGH-HOLE
                 if attrs in [pcbnew.PAD_ATTRIB_PTH, pcbnew.PAD_ATTRIB_NPTH]:
                     if pad.GetLayer() in [copper_layer, 0]:
                         poly_set = cls.pad_to_poly_set(pad, pad.GetLayer())
                         if poly_set and not poly_set.IsEmpty():
-                            poly_sets.append(poly_set)
+                            poly_sets[copper_layer].append(poly_set)
                 # SMD
                 else:
                     if fp.IsFlipped() == (copper_layer == pcbnew.B_Cu):
                         poly_set = cls.pad_to_poly_set(pad, copper_layer)
                         if poly_set and not poly_set.IsEmpty():
-                            poly_sets.append(poly_set)
+                            poly_sets[copper_layer].append(poly_set)
 
-                if pad.HasDrilledHole():
-                    drill_x = pad.GetDrillSizeX()
-                    drill_y = pad.GetDrillSizeY()
+            if pad.HasDrilledHole() and not skip_holes:
+                drill_x = pad.GetDrillSizeX()
+                drill_y = pad.GetDrillSizeY()
 
-                    pos = pad.GetPosition()
-                    orientation = pad.GetOrientation().AsDegrees()
-                    if drill_x > 0 and drill_y > 0 and not tent_th:
-                        hole_poly = cls.create_slot_from_object(pos, drill_x, drill_y, orientation, arc_segments,
-                                                                punch_holes)
-                        hole_sets.append(hole_poly)
+                pos = pad.GetPosition()
+                orientation = pad.GetOrientation().AsDegrees()
+                if drill_x > 0 and drill_y > 0 and not tent_th:
+                    hole_poly = cls.create_slot_from_object(pos, drill_x, drill_y, orientation, arc_segments,
+                                                            punch_holes)
+                    hole_sets.append(hole_poly)
 
-        for track in board.GetTracks():
+        for track in tracks:
             cls_track = track.GetClass()
             if cls_track == "PCB_VIA":
-                poly_set = pcbnew.SHAPE_POLY_SET()
-                track.TransformShapeToPolygon(poly_set, copper_layer, clearance, MAX_ERROR, ERROR_INSIDE)
-                if poly_set and not poly_set.IsEmpty():
-                    poly_sets.append(poly_set)
+                for copper_layer in copper_layers:
+                    poly_set = pcbnew.SHAPE_POLY_SET()
+                    track.TransformShapeToPolygon(poly_set, copper_layer, clearance, MAX_ERROR, ERROR_INSIDE)
+                    if poly_set and not poly_set.IsEmpty():
+                        poly_sets[copper_layer].append(poly_set)
                 drill = track.GetDrill()
                 orientation = 0
                 pos = track.GetPosition()
-                if drill > 0 and not tent_via:
+                if drill > 0 and not tent_via and not skip_holes:
                     hole_poly = cls.create_slot_from_object(pos, drill, drill, orientation, arc_segments, punch_holes)
                     hole_sets.append(hole_poly)
 
             elif cls_track == "PCB_TRACK" and not only_pad:
-                if track.GetLayer() == copper_layer:
+                copper_layer = track.GetLayer()
+                if copper_layer in poly_sets and centerline_widths and \
+                        centerline_widths[0] < track.GetWidth() <= centerline_widths[1]:
+                    start, end = track.GetStart(), track.GetEnd()
+                    track_sets[copper_layer].append((start.x, start.y, end.x, end.y, track.GetWidth()))
+                elif copper_layer in poly_sets:
                     poly_set = cls.track_to_poly_set(track, copper_layer)
                     if poly_set and not poly_set.IsEmpty():
-                        poly_sets.append(poly_set)
+                        poly_sets[copper_layer].append(poly_set)
 
-        for drawing in board.Drawings():
-            if drawing.GetLayer() == copper_layer:
+        for drawing in drawings:
+            copper_layer = drawing.GetLayer()
+            if copper_layer in poly_sets:
                 poly_set = cls.draw_to_poly_set(drawing, copper_layer)
                 if poly_set and not poly_set.IsEmpty():
-                    poly_sets.append(poly_set)
+                    poly_sets[copper_layer].append(poly_set)
 
         # for zone in board.Zones():
         #     if zone.GetLayer() == copper_layer:
@@ -290,8 +367,9 @@ class PCB:
         #         if poly_set and not poly_set.IsEmpty():
         #             poly_sets.append(poly_set)
 
-        poly_sets_multy = cls.union_poly_sets(poly_sets)
+        layers_coords = {layer: cls.get_polygon_coordinates(cls.union_poly_sets(layer_sets))
+                         for layer, layer_sets in poly_sets.items()}
         holy_sets_multy = cls.union_poly_sets(hole_sets)
-        poly_sets_coords = cls.get_polygon_coordinates(poly_sets_multy)
         holy_sets_coords = cls.get_polygon_coordinates(holy_sets_multy)
-        return poly_sets_coords, holy_sets_coords
+        layers_tracks = {layer: np.array(segments, dtype=float).reshape(-1, 5) for layer, segments in track_sets.items()}
+        return layers_coords, holy_sets_coords, layers_tracks
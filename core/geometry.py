@@ -1,8 +1,14 @@
-from math import sqrt
+from functools import partial
+from math import sqrt, ceil
 
-from shapely import MultiPolygon, Polygon, unary_union
+import numpy as np
+from shapely import (MultiPolygon, Polygon, LineString, GeometryCollection, STRtree, box, unary_union, set_precision,
+                     prepare, buffer, area, length,
+                     dwithin, get_geometry, get_num_geometries, get_parts, get_type_id, maximum_inscribed_circle)
+from shapely import bounds as get_bounds
 from shapely.affinity import translate, scale
 
+from core.primitives import PrimitiveInset
 from core.tools import get_path_length, sort_paths_minimize_transitions, sort_paths
 
 
@@ -25,6 +31,25 @@ class GeometryTool:
             poly_multy_poly = poly_multy_poly.difference(hole_multy_poly)
         return poly_multy_poly
 
+    @staticmethod
+    def get_holes(hole_coords):
+        """Общие отверстия слоев, подготовленные для многократных вычитаний; None, если отверстий нет"""
+        hole_multy_poly = GeometryTool.convert_shape_to_shapely(hole_coords) if hole_coords else None
+        if hole_multy_poly is not None:
+            prepare(hole_multy_poly)
+        return hole_multy_poly
+
+    @staticmethod
+    def get_shapely_layers(layers_coords, hole_multy_poly):
+        """Полигоны нескольких слоев за вычетом общих отверстий (см. get_holes)"""
+        layers = {}
+        for layer, poly_coords in layers_coords.items():
+            poly_multy_poly = GeometryTool.convert_shape_to_shapely(poly_coords)
+            if hole_multy_poly is not None:
+                poly_multy_poly = poly_multy_poly.difference(hole_multy_poly)
+            layers[layer] = poly_multy_poly
+        return layers
+
     @staticmethod
     def offset_geometry(poly_set, origin_x, origin_y):
         return translate(poly_set, xoff=-origin_x, yoff=-origin_y)
@@ -46,6 +71,39 @@ class GeometryTool:
         else:
             raise ValueError("axis must be 'x' or 'y'")
 
+    @staticmethod
+    def get_board_transform(bounds, origin_x, origin_y, mirror_y=False):
+        """
+        Матрица shapely.affinity.affine_transform, равная offset_geometry + mirror_geometry(..., 'x')
+        (+ mirror_geometry(..., 'y') для нижнего слоя) над геометрией с границами bounds.
+        Позволяет переводить фигуры в координаты станка по одной.
+        """
+        minx, miny, maxx, maxy = bounds
+        cx = (minx + maxx) / 2 - origin_x
+        cy = (miny + maxy) / 2 - origin_y
+        if mirror_y:
+            a, x_off = -1, 2 * cx + origin_x
+        else:
+            a, x_off = 1, -origin_x
+        return [a, 0, 0, -1, x_off, 2 * cy + origin_y]
+
+    @staticmethod
+    def snap_to_grid(geom, grid_size):
+        """
+        Привязывает координаты к сетке grid_size (нм).
+        Вырожденные кольца и совпадающие после округления вершины удаляются,
+        части полигонов, схлопнувшиеся в нулевую площадь, отбрасываются.
+        """
+        if not grid_size or geom.is_empty:
+            return geom
+        geom = set_precision(geom, grid_size)
+        if isinstance(geom, (MultiPolygon, GeometryCollection)):
+            parts = [part for part in get_parts(geom) if isinstance(part, Polygon) and part.area > 0]
+            geom = MultiPolygon(parts) if parts else Polygon()
+        elif isinstance(geom, Polygon) and not geom.area:
+            geom = Polygon()
+        return geom
+
     @staticmethod
     def sort_by_centroid_distance(data_input):
         if not data_input:
@@ -73,6 +131,47 @@ class GeometryTool:
 
         return [polygone for _, polygone in sorted_data]
 
+    @staticmethod
+    def schedule_figures(geom, tile_size):
+        """
+        Порядок обхода фигур для потоковой обработки: плата делится на квадратные тайлы,
+        тайлы обходятся змейкой, внутри тайла - ближайший сосед по центрам.
+        Фигуры извлекаются из geom по одной в момент выдачи.
+        """
+        if isinstance(geom, Polygon):
+            if not geom.is_empty:
+                yield geom
+            return
+
+        count = get_num_geometries(geom)
+        if not count:
+            return
+        centers = np.empty((count, 2))
+        for i in range(count):
+            minx, miny, maxx, maxy = get_geometry(geom, i).bounds
+            centers[i] = ((minx + maxx) / 2, (miny + maxy) / 2)
+
+        minx, miny = centers.min(axis=0)
+        tile_x = ((centers[:, 0] - minx) // tile_size).astype(np.int64)
+        tile_y = ((centers[:, 1] - miny) // tile_size).astype(np.int64)
+        snake_x = np.where(tile_y % 2 == 0, tile_x, -tile_x)
+        order = np.lexsort((snake_x, tile_y))
+
+        last = centers[order[0]]
+        start = 0
+        while start < count:
+            key = (tile_y[order[start]], tile_x[order[start]])
+            end = start
+            while end < count and (tile_y[order[end]], tile_x[order[end]]) == key:
+                end += 1
+            tile = list(order[start:end])
+            while tile:
+                distances = np.hypot(*(centers[tile] - last).T)
+                idx = tile.pop(int(np.argmin(distances)))
+                last = centers[idx]
+                yield get_geometry(geom, int(idx))
+            start = end
+
     @classmethod
     def extract_sorted_polygons(cls, multipolygon):
         result = []
@@ -93,7 +192,39 @@ class GeometryTool:
         return cls.sort_by_centroid_distance(result)
 
     @staticmethod
-    def generate_inset_paths(current_geom, step: float, min_length_um, sort_type):
+    def collect_rings(offset_geom, min_length, inset_levels, merge=True):
+        """
+        Добавляет в inset_levels внешние и внутренние кольца полигонов offset_geom длиннее min_length (нм).
+        merge=False - части MultiPolygon заведомо не пересекаются и не объединяются
+        """
+        if merge and isinstance(offset_geom, MultiPolygon):
+            offset_geom = unary_union(offset_geom)
+
+        if isinstance(offset_geom, Polygon):
+            polys = [offset_geom]
+        elif isinstance(offset_geom, (MultiPolygon, GeometryCollection)):
+            polys = [geom for geom in offset_geom.geoms if isinstance(geom, Polygon)]
+        else:
+            polys = []
+
+        for poly in polys:
+            if poly.is_empty:
+                continue
+            contour_points = list(poly.exterior.coords)
+            if len(contour_points) >= 4 and get_path_length(contour_points) > min_length:
+                inset_levels.append(contour_points)
+            for interior in poly.interiors:
+                hole_contour_points = list(interior.coords)
+                if len(hole_contour_points) >= 4 and get_path_length(hole_contour_points) > min_length:
+                    inset_levels.append(hole_contour_points)
+
+    @staticmethod
+    def get_inset_levels(current_geom, step: float, min_length_um, grid_size=None):
+        """
+        Кольца всех уровней отступа в порядке генерации, без сортировки.
+        Каждый уровень - отступ исходной фигуры: отступ от предыдущего уровня копит вершины дуг
+        и на глубоких уровнях в разы медленнее. grid_size привязывает к сетке только результат
+        """
         min_length = min_length_um * 1000
         inset_levels = []
         i = 1
@@ -101,30 +232,237 @@ class GeometryTool:
             offset_distance = -step * i
             offset_geom = current_geom.buffer(offset_distance)
 
+            offset_geom = GeometryTool.snap_to_grid(offset_geom, grid_size)
             if offset_geom.is_empty:
                 break
 
-            if isinstance(offset_geom, MultiPolygon):
-                offset_geom = unary_union(offset_geom)
+            GeometryTool.collect_rings(offset_geom, min_length, inset_levels)
+            i += 1
+        return inset_levels
+
+    @staticmethod
+    def split_to_tiles(geom, bounds, tile_size, margin):
+        """
+        Делит geom на тайлы не больше tile_size: список (границы тайла, часть geom в тайле с полями margin).
+        Деление пополам по длинной стороне, каждая половина вырезается из части родителя,
+        поэтому сложность O(n log(число тайлов)), а не O(n * число тайлов).
+        """
+        minx, miny, maxx, maxy = bounds
+        if geom.is_empty:
+            return []
+        # Число тайлов по каждой стороне с допуском на округление: иначе половина, на долю нм
+        # большая tile_size, делилась бы на саму себя без конца
+        count_x = ceil((maxx - minx) / tile_size - 1e-9)
+        count_y = ceil((maxy - miny) / tile_size - 1e-9)
+        if max(count_x, count_y) <= 1:
+            return [(bounds, geom)]
+
+        if count_x >= count_y:
+            mid = minx + ceil(count_x / 2) * tile_size
+            halves = [(minx, miny, mid, maxy), (mid, miny, maxx, maxy)]
+        else:
+            mid = miny + ceil(count_y / 2) * tile_size
+            halves = [(minx, miny, maxx, mid), (minx, mid, maxx, maxy)]
+
+        tiles = []
+        for half in halves:
+            hx0, hy0, hx1, hy1 = half
+            part = geom.intersection(box(hx0 - margin, hy0 - margin, hx1 + margin, hy1 + margin))
+            tiles.extend(GeometryTool.split_to_tiles(part, half, tile_size, margin))
+        return tiles
+
+    @staticmethod
+    def get_tile_levels(tile, step: float, level_count):
+        """Уровни отступа 1..level_count части фигуры, обрезанные по границам тайла без полей"""
+        bounds, part = tile
+        core = box(*bounds)
+        levels = []
+        for i in range(1, level_count + 1):
+            offset_geom = part.buffer(-step * i)
+            if offset_geom.is_empty:
+                break
+            levels.append(offset_geom.intersection(core))
+        return levels
 
-            if isinstance(offset_geom, Polygon):
-                polys = [offset_geom]
-            elif isinstance(offset_geom, MultiPolygon):
-                polys = list(offset_geom.geoms)
+    @staticmethod
+    def stitch_tiles(parts, cores):
+        """
+        Сшивает части одного уровня, обрезанные по ядрам тайлов cores (N x 4).
+        Объединяются только полигоны, касающиеся границ своего ядра: лежащие внутри ядра ни с чем
+        не пересекаются и берутся как есть. Результат - MultiPolygon из непересекающихся частей
+        """
+        polygons, tile_index = get_parts(np.array(parts, dtype=object), return_index=True)
+        is_polygon = get_type_id(polygons) == 3
+        polygons, tile_index = polygons[is_polygon], tile_index[is_polygon]
+        if not len(polygons):
+            return Polygon()
+        part_bounds = get_bounds(polygons)
+        core = cores[tile_index]
+        on_seam = np.any(part_bounds[:, :2] <= core[:, :2] + 1, axis=1) | \
+            np.any(part_bounds[:, 2:] >= core[:, 2:] - 1, axis=1)
+        inner = list(polygons[~on_seam])
+        if on_seam.any():
+            inner.extend(geom for geom in get_parts(unary_union(polygons[on_seam])) if isinstance(geom, Polygon))
+        return MultiPolygon(inner)
+
+    @staticmethod
+    def get_inset_depth(geom, step: float):
+        """Глубина отступов фигуры (нм): радиус вписанной окружности с запасом в шаг, глубже отступ пуст"""
+        return maximum_inscribed_circle(geom, step).length + step
+
+    @staticmethod
+    def get_inset_levels_tiled(current_geom, step: float, min_length_um, tile_size, grid_size=None, executor=None):
+        """
+        Аналог get_inset_levels для очень больших фигур. Фигура режется на тайлы с полями,
+        в каждом тайле считается до level_count уровней (поля не меньше глубины отступа,
+        поэтому внутри тайла результат точный), уровни сшиваются объединением по швам.
+        level_count не больше глубины отступов фигуры: поля не шире, чем нужно.
+        Если проход не дошел до дна, следующие уровни считаются из сшитого последнего:
+        отступ на a, затем на b равен отступу на a + b.
+        executor - пул потоков для тайлов; вызывать не из его же потока, иначе ожидание тайлов
+        может занять все потоки пула
+        """
+        min_length = min_length_um * 1000
+        level_count = max(1, min(int(tile_size // (2 * step)),
+                                 ceil(GeometryTool.get_inset_depth(current_geom, step) / step)))
+        margin = (level_count + 1) * step
+        inset_levels = []
+        geom = current_geom
+        while not geom.is_empty:
+            minx, miny, maxx, maxy = geom.bounds
+            if max(maxx - minx, maxy - miny) <= 2 * tile_size:
+                levels = GeometryTool.get_inset_levels(geom, step, min_length_um, grid_size)
+                inset_levels.extend(levels)
+                break
+
+            tiles = GeometryTool.split_to_tiles(geom, geom.bounds, tile_size, margin)
+            task = partial(GeometryTool.get_tile_levels, step=step, level_count=level_count)
+            tile_levels = list(executor.map(task, tiles) if executor else map(task, tiles))
+            cores = np.array([bounds for bounds, _ in tiles], dtype=float)
+
+            for i in range(level_count):
+                geom = GeometryTool.stitch_tiles(
+                    [levels[i] if len(levels) > i else Polygon() for levels in tile_levels], cores)
+                geom = GeometryTool.snap_to_grid(geom, grid_size)
+                if geom.is_empty:
+                    break
+                GeometryTool.collect_rings(geom, min_length, inset_levels, merge=False)
+            # Ни один тайл не дошел до level_count уровней: глубже фигура пуста
+            if all(len(levels) < level_count for levels in tile_levels):
+                break
+        return inset_levels
+
+    @staticmethod
+    def prune_covered_rings(inset_levels, step: float, min_new_fraction):
+        """
+        Отбрасывает кольца, которые почти не добавляют засвеченной площади.
+        Засвет кольца - его буфер на половину луча. Кольца проверяются в порядке генерации
+        (снаружи внутрь): кольцо остается, если площадь его засвета, не покрытая уже оставленными
+        кольцами, не меньше min_new_fraction от площади, которую проходит луч (длина * ширина луча).
+        Так уходят кольца, почти целиком лежащие в засвете соседей; кольцо без соседей остается всегда,
+        иначе его медь никто бы не засветил. Соседи - кольца ближе ширины луча, ищутся через STRtree.
+        """
+        if not min_new_fraction or not inset_levels:
+            return inset_levels
+
+        lines = np.array([LineString(ring) for ring in inset_levels])
+        exposures = buffer(lines, step / 2)
+        exposure_areas = area(exposures)
+        min_new_areas = min_new_fraction * length(lines) * step
+
+        # Пары (i, j), j < i, у которых засветы пересекаются не только по границе
+        ring_idx, neighbour_idx = STRtree(lines).query(lines, predicate="dwithin", distance=step * 0.99)
+        earlier = neighbour_idx < ring_idx
+        ring_idx, neighbour_idx = ring_idx[earlier], neighbour_idx[earlier]
+
+        # Кольцо без оставленных соседей засвечивает медь, которую больше никто не проходит: оно остается
+        # при любой доле (в том числе первое, внешнее). Площадь засвета - верхняя оценка новой площади:
+        # кольца с достаточным засветом и соседями проверяются разностью с засветом соседей
+        kept = np.ones(len(inset_levels), dtype=bool)
+        for i in np.unique(ring_idx):
+            neighbours = neighbour_idx[ring_idx == i]
+            neighbours = neighbours[kept[neighbours]]
+            if not len(neighbours):
+                continue
+            if exposure_areas[i] < min_new_areas[i]:
+                kept[i] = False
             else:
-                polys = []
-
-            for poly in polys:
-                contour_points = list(poly.exterior.coords)
-                if get_path_length(contour_points) > min_length:
-                    inset_levels.append(contour_points)
-                for interior in poly.interiors:
-                    hole_contour_points = list(interior.coords)
-                    if get_path_length(hole_contour_points) > min_length:
-                        inset_levels.append(hole_contour_points)
-            i += 1
+                covered = unary_union(exposures[neighbours])
+                kept[i] = exposures[i].difference(covered).area >= min_new_areas[i]
+        return [ring for ring, keep in zip(inset_levels, kept) if keep]
 
+    @staticmethod
+    def sort_inset_levels(inset_levels, sort_type):
+        # Одно кольцо сортировать незачем; None от сортировок означал бы фигуру без путей
+        if len(inset_levels) < 2:
+            return inset_levels
         if sort_type:
             return sort_paths_minimize_transitions(inset_levels)
         else:
             return sort_paths(inset_levels)
+
+    @staticmethod
+    def generate_inset_paths(current_geom, step: float, min_length_um, sort_type, grid_size=None, tile_size=None,
+                             executor=None, prune_fraction=0, convex_vertices=None):
+        """
+        Кольца отступов фигуры в порядке обхода.
+        convex_vertices - вершины фигуры, если она выпуклая (PrimitiveInset.get_vertices): кольца считаются без buffer;
+        executor - пул потоков для тайлов (см. get_inset_levels_tiled)
+        """
+        minx, miny, maxx, maxy = current_geom.bounds
+        if convex_vertices is not None:
+            inset_levels = PrimitiveInset.get_inset_levels(convex_vertices, step, min_length_um, grid_size)
+        elif tile_size and max(maxx - minx, maxy - miny) > 2 * tile_size:
+            inset_levels = GeometryTool.get_inset_levels_tiled(
+                current_geom, step, min_length_um, tile_size, grid_size, executor)
+        else:
+            inset_levels = GeometryTool.get_inset_levels(current_geom, step, min_length_um, grid_size)
+        inset_levels = GeometryTool.prune_covered_rings(inset_levels, step, prune_fraction)
+        return GeometryTool.sort_inset_levels(inset_levels, sort_type)
+
+    @staticmethod
+    def clip_paths(paths, clip):
+        """
+        Пути (формат paths), обрезанные по многоугольнику clip. Контуры целиком внутри не меняются,
+        контуры на границе делятся на куски внутри, фигуры без путей внутри пропускаются.
+        """
+        prepare(clip)
+        for figure in paths:
+            clipped = []
+            for contour in figure:
+                line = LineString(contour)
+                if clip.contains(line):
+                    clipped.append(contour)
+                elif clip.intersects(line):
+                    parts = [list(part.coords) for part in get_parts(line.intersection(clip))
+                             if isinstance(part, LineString) and not part.is_empty]
+                    # Кольцо режется и в точке замыкания: куски по обе стороны от нее сшиваются
+                    if len(parts) > 1 and parts[-1][-1] == parts[0][0]:
+                        parts[0] = parts.pop()[:-1] + parts[0]
+                    clipped.extend(parts)
+            if clipped:
+                yield clipped
+
+    @staticmethod
+    def link_inset_rings(figure_paths, current_geom, step: float):
+        """
+        Связывает соседние кольца фигуры в один непрерывный путь (спираль),
+        если переход между ними целиком лежит в меди вместе с половиной луча.
+        Связанный путь открытый: конец последнего кольца не возвращается к старту.
+        """
+        if not figure_paths or len(figure_paths) < 2:
+            return figure_paths
+
+        prepare(current_geom)
+        boundary = current_geom.boundary
+        prepare(boundary)
+
+        linked_paths = [list(figure_paths[0])]
+        for contour_points in figure_paths[1:]:
+            prev_end = linked_paths[-1][-1]
+            connector = LineString([prev_end, contour_points[0]])
+            if current_geom.covers(connector) and not dwithin(boundary, connector, step / 2):
+                linked_paths[-1].extend(contour_points)
+            else:
+                linked_paths.append(list(contour_points))
+        return linked_paths
@@ -0,0 +1,100 @@
+import os
+import select
+import sys
+import threading
+import time
+import tty
+
+from core.sender import GRBL_RX_BUFFER_SIZE, GrblSender
+
+
+class GrblEmulator:
+    """
+    Эмулятор GRBL на псевдотерминале для проверки отправки без станка.
+    Принятые байты копятся в приемном буфере размера rx_buffer_size, каждая строка
+    обрабатывается line_time секунд и подтверждается "ok". Переполнение буфера фиксируется.
+    Как Arduino после открытия порта, первые reset_time секунд эмулятор перезагружается:
+    принятое теряется, затем выдается приветствие (banner=False - контроллер молчит).
+    """
+
+    def __init__(self, rx_buffer_size=GRBL_RX_BUFFER_SIZE, line_time=0.0002, reset_time=0.1, banner=True):
+        self.rx_buffer_size = rx_buffer_size
+        self.line_time = line_time
+        self.reset_time = reset_time
+        self.banner = banner
+        self.master = None
+        self.slave = None
+        self.port = None
+        self.thread = None
+        self.running = False
+
+        self.lines = []
+        self.lost_bytes = 0
+        self.overflows = 0
+        self.max_rx_fill = 0
+
+    def start(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def receive(self, rx, timeout):
+        ready, _, _ = select.select([self.master], [], [], timeout)
+        if not ready:
+            return rx
+        rx += os.read(self.master, 4096)
+        if len(rx) > self.rx_buffer_size:
+            self.overflows += 1
+        self.max_rx_fill = max(self.max_rx_fill, len(rx))
+        return rx
+
+    def run(self):
+        deadline = time.perf_counter() + self.reset_time
+        while self.running and (time.perf_counter() < deadline or not self.banner):
+            timeout = min(0.05, max(0.0, deadline - time.perf_counter())) if self.banner else 0.05
+            self.lost_bytes += len(self.receive(b"", timeout))
+        os.write(self.master, b"\r\nGrbl 1.1h ['$' for help]\r\n")
+        rx = b""
+        while self.running:
+            if b"\n" not in rx:
+                rx = self.receive(rx, 0.05)
+                continue
+            line, rx = rx.split(b"\n", 1)
+            deadline = time.perf_counter() + self.line_time
+            # Пока строка "исполняется", контроллер продолжает принимать данные
+            while time.perf_counter() < deadline:
+                rx = self.receive(rx, max(0.0, deadline - time.perf_counter()))
+            line = line.strip()
+            self.lines.append(line.decode(errors="replace"))
+            response = b"ok" if not line or line[:1] in b"GXYFSMgxyfsm$" else b"error:20"
+            os.write(self.master, response + b"\r\n")
+
+
+if __name__ == '__main__':
+    # Проверка отправителя без станка: python -m core.grbl_emulator laser_F_Cu.gcode
+    with GrblEmulator() as emulator:
+        stats = GrblSender(emulator.port).stream_file(sys.argv[1])
+        print(stats)
+        print(f"Принято строк: {len(emulator.lines)}, переполнений буфера: {emulator.overflows}, "
+              f"макс. заполнение: {emulator.max_rx_fill}/{emulator.rx_buffer_size}")
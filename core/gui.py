@@ -30,29 +30,48 @@ class LaserSettingsDialog(wx.Dialog):
                 vbox.Add(hbox, flag=wx.EXPAND | wx.ALL, border=GRID_GAP)
                 self.ctrls[user_dir_key] = text
 
-        control_box = wx.FlexGridSizer(cols=2, gap=Size(GRID_GAP, GRID_GAP))
+        # Поля по вкладкам config.GROUPS, каждая вкладка прокручивается
+        notebook = wx.Notebook(panel)
+        pages = {}
+        for group, title in config.GROUPS.items():
+            page = wx.ScrolledWindow(notebook)
+            page.SetScrollRate(0, GRID_GAP * 2)
+            control_box = wx.FlexGridSizer(cols=2, gap=Size(GRID_GAP, GRID_GAP))
+            control_box.AddGrowableCol(1)
+            page_sizer = wx.BoxSizer(wx.VERTICAL)
+            page_sizer.Add(control_box, flag=wx.EXPAND | wx.ALL, border=GRID_GAP)
+            page.SetSizer(page_sizer)
+            notebook.AddPage(page, title)
+            pages[group] = page, control_box
 
         config_fields = {k: v for k, v in config.FIELDS.items() if k != user_dir_key}
+        main_group = next(iter(config.GROUPS))
 
         for key, meta in config_fields.items():
-            label = wx.StaticText(panel, label=meta["label"] + ":")
+            page, control_box = pages[meta.get("group", main_group)]
+            label = wx.StaticText(page, label=meta["label"] + ":")
 
             if "choices" in meta:
                 choices = list(meta["choices"].values())
-                ctrl = wx.Choice(panel, choices=choices)
+                ctrl = wx.Choice(page, choices=choices)
                 current = meta["choices"].get(getattr(config, key), choices[0])
                 ctrl.SetStringSelection(current)
             elif meta["type"] == bool:
-                ctrl = wx.CheckBox(panel)
+                ctrl = wx.CheckBox(page)
                 ctrl.SetValue(getattr(config, key))
 
             else:
-                ctrl = wx.TextCtrl(panel, value=str(getattr(config, key)))
+                ctrl = wx.TextCtrl(page, value=str(getattr(config, key)))
             control_box.Add(label, flag=wx.ALIGN_CENTER_VERTICAL | wx.EXPAND)
             control_box.Add(ctrl, flag=wx.EXPAND)
             self.ctrls[key] = ctrl
 
-        vbox.Add(control_box, flag=wx.EXPAND | wx.ALL, border=GRID_GAP)
+        # Окно по высоте самой длинной вкладки, но не выше экрана: дальше прокрутка
+        max_height = wx.GetDisplaySize().height * 2 // 3
+        for page, _ in pages.values():
+            best_size = page.GetSizer().GetMinSize()
+            page.SetMinSize(Size(best_size.width, min(best_size.height, max_height)))
+        vbox.Add(notebook, proportion=1, flag=wx.EXPAND | wx.ALL, border=GRID_GAP)
 
         # Кнопки
         hbox_btns = wx.BoxSizer(wx.HORIZONTAL)
@@ -1,7 +1,16 @@
+import numpy as np
+
 from core.tools import get_path_length
 
+WRITE_BATCH_SIZE = 4096
+
 
 class Machine:
+    @staticmethod
+    def count_rapids(paths):
+        """Число холостых переходов G0 (по одному на контур)"""
+        return sum(1 for inset_levels in paths for contour_points in inset_levels if len(contour_points) >= 2)
+
     @staticmethod
     def get_speed(length, base_speed, short_speed, min_contour_length, max_contour_length):
         if length <= min_contour_length:
@@ -13,56 +22,163 @@ class Machine:
             speed = base_speed - ratio * (base_speed - short_speed)
         return int(speed)
 
+    @staticmethod
+    def plan_segment_speeds(points, base_speed, short_speed, acceleration):
+        """
+        Подача (F) для каждого отрезка контура, points - вершины в мм.
+        В вершине подача падает от base_speed к short_speed с ростом угла поворота,
+        на длинном отрезке станок успевает разогнаться от подач вершин на его концах.
+        """
+        segments = np.diff(points, axis=0)
+        length = np.hypot(segments[:, 0], segments[:, 1])
+        direction = segments / np.maximum(length, 1e-9)[:, np.newaxis]
+        # cos угла поворота: 1 - прямо, -1 - разворот
+        cos_turn = np.einsum("ij,ij->i", direction[:-1], direction[1:])
+        corner = short_speed + (base_speed - short_speed) * (1 + cos_turn) / 2
+        # Контур начинается и заканчивается остановкой
+        corner_in = np.concatenate(([short_speed], corner))
+        corner_out = np.concatenate((corner, [short_speed]))
+        corner_speed = np.minimum(corner_in, corner_out) / 60
+        # Разгон на первой половине отрезка и торможение на второй: v² = v0² + 2a(L/2)
+        speed = np.sqrt(corner_speed ** 2 + acceleration * length) * 60
+        return np.clip(speed, short_speed, base_speed).astype(int)
+
     @classmethod
-    def generate_gcode_to_file(
+    def iter_commands(
             cls,
             paths,
-            filename,
             base_speed=900,
             short_speed=750,
             laser_power=255,
             round_um=2,
             min_contour_length=1.5,
             max_contour_length=15.0,
+            plan_feed=False,
+            acceleration=1500,
+            feed_threshold=50,
     ):
+        """
+        Строки G-кода путей без заголовка и завершения, без повторов подряд идущих команд.
+        С plan_feed подача назначается каждому отрезку и меняется,
+        только когда отличается от текущей больше чем на feed_threshold.
+        """
         nm_to_mm = 1e-6
         scale = 1e-3 * round_um
 
         def to_mm(value):
             return round(value * nm_to_mm / scale) * scale
 
-        def write_command(f_handle, command, last_cmd):
-            if command != last_cmd:
-                f_handle.write(command + "\n")
-                return command
-            return last_cmd
-
         def cmd_iterator():
             for inset_levels in paths:
                 for contour_points in inset_levels:
                     if len(contour_points) < 2:
                         continue
 
-                    length = get_path_length(contour_points) * nm_to_mm
-                    speed = cls.get_speed(length, base_speed, short_speed, min_contour_length, max_contour_length)
+                    if plan_feed:
+                        points = np.asarray(contour_points, dtype=float) * nm_to_mm
+                        speeds = cls.plan_segment_speeds(points, base_speed, short_speed, acceleration)
+                        speed = speeds[0]
+                    else:
+                        length = get_path_length(contour_points) * nm_to_mm
+                        speed = cls.get_speed(length, base_speed, short_speed, min_contour_length, max_contour_length)
+                        speeds = None
 
                     start_x = to_mm(contour_points[0][0])
                     start_y = to_mm(contour_points[0][1])
                     yield f"G0X{start_x:.3f}Y{start_y:.3f}S0"
                     first_point = True
-                    for x_nm, y_nm in contour_points[1:]:
+                    for index, (x_nm, y_nm) in enumerate(contour_points[1:]):
                         x_mm = to_mm(x_nm)
                         y_mm = to_mm(y_nm)
                         if first_point:
                             first_point = False
                             yield f"G1X{x_mm:.3f}Y{y_mm:.3f}F{speed}S{laser_power}"
+                        elif speeds is not None and abs(speeds[index] - speed) > feed_threshold:
+                            speed = speeds[index]
+                            yield f"X{x_mm:.3f}Y{y_mm:.3f}F{speed}"
                         else:
                             yield f"X{x_mm:.3f}Y{y_mm:.3f}"
-                    if not first_point:
+                    # Замкнутое кольцо дописывается до старта, связанный спиралью путь остается открытым
+                    end_x = to_mm(contour_points[-1][0])
+                    end_y = to_mm(contour_points[-1][1])
+                    if not first_point and end_x == start_x and end_y == start_y:
                         yield f"G1X{start_x:.3f}Y{start_y:.3f}"
+
+        last_command = ""
+        for cmd in cmd_iterator():
+            if cmd != last_command:
+                yield cmd
+                last_command = cmd
+
+    @classmethod
+    def iter_gcode(
+            cls,
+            paths,
+            base_speed=900,
+            short_speed=750,
+            laser_power=255,
+            round_um=2,
+            min_contour_length=1.5,
+            max_contour_length=15.0,
+            plan_feed=False,
+            acceleration=1500,
+            feed_threshold=50,
+            extra_commands=None,
+    ):
+        """
+        Генератор строк G-кода задания: заголовок, пути (iter_commands), extra_commands
+        (например, метки кернения) и завершение.
+        """
+        yield from ("G21 G17 G90", "G0Z0", "M4")
+        yield from cls.iter_commands(
+            paths=paths,
+            base_speed=base_speed,
+            short_speed=short_speed,
+            laser_power=laser_power,
+            round_um=round_um,
+            min_contour_length=min_contour_length,
+            max_contour_length=max_contour_length,
+            plan_feed=plan_feed,
+            acceleration=acceleration,
+            feed_threshold=feed_threshold)
+        if extra_commands:
+            yield from extra_commands
+        yield from ("M5", "G0X0Y0", "M30")
+
+    @classmethod
+    def generate_gcode_to_file(
+            cls,
+            paths,
+            filename,
+            base_speed=900,
+            short_speed=750,
+            laser_power=255,
+            round_um=2,
+            min_contour_length=1.5,
+            max_contour_length=15.0,
+            plan_feed=False,
+            acceleration=1500,
+            feed_threshold=50,
+            extra_commands=None,
+    ):
+        commands = cls.iter_gcode(
+            paths=paths,
+            base_speed=base_speed,
+            short_speed=short_speed,
+            laser_power=laser_power,
+            round_um=round_um,
+            min_contour_length=min_contour_length,
+            max_contour_length=max_contour_length,
+            plan_feed=plan_feed,
+            acceleration=acceleration,
+            feed_threshold=feed_threshold,
+            extra_commands=extra_commands)
         with open(filename, "w", encoding="utf-8") as f:
-            f.write("G21 G17 G90\nG0Z0\nM4\n")
-            last_command = ""
-            for cmd in cmd_iterator():
-                last_command = write_command(f, cmd, last_command)
-            f.write("M5\nG0X0Y0\nM30\n")
+            batch = []
+            for cmd in commands:
+                batch.append(cmd)
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    f.write("\n".join(batch) + "\n")
+                    batch.clear()
+            if batch:
+                f.write("\n".join(batch) + "\n")
@@ -0,0 +1,167 @@
+import os
+import sys
+
+import numpy as np
+
+from core.machine import Machine
+from core.panel import Panel
+from core.punch import Punch
+from core.toolpath import Toolpath
+
+
+class Nesting:
+    """
+    Раскладка нескольких плат на столе и общее задание.
+    Плата - пути в памяти (формат paths), панель Panel (копии строятся на лету) или файл путей Toolpath (.ltp).
+    Платы раскладываются полками по габаритам платы (Edge.Cuts; самые высокие первыми) внутри стола
+    bed_width x bed_height (нм) с зазором spacing, затем все фигуры всех плат обходятся
+    одним маршрутом по кривой Гильберта и пишутся в один файл G-кода.
+    """
+
+    def __init__(self, bed_width, bed_height, spacing):
+        self.bed_width = bed_width
+        self.bed_height = bed_height
+        self.spacing = spacing
+
+    @staticmethod
+    def get_figure_bounds(board):
+        """Габариты фигур платы (N x 4: min_x, min_y, max_x, max_y)"""
+        if isinstance(board, Toolpath):
+            return np.asarray(board.figures["bounds"], dtype=float).reshape(-1, 4)
+        if isinstance(board, Panel):
+            return board.get_figure_bounds(Nesting.get_figure_bounds(board.paths))
+        bounds = np.zeros((len(board), 4))
+        for index, figure in enumerate(board):
+            points = np.concatenate([np.asarray(contour, dtype=float).reshape(-1, 2) for contour in figure] or
+                                    [np.zeros((1, 2))])
+            bounds[index] = (*points.min(axis=0), *points.max(axis=0))
+        return bounds
+
+    @staticmethod
+    def get_figure(board, index):
+        return board.get_figure(index) if isinstance(board, (Toolpath, Panel)) else board[index]
+
+    @staticmethod
+    def get_layer_file(filename, layer_name, layer_names):
+        """
+        Файл путей платы для слоя layer_name: в имени файла laser_F_Cu.ltp имя другого слоя заменяется,
+        чтобы нижний слой стола собирался из путей нижних слоев других плат
+        """
+        directory, name = os.path.split(filename)
+        for other in layer_names:
+            if other != layer_name and other in name:
+                return os.path.join(directory, name.replace(other, layer_name))
+        return filename
+
+    def pack(self, sizes):
+        """
+        Полочная раскладка прямоугольников sizes (ширина, высота): нижние левые углы мест.
+        ValueError, если платы не помещаются на стол.
+        """
+        places = [None] * len(sizes)
+        shelf_x = shelf_y = shelf_height = 0
+        for index in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+            width, height = sizes[index]
+            if width > self.bed_width:
+                raise ValueError(f"Плата {index + 1} шире стола")
+            if shelf_x and shelf_x + width > self.bed_width:
+                shelf_y += shelf_height + self.spacing
+                shelf_x = shelf_height = 0
+            if shelf_y + height > self.bed_height:
+                raise ValueError(f"Платы не помещаются на стол: не хватает места для платы {index + 1}")
+            places[index] = (shelf_x, shelf_y)
+            shelf_x += width + self.spacing
+            shelf_height = max(shelf_height, height)
+        return places
+
+    def layout(self, boards, outlines=None, mirror_x=False):
+        """
+        Сдвиги плат (dx, dy) и габариты их фигур.
+        outlines - габариты плат (Edge.Cuts) в координатах станка, None - нет габарита; у Toolpath и Panel
+        габарит берется из них. Место платы - габарит вместе с путями, без габарита - только пути.
+        mirror_x - раскладка нижнего слоя: места отражены по X в пределах занятой ширины стола,
+        как каждая плата нижнего слоя отражена в своем габарите, и совпадают с верхним слоем после переворота
+        """
+        figure_bounds = [self.get_figure_bounds(board) for board in boards]
+        outlines = outlines or [None] * len(boards)
+        board_bounds = []
+        for board, bounds, outline in zip(boards, figure_bounds, outlines):
+            if outline is None and isinstance(board, (Toolpath, Panel)):
+                outline = board.outline
+            if len(bounds):
+                bounds = (*bounds[:, :2].min(axis=0), *bounds[:, 2:].max(axis=0))
+                if outline is not None:
+                    bounds = (min(bounds[0], outline[0]), min(bounds[1], outline[1]),
+                              max(bounds[2], outline[2]), max(bounds[3], outline[3]))
+                board_bounds.append(bounds)
+            else:
+                board_bounds.append(outline if outline is not None else (0, 0, 0, 0))
+        sizes = [(max_x - min_x, max_y - min_y) for min_x, min_y, max_x, max_y in board_bounds]
+        places = self.pack(sizes)
+        if mirror_x and places:
+            used_width = max(place_x + width for (place_x, _), (width, _) in zip(places, sizes))
+            places = [(used_width - place_x - width, place_y) for (place_x, place_y), (width, _) in zip(places, sizes)]
+        shifts = [(place_x - min_x, place_y - min_y)
+                  for (place_x, place_y), (min_x, min_y, _, _) in zip(places, board_bounds)]
+        return shifts, figure_bounds
+
+    @staticmethod
+    def get_marks(boards, layout, marks=None):
+        """
+        Метки кернения всех плат на их местах (N x 2) или None, если меток нет.
+        marks - метки плат в координатах станка, None - взять из Toolpath (у путей в памяти меток нет)
+        """
+        shifts, _ = layout
+        marks = marks or [None] * len(boards)
+        placed = []
+        for board, board_marks, shift in zip(boards, marks, shifts):
+            if board_marks is None and isinstance(board, Toolpath):
+                board_marks = board.marks
+            if board_marks is not None and len(board_marks):
+                placed.append(np.asarray(board_marks, dtype=float) + shift)
+        return np.concatenate(placed) if placed else None
+
+    def iter_paths(self, boards, layout=None):
+        """Фигуры всех плат, сдвинутые на свои места, в порядке общего маршрута. layout - готовый self.layout"""
+        shifts, figure_bounds = layout or self.layout(boards)
+        board_index = np.concatenate([np.full(len(bounds), index) for index, bounds in enumerate(figure_bounds)])
+        figure_index = np.concatenate([np.arange(len(bounds)) for bounds in figure_bounds])
+        if not len(board_index):
+            return
+        bounds = np.concatenate(figure_bounds)
+        centers = (bounds[:, :2] + bounds[:, 2:]) / 2 + np.array(shifts)[board_index]
+        for index in Punch.get_order(centers):
+            board = int(board_index[index])
+            shift = np.array(shifts[board])
+            figure = self.get_figure(boards[board], int(figure_index[index]))
+            yield [(np.asarray(contour, dtype=float) + shift).tolist() for contour in figure]
+
+    def generate_gcode_to_file(self, boards, filename, layout=None, extra_commands=None, **machine_settings):
+        Machine.generate_gcode_to_file(
+            paths=self.iter_paths(boards, layout), filename=filename, extra_commands=extra_commands, **machine_settings)
+
+
+if __name__ == '__main__':
+    # Общее задание из файлов путей: python -m core.nesting laser_bed.gcode board1.ltp board2.ltp ...
+    from core.settings import PluginConfig
+
+    config = PluginConfig()
+    config.load_config()
+    nesting = Nesting(config.bed_width_mm * 1000000, config.bed_height_mm * 1000000, config.panel_spacing_um * 1000)
+    toolpaths = [Toolpath(filename) for filename in sys.argv[2:]]
+    layout = nesting.layout(toolpaths)
+    # Метки кернения из файлов путей: в конце задания или отдельным файлом, как задано в настройках
+    marks = nesting.get_marks(toolpaths, layout)
+    punch_commands = None
+    if marks is not None and config.punch_holes and config.punch_mode:
+        punch_commands = Punch.iter_marks(Punch.order_centers(marks), **config.get_punch_settings())
+    append_marks = config.punch_mode == 2
+    nesting.generate_gcode_to_file(toolpaths, sys.argv[1], layout=layout,
+                                   extra_commands=punch_commands if append_marks else None,
+                                   **config.get_machine_settings())
+    if punch_commands is not None and not append_marks:
+        punch_filename = os.path.splitext(sys.argv[1])[0] + "_punch.gcode"
+        Machine.generate_gcode_to_file(paths=[], filename=punch_filename, extra_commands=punch_commands,
+                                       **config.get_machine_settings())
+        print(f"Кернение: {len(marks)} меток, файл {os.path.abspath(punch_filename)}")
+    print(f"Плат: {len(toolpaths)}, сохранен файл {os.path.abspath(sys.argv[1])}")
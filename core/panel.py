@@ -0,0 +1,129 @@
+import math
+
+import numpy as np
+
+ROTATIONS = {0: (1, 0), 90: (0, 1), 180: (-1, 0), 270: (0, -1)}
+
+
+class Panel:
+    """
+    Мультипликация готовых путей одной платы в панель rows x cols.
+    Пути считаются один раз, копии строятся на лету при выдаче в G-код.
+    Шаг копий - габарит платы outline (Edge.Cuts в координатах станка) плюс spacing;
+    без outline берется габарит путей.
+    """
+
+    def __init__(self, paths, rows, cols, spacing, rotation=0, outline=None):
+        if rotation not in ROTATIONS:
+            raise ValueError("rotation must be 0, 90, 180 or 270")
+        self.paths = paths
+        self.rows = max(1, rows)
+        self.cols = max(1, cols)
+        self.cos_a, self.sin_a = ROTATIONS[rotation]
+
+        min_x, min_y, max_x, max_y = outline if outline is not None else self.get_bounds(paths)
+        self.center_x = (min_x + max_x) / 2
+        self.center_y = (min_y + max_y) / 2
+        width = max_x - min_x
+        height = max_y - min_y
+        if rotation in (90, 270):
+            width, height = height, width
+
+        # Повернутый экземпляр выравнивается по нижнему левому углу исходной платы
+        self.base_x = min_x + width / 2
+        self.base_y = min_y + height / 2
+        self.pitch_x = width + spacing
+        self.pitch_y = height + spacing
+        # Габарит всей панели - место, которое она занимает на столе
+        self.outline = (min_x, min_y, min_x + self.cols * self.pitch_x - spacing,
+                        min_y + self.rows * self.pitch_y - spacing)
+
+    @staticmethod
+    def get_bounds(paths):
+        min_x = min_y = math.inf
+        max_x = max_y = -math.inf
+        for figure in paths:
+            for contour in figure:
+                for x, y in contour:
+                    min_x = min(min_x, x)
+                    max_x = max(max_x, x)
+                    min_y = min(min_y, y)
+                    max_y = max(max_y, y)
+        if min_x == math.inf:
+            return 0, 0, 0, 0
+        return min_x, min_y, max_x, max_y
+
+    def instances(self):
+        """Экземпляры платы змейкой: четные ряды слева направо, нечетные справа налево"""
+        for row in range(self.rows):
+            cols = range(self.cols) if row % 2 == 0 else range(self.cols - 1, -1, -1)
+            for col in cols:
+                yield row, col
+
+    def get_transform(self, row, col):
+        shift_x = self.base_x + col * self.pitch_x
+        shift_y = self.base_y + row * self.pitch_y
+        cos_a, sin_a = self.cos_a, self.sin_a
+        cx, cy = self.center_x, self.center_y
+
+        def transform(x, y):
+            dx = x - cx
+            dy = y - cy
+            return cos_a * dx - sin_a * dy + shift_x, sin_a * dx + cos_a * dy + shift_y
+
+        return transform
+
+    def get_figure_bounds(self, bounds):
+        """Габариты фигур всех экземпляров (в порядке instances) по габаритам фигур платы bounds (N x 4)"""
+        result = []
+        for row, col in self.instances():
+            # Поворот кратен 90°, поэтому габарит переходит в габарит через два угла
+            x1, y1 = self.get_transform(row, col)(bounds[:, 0], bounds[:, 1])
+            x2, y2 = self.get_transform(row, col)(bounds[:, 2], bounds[:, 3])
+            result.append(np.column_stack((np.minimum(x1, x2), np.minimum(y1, y2),
+                                           np.maximum(x1, x2), np.maximum(y1, y2))))
+        return np.concatenate(result) if result else np.zeros((0, 4))
+
+    def get_figure(self, index):
+        """Фигура index всей панели: экземпляр index // len(paths) в порядке instances, копия строится на лету"""
+        instance, figure_index = divmod(index, len(self.paths))
+        row, col = divmod(instance, self.cols)
+        if row % 2:
+            col = self.cols - 1 - col
+        transform = self.get_transform(row, col)
+        return [[transform(x, y) for x, y in contour] for contour in self.paths[figure_index]]
+
+    def __len__(self):
+        return len(self.paths) * self.rows * self.cols
+
+    def get_points(self, points):
+        """Точки (массив N x 2) во всех экземплярах панели в порядке instances"""
+        return np.vstack([np.column_stack(self.get_transform(row, col)(points[:, 0], points[:, 1]))
+                          for row, col in self.instances()])
+
+    def iter_paths(self):
+        """
+        Генератор фигур всей панели в формате paths.
+        Каждый экземпляр проходится в прямом или обратном порядке фигур -
+        выбирается тот, у которого вход ближе к концу предыдущего экземпляра.
+        """
+        if not self.paths:
+            return
+        tour_start = self.paths[0][0][0]
+        tour_end = self.paths[-1][-1][-1]
+        last_point = None
+
+        for row, col in self.instances():
+            transform = self.get_transform(row, col)
+            start = transform(*tour_start)
+            end = transform(*tour_end)
+            reverse = last_point is not None and math.dist(last_point, end) < math.dist(last_point, start)
+            last_point = start if reverse else end
+
+            figures = reversed(self.paths) if reverse else self.paths
+            for figure in figures:
+                contours = reversed(figure) if reverse else figure
+                yield [
+                    [transform(x, y) for x, y in (contour[::-1] if reverse else contour)]
+                    for contour in contours
+                ]
@@ -0,0 +1,185 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from time import perf_counter
+
+from shapely import MultiPolygon, box
+from shapely.affinity import affine_transform
+
+from core.geometry import GeometryTool
+from core.machine import Machine
+from core.primitives import PrimitiveInset
+
+
+class Pipeline:
+    """
+    Потоковая обработка слоя: фигуры по одной переводятся в координаты станка,
+    проходят генерацию отступов и связывание и сразу уходят в G-код.
+    Одновременно в памяти находится не больше chunk_size фигур и их путей.
+    """
+
+    def __init__(self, config, workers=None):
+        self.config = config
+        # Число потоков: подобранное AutoTune для этого запуска или из настроек
+        self.workers = workers or config.workers
+        self.grid_size = config.round_um * 1000 if config.snap_grid else None
+        self.raster_pixel = config.round_um * 1000 * max(1, config.raster_scale)
+
+        self.raster = None
+        if config.inset_engine:
+            from core.raster import RasterInset
+            self.raster = RasterInset
+
+        # Подписчики на ход обработки: callback(figure, figure_paths) после каждой фигуры
+        self.listeners = []
+
+        self.figure_count = 0
+        self.engine_counts = {}
+        self.engine_times = {}
+        self.rapids_before = 0
+        self.rapids_after = 0
+        self.max_deviation = 0.0
+        self.deviation_bound = 0.0
+
+    def subscribe(self, callback):
+        self.listeners.append(callback)
+
+    @staticmethod
+    def get_bounds(geom, origin_x, origin_y, mirror_y=False, bounds=None):
+        """
+        Габарит слоя в координатах станка, известен до обработки фигур.
+        bounds - габарит слоя в координатах платы, если в нем есть не только geom (дорожки по осям)
+        """
+        bounds = bounds or geom.bounds
+        matrix = GeometryTool.get_board_transform(bounds, origin_x, origin_y, mirror_y)
+        return affine_transform(box(*bounds), matrix).bounds
+
+    def iter_figures(self, geom, origin_x, origin_y, mirror_y=False, bounds=None):
+        """Фигуры в координатах станка в порядке обхода тайлами. bounds - как в get_bounds"""
+        matrix = GeometryTool.get_board_transform(bounds or geom.bounds, origin_x, origin_y, mirror_y)
+        tile_size = max(1, self.config.tile_size_mm) * 1000000
+        for figure in GeometryTool.schedule_figures(geom, tile_size):
+            figure = affine_transform(figure, matrix)
+            # Сетка совпадает с округлением G-кода, поэтому привязываем уже в координатах станка
+            figure = GeometryTool.snap_to_grid(figure, self.grid_size)
+            if figure.is_empty:
+                continue
+            if isinstance(figure, MultiPolygon):
+                yield from figure.geoms
+            else:
+                yield figure
+
+    def choose_engine(self, figure):
+        """
+        Движок фигуры по настройкам: растр, аналитический для выпуклых, buffer по тайлам или целиком.
+        Возвращает (движок, вершины выпуклой фигуры или None)
+        """
+        if self.raster:
+            return "raster", None
+        if self.config.primitive_insets:
+            convex_vertices = PrimitiveInset.get_vertices(figure)
+            if convex_vertices is not None:
+                return "primitive", convex_vertices
+        tile_size = self.config.inset_tile_mm * 1000000
+        if tile_size:
+            min_x, min_y, max_x, max_y = figure.bounds
+            if max(max_x - min_x, max_y - min_y) > 2 * tile_size:
+                return "tiled", None
+        return "buffer", None
+
+    def process_figure(self, figure, engine=None, executor=None, convex_vertices=None):
+        """
+        Пути одной фигуры и ее статистика:
+        (figure_paths, rapids_before, deviation_bound, deviation, движок, время расчета в с).
+        engine и convex_vertices - результат choose_engine, если движок уже выбран.
+        executor - пул для тайлов крупной фигуры, только при вызове не из потока этого пула
+        """
+        config = self.config
+        start = perf_counter()
+        deviation_bound = deviation = 0.0
+        if engine is None:
+            engine, convex_vertices = self.choose_engine(figure)
+        if engine == "raster":
+            figure_paths = self.raster.generate_inset_paths(
+                current_geom=figure,
+                step=config.laser_beam_wide,
+                min_length_um=config.min_length_um,
+                sort_type=config.sort_type,
+                pixel=self.raster_pixel)
+            deviation_bound = self.raster.get_deviation_bound(figure, self.raster_pixel)
+            if config.raster_check:
+                deviation = self.raster.measure_deviation(
+                    figure, figure_paths or [], config.laser_beam_wide, config.min_length_um)
+        else:
+            # Пады и другие выпуклые фигуры считаются аналитически, без buffer
+            if engine != "primitive":
+                convex_vertices = None
+            elif convex_vertices is None:
+                engine = "buffer"
+            if engine == "tiled":
+                tile_size = config.inset_tile_mm * 1000000
+            else:
+                tile_size = None
+            figure_paths = GeometryTool.generate_inset_paths(
+                current_geom=figure,
+                step=config.laser_beam_wide,
+                min_length_um=config.min_length_um,
+                sort_type=config.sort_type,
+                grid_size=self.grid_size,
+                tile_size=tile_size,
+                executor=executor,
+                prune_fraction=config.prune_percent / 100,
+                convex_vertices=convex_vertices)
+
+        rapids_before = Machine.count_rapids([figure_paths]) if figure_paths else 0
+        if figure_paths and config.link_rings:
+            figure_paths = GeometryTool.link_inset_rings(figure_paths, figure, config.laser_beam_wide)
+        return figure_paths, rapids_before, deviation_bound, deviation, engine, perf_counter() - start
+
+    def iter_paths(self, figures):
+        """Генератор путей фигур (формат paths) пакетами по chunk_size фигур"""
+        chunk_size = max(1, self.config.chunk_size)
+        executor = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        figures = iter(figures)
+        try:
+            while True:
+                chunk = list(islice(figures, chunk_size))
+                if not chunk:
+                    break
+                # Крупные фигуры по тайлам считаются в этом потоке, а их тайлы - в том же пуле, что и фигуры:
+                # потоков не больше workers, и ожидание тайлов не занимает потоки пула
+                engines = [self.choose_engine(figure) for figure in chunk]
+                futures = [executor.submit(self.process_figure, figure, engine, None, convex_vertices)
+                           if executor and engine != "tiled" else None
+                           for figure, (engine, convex_vertices) in zip(chunk, engines)]
+                results = (future.result() if future else
+                           self.process_figure(figure, engine, executor, convex_vertices)
+                           for figure, (engine, convex_vertices), future in zip(chunk, engines, futures))
+                for figure, (figure_paths, rapids_before, deviation_bound, deviation, engine, elapsed) in \
+                        zip(chunk, results):
+                    self.figure_count += 1
+                    self.engine_counts[engine] = self.engine_counts.get(engine, 0) + 1
+                    self.engine_times[engine] = self.engine_times.get(engine, 0.0) + elapsed
+                    for callback in self.listeners:
+                        callback(figure, figure_paths)
+                    self.deviation_bound = max(self.deviation_bound, deviation_bound)
+                    self.max_deviation = max(self.max_deviation, deviation)
+                    if figure_paths:
+                        self.rapids_before += rapids_before
+                        self.rapids_after += Machine.count_rapids([figure_paths])
+                        yield figure_paths
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def get_report(self):
+        """Строки итогового сообщения, доступны после того как iter_paths исчерпан"""
+        report = []
+        if self.raster:
+            report.append(f"Растр: расчетная погрешность до {self.deviation_bound / 1000:.1f} мкм")
+            if self.config.raster_check:
+                report.append(f"Растр: отклонение от Shapely {self.max_deviation / 1000:.1f} мкм")
+        if self.config.primitive_insets and not self.raster:
+            report.append(f"Простые фигуры без buffer: {self.engine_counts.get('primitive', 0)} из {self.figure_count}")
+        if self.config.link_rings:
+            report.append(f"Переходов G0: {self.rapids_before} -> {self.rapids_after}")
+        return report
@@ -1,39 +1,51 @@
-from matplotlib import cm
+import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.patches import Polygon as MplPolygon
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.path import Path
+from shapely.geometry.polygon import orient
 
 
 class Plotter:
-    def __init__(self, title):
+    """
+    Просмотр через matplotlib. Все контуры рисуются одной коллекцией из массивов NumPy,
+    границы считаются по массивам. rasterized - коллекция растрируется при выводе,
+    что ускоряет перерисовку и сохранение для очень плотных плат.
+    """
+
+    def __init__(self, title, rasterized=False):
         self.title = title
+        self.rasterized = rasterized
         self.frame_polygons = None
         self.frame_path = None
 
+    @staticmethod
+    def set_limits(ax, points, padding=0.05):
+        min_x, min_y = points.min(axis=0)
+        max_x, max_y = points.max(axis=0)
+        padding_x = (max_x - min_x) * padding or 1
+        padding_y = (max_y - min_y) * padding or 1
+        ax.set_xlim(min_x - padding_x, max_x + padding_x)
+        ax.set_ylim(min_y - padding_y, max_y + padding_y)
+
     def plot_inset_paths(self, paths):
         fig, ax = plt.subplots()
         ax.set_aspect('equal', adjustable='box')
-        all_x, all_y = [], []
-        for figure_idx, figure in enumerate(paths):
-            colors = cm.get_cmap('viridis', len(figure))
+
+        segments = []
+        color_values = []
+        for figure in paths:
+            levels = max(1, len(figure) - 1)
             for level_idx, contour in enumerate(figure):
-                color = colors(level_idx)
                 if len(contour) < 3:
                     continue  # пропускаем вырожденные
-                poly_patch = MplPolygon(contour, closed=True,
-                                        facecolor='none',
-                                        edgecolor=color,
-                                        linewidth=1)
-                ax.add_patch(poly_patch)
-
-                xs, ys = zip(*contour)
-                all_x.extend(xs)
-                all_y.extend(ys)
-
-        if all_x and all_y:
-            padding_x = (max(all_x) - min(all_x)) * 0.05 or 1
-            padding_y = (max(all_y) - min(all_y)) * 0.05 or 1
-            ax.set_xlim(min(all_x) - padding_x, max(all_x) + padding_x)
-            ax.set_ylim(min(all_y) - padding_y, max(all_y) + padding_y)
+                segments.append(np.asarray(contour, dtype=float))
+                color_values.append(level_idx / levels)
+
+        if segments:
+            colors = plt.get_cmap('viridis')(np.array(color_values))
+            lines = LineCollection(segments, colors=colors, linewidths=1, rasterized=self.rasterized)
+            ax.add_collection(lines)
+            self.set_limits(ax, np.concatenate(segments))
 
         ax.grid(True, linestyle='--', alpha=0.5)
         plt.title(self.title)
@@ -42,35 +54,32 @@ class Plotter:
         plt.show()
         self.frame_path = plt
 
-
     def render_preview(self, polygons):
         if not polygons:
             print("Пустая геометрия для отрисовки")
             return
 
-        all_x, all_y = [], []
-        for p in polygons:
-            minx, miny, maxx, maxy = p.bounds
-            all_x.extend([minx, maxx])
-            all_y.extend([miny, maxy])
-
         fig, ax = plt.subplots()
-        colors = cm.get_cmap('viridis', len(polygons))
-
-        for index, poly in enumerate(polygons):
-            # ===== внешний контур =====
-            exterior_coords = list(poly.exterior.coords)
-            ax.add_patch(MplPolygon(exterior_coords, closed=True,
-                                    facecolor=colors(index), edgecolor='black'))
-
-            # ===== отверстия =====
-            for interior in poly.interiors:
-                interior_coords = list(interior.coords)
-                ax.add_patch(MplPolygon(interior_coords, closed=True,
-                                        facecolor='white', edgecolor='black'))
-
-        ax.set_xlim(min(all_x), max(all_x))
-        ax.set_ylim(min(all_y), max(all_y))
+
+        # Одна составная траектория на фигуру: внешний контур против часовой, отверстия по часовой,
+        # поэтому отверстия остаются незакрашенными
+        figure_paths = []
+        bounds = np.array([geom.bounds for geom in polygons])
+        for geom in polygons:
+            rings = []
+            for poly in getattr(geom, 'geoms', [geom]):
+                poly = orient(poly, 1.0)
+                rings += [poly.exterior] + list(poly.interiors)
+            figure_paths.append(Path.make_compound_path(
+                *[Path(np.asarray(ring.coords), closed=True) for ring in rings]))
+
+        colors = plt.get_cmap('viridis')(np.linspace(0, 1, len(polygons)))
+        collection = PathCollection(figure_paths, facecolors=colors, edgecolors='black',
+                                    rasterized=self.rasterized)
+        ax.add_collection(collection)
+
+        ax.set_xlim(bounds[:, 0].min(), bounds[:, 2].max())
+        ax.set_ylim(bounds[:, 1].min(), bounds[:, 3].max())
         ax.set_aspect('equal', adjustable='box')
 
         plt.title("MultiPolygon preview")
@@ -83,4 +92,3 @@ class Plotter:
 
     def destroy_all(self):
         pass
-
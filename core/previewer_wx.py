@@ -1,8 +1,33 @@
+import math
+import time
+
 import wx
 
+VIRIDIS_COLORS = [
+    (68, 1, 84), (72, 35, 116), (64, 67, 135), (52, 94, 141),
+    (41, 120, 142), (32, 144, 140), (34, 167, 132), (68, 190, 112),
+    (121, 209, 81), (189, 222, 38), (253, 231, 37)
+]
+
+ZOOM_STEP = 1.25
+
+# Заливка фигур в живом просмотре, поверх нее рисуются кольца
+LIVE_FIGURE_COLOR = (215, 215, 215)
+# Не чаще одной перерисовки за интервал (с), остальное время отдается расчету
+LIVE_REFRESH_INTERVAL = 0.25
+
 
 class UniversalPathsPanel(wx.Panel):
-    def __init__(self, parent, data, is_shapely=False):
+    """
+    Просмотр полигонов (is_shapely) или путей.
+    Контуры один раз собираются в GraphicsPath в координатах данных, сгруппированные по цвету
+    и размеру (уровню детализации), и рисуются через матрицу преобразования контекста.
+    Контуры меньше пикселя на экране пропускаются, готовая картинка кэшируется в битмапе.
+    Колесо мыши - масштаб, перетаскивание - сдвиг, двойной щелчок - сброс вида.
+    Если заданы bounds, контуры можно добавлять позже: новые дорисовываются поверх кэша (flush).
+    """
+
+    def __init__(self, parent, data, is_shapely=False, bounds=None):
         super().__init__(parent)
         self.data = data
         self.is_shapely = is_shapely
@@ -10,37 +35,38 @@ class UniversalPathsPanel(wx.Panel):
         self.SetBackgroundColour(wx.Colour(250, 250, 250))
         self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
         self.Bind(wx.EVT_PAINT, self.on_paint)
-
-        # Собираем все точки для вычисления границ
-        all_x, all_y = [], []
+        self.Bind(wx.EVT_SIZE, self.on_size)
+        self.Bind(wx.EVT_MOUSEWHEEL, self.on_wheel)
+        self.Bind(wx.EVT_LEFT_DOWN, self.on_left_down)
+        self.Bind(wx.EVT_LEFT_UP, self.on_left_up)
+        self.Bind(wx.EVT_MOTION, self.on_motion)
+        self.Bind(wx.EVT_LEFT_DCLICK, self.on_reset_view)
+
+        self.min_x = self.min_y = math.inf
+        self.max_x = self.max_y = -math.inf
+        if bounds:
+            self.min_x, self.min_y, self.max_x, self.max_y = bounds
+        # (цвет, уровень размера, заливка) -> GraphicsPath; уровень - log2 наибольшей стороны габарита контура
+        self.paths = {}
+        # Контуры, добавленные после последней отрисовки, в том же формате (только при заданных bounds)
+        self.pending = {} if bounds else None
+        self.renderer = wx.GraphicsRenderer.GetDefaultRenderer()
 
         if is_shapely:
-            for geom in data:
-                polygons = []
-                if hasattr(geom, 'geoms'):
-                    polygons.extend(geom.geoms)
-                else:
-                    polygons.append(geom)
-
+            for idx, geom in enumerate(data):
+                polygons = list(geom.geoms) if hasattr(geom, 'geoms') else [geom]
+                color_idx = self.color_index(idx, len(data))
                 for poly in polygons:
-                    minx, miny, maxx, maxy = poly.bounds
-                    all_x.extend([minx, maxx])
-                    all_y.extend([miny, maxy])
+                    rings = [poly.exterior.coords] + [interior.coords for interior in poly.interiors]
+                    self.add_contours(VIRIDIS_COLORS[color_idx], poly.bounds, rings, filled=True)
         else:
             for figure in data:
-                for contour in figure:
+                for level_idx, contour in enumerate(figure):
                     if len(contour) < 3:
                         continue
-                    xs, ys = zip(*contour)
-                    all_x.extend(xs)
-                    all_y.extend(ys)
-
-        if all_x and all_y:
-            self.min_x = min(all_x)
-            self.max_x = max(all_x)
-            self.min_y = min(all_y)
-            self.max_y = max(all_y)
-        else:
+                    self.add_path(contour, VIRIDIS_COLORS[self.color_index(level_idx, len(figure))])
+
+        if self.min_x == math.inf:
             self.min_x = self.min_y = 0
             self.max_x = self.max_y = 1
 
@@ -51,116 +77,178 @@ class UniversalPathsPanel(wx.Panel):
         self.min_y -= padding_y
         self.max_y += padding_y
 
-    def on_paint(self, event):
-        dc = wx.AutoBufferedPaintDC(self)
+        self.zoom = 1.0
+        self.pan_x = self.pan_y = 0.0
+        self.drag_start = None
+        self.bitmap = None
+
+    def add_contours(self, color, bounds, rings, closed=True, filled=False):
+        minx, miny, maxx, maxy = bounds
+        self.min_x = min(self.min_x, minx)
+        self.min_y = min(self.min_y, miny)
+        self.max_x = max(self.max_x, maxx)
+        self.max_y = max(self.max_y, maxy)
+
+        size_level = math.floor(math.log2(max(maxx - minx, maxy - miny, 1)))
+        key = (color, size_level, filled)
+        for paths in (self.paths,) if self.pending is None else (self.paths, self.pending):
+            path = paths.get(key)
+            if path is None:
+                path = paths[key] = self.renderer.CreatePath()
+            for ring in rings:
+                points = iter(ring)
+                path.MoveToPoint(*next(points))
+                for x, y in points:
+                    path.AddLineToPoint(x, y)
+                if closed:
+                    path.CloseSubpath()
+
+    def add_path(self, contour, color):
+        xs = [pt[0] for pt in contour]
+        ys = [pt[1] for pt in contour]
+        bounds = (min(xs), min(ys), max(xs), max(ys))
+        # Связанные в спираль пути открыты, их не замыкаем
+        closed = tuple(contour[0]) == tuple(contour[-1])
+        self.add_contours(color, bounds, [contour], closed)
+
+    def add_figure(self, figure, figure_paths):
+        """Фигура и ее пути, посчитанные конвейером; появятся на экране при flush"""
+        rings = [figure.exterior.coords] + [interior.coords for interior in figure.interiors]
+        self.add_contours(LIVE_FIGURE_COLOR, figure.bounds, rings, filled=True)
+        for level_idx, contour in enumerate(figure_paths or []):
+            if len(contour) >= 3:
+                self.add_path(contour, VIRIDIS_COLORS[self.color_index(level_idx, len(figure_paths))])
+
+    def flush(self):
+        """Дорисовать новые контуры поверх кэшированного битмапа без полной перерисовки"""
+        pending, self.pending = self.pending, {}
+        if self.bitmap is None:
+            self.Refresh(eraseBackground=False)
+            return
+        dc = wx.MemoryDC(self.bitmap)
         gc = wx.GraphicsContext.Create(dc)
-        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
-        dc.Clear()
-
-        width, height = self.GetSize()
+        self.draw_paths(gc, pending)
+        del gc
+        dc.SelectObject(wx.NullBitmap)
+        self.Refresh(eraseBackground=False)
+
+    @staticmethod
+    def color_index(idx, n):
+        return int(idx * (len(VIRIDIS_COLORS) - 1) / max(1, n - 1))
+
+    def get_view(self):
+        """Масштаб и смещение экрана относительно (min_x, max_y) данных"""
+        width, height = self.GetClientSize()
         data_width = self.max_x - self.min_x
         data_height = self.max_y - self.min_y
-        scale_x = width / data_width
-        scale_y = height / data_height
-        scale = min(scale_x, scale_y)
+        scale = min(width / data_width, height / data_height) * self.zoom
+        offset_x = (width - data_width * scale) / 2 + self.pan_x
+        offset_y = (height - data_height * scale) / 2 + self.pan_y
+        return scale, offset_x, offset_y
+
+    def invalidate(self):
+        self.bitmap = None
+        if self.pending is not None:
+            self.pending = {}
+        self.Refresh(eraseBackground=False)
+
+    def on_size(self, event):
+        self.invalidate()
+        event.Skip()
+
+    def on_wheel(self, event):
+        factor = ZOOM_STEP if event.GetWheelRotation() > 0 else 1 / ZOOM_STEP
+        mouse_x, mouse_y = event.GetPosition()
+        # Точка данных под курсором остается на месте
+        _, offset_x, offset_y = self.get_view()
+        self.zoom *= factor
+        _, new_offset_x, new_offset_y = self.get_view()
+        self.pan_x += mouse_x - (mouse_x - offset_x) * factor - new_offset_x
+        self.pan_y += mouse_y - (mouse_y - offset_y) * factor - new_offset_y
+        self.invalidate()
+
+    def on_left_down(self, event):
+        self.drag_start = event.GetPosition()
+        self.CaptureMouse()
+
+    def on_left_up(self, event):
+        self.drag_start = None
+        if self.HasCapture():
+            self.ReleaseMouse()
+
+    def on_motion(self, event):
+        if self.drag_start is None or not event.Dragging():
+            return
+        pos = event.GetPosition()
+        self.pan_x += pos.x - self.drag_start.x
+        self.pan_y += pos.y - self.drag_start.y
+        self.drag_start = pos
+        self.invalidate()
+
+    def on_reset_view(self, event):
+        self.zoom = 1.0
+        self.pan_x = self.pan_y = 0.0
+        self.invalidate()
 
-        offset_x = (width - data_width * scale) / 2
-        offset_y = (height - data_height * scale) / 2
+    def on_paint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        width, height = self.GetClientSize()
+        if width <= 0 or height <= 0:
+            return
+        if self.bitmap is None or self.bitmap.GetSize() != (width, height):
+            self.bitmap = self.render(width, height)
+        dc.DrawBitmap(self.bitmap, 0, 0)
+
+    def render(self, width, height):
+        bitmap = wx.Bitmap(width, height)
+        dc = wx.MemoryDC(bitmap)
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        gc = wx.GraphicsContext.Create(dc)
 
+        scale, offset_x, offset_y = self.get_view()
         self.draw_grid(gc, width, height, scale, offset_x, offset_y)
-
-        if self.is_shapely:
-            for idx, geom in enumerate(self.data):
-                polygons = []
-                if hasattr(geom, 'geoms'):
-                    polygons.extend(geom.geoms)
-                else:
-                    polygons.append(geom)
-                color = self.colormap(idx, len(self.data))
-                for poly in polygons:
-                    exterior_coords = list(poly.exterior.coords)
-                    interiors_coords = [list(interior.coords) for interior in poly.interiors]
-
-                    self.draw_polygon(gc,
-                                      exterior_coords,
-                                      interiors_coords,
-                                      edge_color=wx.BLACK,
-                                      fill_color=color,
-                                      scale=scale,
-                                      offset_x=offset_x,
-                                      offset_y=offset_y,
-                                      bg_color=self.GetBackgroundColour())
-        else:
-            for figure_idx, figure in enumerate(self.data):
-                for level_idx, contour in enumerate(figure):
-                    if len(contour) < 3:
-                        continue
-                    color = self.colormap(level_idx, len(figure))
-                    self.draw_polygon(gc, contour, [],
-                                      edge_color=color,
-                                      fill_color=None,
-                                      scale=scale,
-                                      offset_x=offset_x,
-                                      offset_y=offset_y,
-                                      bg_color=self.GetBackgroundColour())
+        self.draw_paths(gc, self.paths)
+        if self.pending is not None:
+            self.pending = {}
 
         self.draw_labels(dc, width, height)
-
-    def draw_polygon(self, gc, exterior_pts, interiors_pts_list, edge_color, fill_color, scale, offset_x, offset_y,
-                     bg_color):
-        # Внешний контур с заливкой
-        gc.SetPen(wx.Pen(edge_color, 1))
-        if fill_color:
-            gc.SetBrush(wx.Brush(fill_color))
-        else:
-            gc.SetBrush(wx.Brush(wx.Colour(0, 0, 0, 0)))  # прозрачная заливка
-
-        exterior_screen = [self.to_screen(x, y, scale, offset_x, offset_y) for x, y in exterior_pts]
-        path = gc.CreatePath()
-        path.MoveToPoint(*exterior_screen[0])
-        for pt in exterior_screen[1:]:
-            path.AddLineToPoint(*pt)
-        path.CloseSubpath()
-        gc.DrawPath(path)
-
-        # Отверстия (дыры) цветом фона
-        gc.SetPen(wx.Pen(edge_color, 1))
-        gc.SetBrush(wx.Brush(bg_color))
-
-        for interior_pts in interiors_pts_list:
-            interior_screen = [self.to_screen(x, y, scale, offset_x, offset_y) for x, y in interior_pts]
-            path_int = gc.CreatePath()
-            path_int.MoveToPoint(*interior_screen[0])
-            for pt in interior_screen[1:]:
-                path_int.AddLineToPoint(*pt)
-            path_int.CloseSubpath()
-            gc.DrawPath(path_int)
-
-    def to_screen(self, x, y, scale, offset_x, offset_y):
-        sx = offset_x + (x - self.min_x) * scale
-        sy = offset_y + (self.max_y - y) * scale  # инверсия Y для wx
-        return (sx, sy)
-
-    def colormap(self, idx, n):
-        viridis_colors = [
-            (68, 1, 84), (72, 35, 116), (64, 67, 135), (52, 94, 141),
-            (41, 120, 142), (32, 144, 140), (34, 167, 132), (68, 190, 112),
-            (121, 209, 81), (189, 222, 38), (253, 231, 37)
-        ]
-        i = int(idx * (len(viridis_colors) - 1) / max(1, n - 1))
-        r, g, b = viridis_colors[i]
-        return wx.Colour(r, g, b)
+        del gc
+        dc.SelectObject(wx.NullBitmap)
+        return bitmap
+
+    def draw_paths(self, gc, paths):
+        scale, offset_x, offset_y = self.get_view()
+        gc.PushState()
+        gc.SetTransform(gc.CreateMatrix(
+            scale, 0, 0, -scale,
+            offset_x - self.min_x * scale,
+            offset_y + self.max_y * scale))
+        pen_width = 1 / scale
+        # Сначала заливки, затем крупные контуры, мелкие сверху
+        for (color, size_level, filled), path in sorted(paths.items(), key=lambda item: (not item[0][2], -item[0][1])):
+            # Контур меньше пикселя на экране не рисуется
+            if 2 ** (size_level + 1) * scale < 1:
+                continue
+            if filled:
+                gc.SetPen(gc.CreatePen(wx.GraphicsPenInfo(wx.BLACK).Width(pen_width)))
+                gc.SetBrush(wx.Brush(wx.Colour(*color)))
+                gc.DrawPath(path, wx.ODDEVEN_RULE)
+            else:
+                gc.SetPen(gc.CreatePen(wx.GraphicsPenInfo(wx.Colour(*color)).Width(pen_width)))
+                gc.StrokePath(path)
+        gc.PopState()
 
     def draw_grid(self, gc, width, height, scale, offset_x, offset_y):
         gc.SetPen(wx.Pen(wx.Colour(100, 100, 100), 1, style=wx.PENSTYLE_SHORT_DASH))
         step = 50
 
-        x = offset_x
+        x = offset_x % step
         while x < width:
             gc.StrokeLine(x, 0, x, height)
             x += step
 
-        y = offset_y
+        y = offset_y % step
         while y < height:
             gc.StrokeLine(0, y, width, y)
             y += step
@@ -192,11 +280,55 @@ class UniversalPathsFrame(wx.Frame):
         self.Destroy()
 
 
+class LivePreviewFrame(wx.Frame):
+    """
+    Живой просмотр: подписывается на конвейер и показывает фигуры и кольца по мере расчета.
+    Габарит известен заранее, поэтому вид не меняется, а новое дорисовывается поверх кэша
+    не чаще LIVE_REFRESH_INTERVAL.
+    """
+
+    def __init__(self, title, bounds):
+        super().__init__(None, title=title, size=(800, 600))
+        self.panel = UniversalPathsPanel(self, [], bounds=bounds)
+        self.last_flush = 0.0
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+        self.Show()
+        wx.Yield()
+
+    def on_figure(self, figure, figure_paths):
+        if not self:
+            return  # окно уже закрыто пользователем
+        self.panel.add_figure(figure, figure_paths)
+        now = time.perf_counter()
+        if now - self.last_flush >= LIVE_REFRESH_INTERVAL:
+            self.flush()
+            self.last_flush = time.perf_counter()
+
+    def flush(self):
+        if not self:
+            return
+        self.panel.flush()
+        wx.Yield()
+
+    def on_close(self, event):
+        self.Destroy()
+
+
 class Plotter:
     def __init__(self, title):
         self.title = title
         self.frame_polygons = None
         self.frame_path = None
+        self.frame_live = None
+
+    def live_preview(self, pipeline, bounds):
+        """Подписать живой просмотр на ход конвейера"""
+        self.frame_live = LivePreviewFrame(f"{self.title} live", bounds)
+        pipeline.subscribe(self.frame_live.on_figure)
+
+    def finish_live_preview(self):
+        if self.frame_live:
+            self.frame_live.flush()
 
     def plot_inset_paths(self, paths):
         self.frame_path = UniversalPathsFrame(paths, title=f"{self.title} paths", is_shapely=False)
@@ -209,4 +341,5 @@ class Plotter:
             self.frame_polygons.Destroy()
         if self.frame_path:
             self.frame_path.Destroy()
-
+        if self.frame_live:
+            self.frame_live.Destroy()
@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+
+HILBERT_ORDER = 16
+SPIRAL_POINTS_PER_TURN = 16
+
+
+class Punch:
+    """
+    Отдельное задание кернения: по точке на каждое отверстие вместо колец вокруг керна.
+    Центры отверстий (нм, массив N x 2) переводятся в координаты станка той же матрицей,
+    что и медь слоя, упорядочиваются по кривой Гильберта и выжигаются выдержкой (M3 + G4)
+    или короткой спиралью.
+    """
+
+    @staticmethod
+    def transform(centers, matrix):
+        """Матрица shapely.affinity.affine_transform [a, b, d, e, xoff, yoff] для массива точек"""
+        a, b, d, e, x_off, y_off = matrix
+        x, y = centers[:, 0], centers[:, 1]
+        return np.column_stack((a * x + b * y + x_off, d * x + e * y + y_off))
+
+    @staticmethod
+    def get_hilbert_index(x, y, order=HILBERT_ORDER):
+        """Номер клетки на кривой Гильберта для целочисленных x, y из [0, 2**order)"""
+        n = 1 << order
+        x = x.copy()
+        y = y.copy()
+        index = np.zeros(len(x), dtype=np.int64)
+        s = n >> 1
+        while s > 0:
+            rx = (x & s) > 0
+            ry = (y & s) > 0
+            index += s * s * ((3 * rx) ^ ry)
+            # Поворот четверти, чтобы следующий уровень шел в той же ориентации
+            flip = ~ry & rx
+            x = np.where(flip, n - 1 - x, x)
+            y = np.where(flip, n - 1 - y, y)
+            x, y = np.where(ry, x, y), np.where(ry, y, x)
+            s >>= 1
+        return index
+
+    @classmethod
+    def get_order(cls, centers, order=HILBERT_ORDER):
+        """Индексы обхода точек по кривой Гильберта: соседние точки идут подряд, O(n log n)"""
+        if len(centers) < 3:
+            return np.arange(len(centers))
+        min_xy = centers.min(axis=0)
+        size = max((centers.max(axis=0) - min_xy).max(), 1)
+        cells = ((centers - min_xy) / size * ((1 << order) - 1)).astype(np.int64)
+        return np.argsort(cls.get_hilbert_index(cells[:, 0], cells[:, 1], order), kind="stable")
+
+    @classmethod
+    def order_centers(cls, centers, order=HILBERT_ORDER):
+        """Центры отверстий в порядке обхода по кривой Гильберта"""
+        return centers[cls.get_order(centers, order)]
+
+    @staticmethod
+    def get_spiral(radius, pitch):
+        """Архимедова спираль от центра до radius с шагом витка pitch: смещения (N x 2)"""
+        turns = max(radius / pitch, 1)
+        angle = np.linspace(0, 2 * math.pi * turns, int(math.ceil(turns * SPIRAL_POINTS_PER_TURN)) + 1)
+        r = angle / (2 * math.pi * turns) * radius
+        return np.column_stack((r * np.cos(angle), r * np.sin(angle)))
+
+    @classmethod
+    def iter_marks(cls, centers, laser_power=255, dwell_ms=100, spiral_radius=0, pitch=25000, speed=750,
+                   round_um=2):
+        """
+        Строки G-кода меток без заголовка и завершения (см. Machine.iter_gcode(extra_commands=...)).
+        spiral_radius = 0 - выдержка на месте: M3 держит мощность и без движения, затем возврат в M4.
+        """
+        nm_to_mm = 1e-6
+        scale = 1e-3 * round_um
+        points = np.round(centers * nm_to_mm / scale) * scale
+        if spiral_radius:
+            spiral = np.round(cls.get_spiral(spiral_radius, pitch) * nm_to_mm / scale) * scale
+            for x, y in points:
+                yield f"G0X{x:.3f}Y{y:.3f}S0"
+                first_point = True
+                for dx, dy in spiral[1:]:
+                    if first_point:
+                        first_point = False
+                        yield f"G1X{x + dx:.3f}Y{y + dy:.3f}F{speed}S{laser_power}"
+                    else:
+                        yield f"X{x + dx:.3f}Y{y + dy:.3f}"
+        else:
+            dwell = dwell_ms / 1000
+            for x, y in points:
+                yield f"G0X{x:.3f}Y{y:.3f}S0"
+                yield f"M3S{laser_power}"
+                yield f"G4P{dwell:.3f}"
+                yield "M4S0"
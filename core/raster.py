@@ -0,0 +1,101 @@
+import math
+
+import numpy as np
+import shapely
+from contourpy import contour_generator, LineType
+from scipy.ndimage import distance_transform_edt
+
+from core.geometry import GeometryTool
+
+# Предел размера растра одной фигуры, при превышении пиксель укрупняется
+MAX_RASTER_PIXELS = 25_000_000
+
+
+class RasterInset:
+    """
+    Приближенный генератор отступов: фигура растеризуется один раз,
+    по евклидовой карте расстояний все уровни снимаются как изолинии.
+    """
+
+    @staticmethod
+    def get_pixel_size(geom, base_pixel):
+        minx, miny, maxx, maxy = geom.bounds
+        area = (maxx - minx + 2 * base_pixel) * (maxy - miny + 2 * base_pixel)
+        return max(base_pixel, math.sqrt(area / MAX_RASTER_PIXELS))
+
+    @staticmethod
+    def rasterize(geom, pixel):
+        """Маска центров пикселей, попавших в фигуру. Вокруг фигуры остается пустая рамка"""
+        minx, miny, maxx, maxy = geom.bounds
+        nx = int(math.ceil((maxx - minx) / pixel)) + 3
+        ny = int(math.ceil((maxy - miny) / pixel)) + 3
+        xs = minx - pixel + np.arange(nx) * pixel
+        ys = miny - pixel + np.arange(ny) * pixel
+
+        shapely.prepare(geom)
+        mask = shapely.contains_xy(geom, xs[np.newaxis, :], ys[:, np.newaxis])
+        return mask, xs, ys
+
+    @staticmethod
+    def get_distance_map(mask, pixel):
+        # Граница фигуры проходит посередине между пикселями, отсюда поправка в полпикселя
+        distance = distance_transform_edt(mask).astype(np.float32)
+        distance = (distance - 0.5) * pixel
+        distance[~mask] = 0
+        return distance
+
+    @staticmethod
+    def get_inset_levels(current_geom, step: float, min_length_um, pixel):
+        """Кольца всех уровней отступа, аналог GeometryTool.get_inset_levels"""
+        min_length = min_length_um * 1000
+        pixel = RasterInset.get_pixel_size(current_geom, pixel)
+        mask, xs, ys = RasterInset.rasterize(current_geom, pixel)
+        distance = RasterInset.get_distance_map(mask, pixel)
+
+        if distance.max() < step:
+            return []
+
+        # Все уровни k * step - нули одного поля sin(pi * d / step), изолинии снимаются за один проход.
+        # Снаружи фигуры поле положительное, чтобы граница самой фигуры не давала контур
+        field = np.sin(distance * (np.pi / step))
+        field[~mask] = 1
+        generator = contour_generator(x=xs, y=ys, z=field, line_type=LineType.Separate)
+
+        lines = [line for line in generator.lines(0.0) if len(line) >= 4]
+        if not lines:
+            return []
+
+        # Ступеньки растра убираются упрощением в пределах половины пикселя
+        indices = np.repeat(np.arange(len(lines)), [len(line) for line in lines])
+        rings = shapely.linestrings(np.concatenate(lines), indices=indices)
+        rings = shapely.simplify(rings, pixel / 2, preserve_topology=False)
+        lengths = shapely.length(rings)
+
+        inset_levels = []
+        for ring, length in zip(rings, lengths):
+            if length > min_length:
+                inset_levels.append(list(ring.coords))
+        return inset_levels
+
+    @staticmethod
+    def generate_inset_paths(current_geom, step: float, min_length_um, sort_type, pixel):
+        inset_levels = RasterInset.get_inset_levels(current_geom, step, min_length_um, pixel)
+        return GeometryTool.sort_inset_levels(inset_levels, sort_type)
+
+    @staticmethod
+    def get_deviation_bound(current_geom, pixel):
+        """Теоретическая погрешность изолиний: полдиагонали пикселя плюс упрощение"""
+        pixel = RasterInset.get_pixel_size(current_geom, pixel)
+        return pixel * (math.sqrt(2) / 2 + 0.5)
+
+    @staticmethod
+    def measure_deviation(current_geom, raster_paths, step: float, min_length_um):
+        """Максимальное отклонение (расстояние Хаусдорфа) от точного результата Shapely"""
+        exact_paths = GeometryTool.get_inset_levels(current_geom, step, min_length_um)
+        if not exact_paths and not raster_paths:
+            return 0.0
+        if not exact_paths or not raster_paths:
+            return step
+        exact_lines = shapely.multilinestrings([shapely.linestrings(p) for p in exact_paths])
+        raster_lines = shapely.multilinestrings([shapely.linestrings(p) for p in raster_paths])
+        return shapely.hausdorff_distance(exact_lines, raster_lines)
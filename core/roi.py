@@ -0,0 +1,90 @@
+import numpy as np
+from shapely import STRtree, box
+
+
+class BoardIndex:
+    """
+    Пространственный индекс объектов платы для выгрузки области (ROI).
+    Строится за один проход по габаритам объектов, без перевода их в полигоны:
+    в полигоны и объединение затем идут только объекты, попавшие в область с полем.
+    Габариты в координатах платы KiCad (нм, ось Y вниз).
+    """
+
+    def __init__(self, board):
+        self.footprints = list(board.GetFootprints())
+        self.pads = [(fp, pad) for fp in self.footprints for pad in fp.Pads()]
+        self.tracks = list(board.GetTracks())
+        self.drawings = list(board.Drawings())
+        self.zones = list(board.Zones())
+
+        items = [pad for _, pad in self.pads] + self.tracks + self.drawings
+        self.items = items
+        self.boxes = np.array([self.get_box(item) for item in items], dtype=float).reshape(-1, 4)
+        self.tree = STRtree(box(self.boxes[:, 0], self.boxes[:, 1], self.boxes[:, 2], self.boxes[:, 3]))
+
+    @staticmethod
+    def get_box(item):
+        bbox = item.GetBoundingBox()
+        return bbox.GetLeft(), bbox.GetTop(), bbox.GetRight(), bbox.GetBottom()
+
+    @staticmethod
+    def parse_rect(text):
+        """Прямоугольник "x1,y1,x2,y2" в мм координат KiCad: (min_x, min_y, max_x, max_y) в нм"""
+        try:
+            x1, y1, x2, y2 = (float(value) * 1000000 for value in text.split(","))
+        except ValueError:
+            raise ValueError(f"Неверная область '{text}': ожидается 'x1,y1,x2,y2' в мм")
+        if x1 == x2 or y1 == y2:
+            raise ValueError(f"Неверная область '{text}': прямоугольник нулевой площади")
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+    def get_selection_bounds(self):
+        """Габарит выделенных в KiCad объектов (любой слой, в том числе рамка на User), None - ничего не выделено"""
+        selected = [item for item in self.footprints + self.items + self.zones if item.IsSelected()]
+        if not selected:
+            return None
+        boxes = np.array([self.get_box(item) for item in selected], dtype=float)
+        return (*boxes[:, :2].min(axis=0), *boxes[:, 2:].max(axis=0))
+
+    def query(self, bounds, margin=0):
+        """Объекты, габарит которых пересекает область с полем: (пары (футпринт, пад), дорожки, рисунки)"""
+        min_x, min_y, max_x, max_y = bounds
+        indices = np.sort(self.tree.query(box(min_x - margin, min_y - margin, max_x + margin, max_y + margin)))
+        n_pads, n_tracks = len(self.pads), len(self.tracks)
+        pads = [self.pads[i] for i in indices[indices < n_pads]]
+        tracks = [self.tracks[i - n_pads] for i in indices[(indices >= n_pads) & (indices < n_pads + n_tracks)]]
+        drawings = [self.drawings[i - n_pads - n_tracks] for i in indices[indices >= n_pads + n_tracks]]
+        return pads, tracks, drawings
+
+    def get_layer_bounds(self, layer, get_item_bounds, include_tracks=True):
+        """
+        Габарит меди слоя по всей плате, как у полного задания, без перевода всей платы в полигоны.
+        Крайние значения берутся по габаритам объектов; объекты у края (в пределах погрешности
+        перевода в полигоны) уточняются точными габаритами get_item_bounds(item, layer).
+        """
+        from core.extractor import MAX_ERROR
+
+        n_pads = len(self.pads)
+        mask = np.array([item.IsOnLayer(layer) for item in self.items], dtype=bool)
+        if not include_tracks:
+            # Без дорожек (только пады) остаются переходные отверстия, как при извлечении
+            for i, track in enumerate(self.tracks):
+                if track.GetClass() != "PCB_VIA":
+                    mask[n_pads + i] = False
+        if not mask.any():
+            return None
+
+        boxes = self.boxes.copy()
+        extremes = np.concatenate((boxes[mask, :2].min(axis=0), boxes[mask, 2:].max(axis=0)))
+        tolerance = 2 * MAX_ERROR
+        near = mask & ((boxes[:, :2] <= extremes[:2] + tolerance).any(axis=1) |
+                       (boxes[:, 2:] >= extremes[2:] - tolerance).any(axis=1))
+        for i in np.flatnonzero(near):
+            item_bounds = get_item_bounds(self.items[i], layer)
+            if item_bounds is None:
+                mask[i] = False
+            else:
+                boxes[i] = item_bounds
+        if not mask.any():
+            return None
+        return (*boxes[mask, :2].min(axis=0), *boxes[mask, 2:].max(axis=0))
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import sys
+import termios
+import time
+import tty
+from collections import deque
+
+GRBL_RX_BUFFER_SIZE = 128
+# Открытие порта перезагружает Arduino: ждем приветствие "Grbl ..." не дольше, с
+CONNECT_TIMEOUT = 5.0
+# Ожидание ответа на строку: GRBL отвечает, когда освобождается место в буфере планировщика, с
+RESPONSE_TIMEOUT = 60.0
+
+
+class GrblError(Exception):
+    """Ответ error:/ALARM: - отправка останавливается на строке line_number"""
+
+    def __init__(self, line_number, line, response):
+        super().__init__(f"строка {line_number} '{line}': {response}")
+        self.line_number = line_number
+        self.line = line
+        self.response = response
+
+
+class SenderStats:
+    def __init__(self):
+        self.lines = 0
+        self.bytes = 0
+        self.acks = 0
+        self.errors = []
+        # GrblError, на которой отправка остановлена
+        self.stopped = None
+        self.elapsed = 0.0
+        self.stall_time = 0.0
+
+    @property
+    def lines_per_second(self):
+        return self.lines / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "lines": self.lines,
+            "acks": self.acks,
+            "bytes": self.bytes,
+            "errors": len(self.errors),
+            "elapsed_s": self.elapsed,
+            "lines_per_s": self.lines_per_second,
+            "stall_s": self.stall_time,
+        }
+
+    def __str__(self):
+        text = (f"Отправлено строк: {self.lines} за {self.elapsed:.1f} с ({self.lines_per_second:.0f} строк/с), "
+                f"ожидание буфера: {self.stall_time:.1f} с, ошибок: {len(self.errors)}")
+        if self.stopped:
+            text += f"\nОтправка остановлена: {self.stopped}"
+        return text
+
+
+class GrblSender:
+    """
+    Потоковая отправка G-кода в GRBL с подсчетом символов (character counting):
+    в приемном буфере контроллера всегда держится столько строк, сколько в него помещается,
+    подтверждение "ok"/"error" освобождает место, занятое самой старой строкой.
+    Отправка начинается после приветствия GRBL, на error: или ALARM: останавливается.
+    """
+
+    def __init__(self, port, baudrate=115200, rx_buffer_size=GRBL_RX_BUFFER_SIZE,
+                 connect_timeout=CONNECT_TIMEOUT, response_timeout=RESPONSE_TIMEOUT):
+        self.port = port
+        self.baudrate = baudrate
+        self.rx_buffer_size = rx_buffer_size
+        self.connect_timeout = connect_timeout
+        self.response_timeout = response_timeout
+
+    def open_port(self):
+        fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(fd, termios.TCSANOW)
+        speed = getattr(termios, f"B{self.baudrate}", None)
+        if speed is not None:
+            attrs = termios.tcgetattr(fd)
+            attrs[4] = attrs[5] = speed
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+        return fd
+
+    @staticmethod
+    async def connect(fd):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", 0))
+        write_transport, write_protocol = await loop.connect_write_pipe(
+            asyncio.streams.FlowControlMixin, os.fdopen(os.dup(fd), "wb", 0))
+        writer = asyncio.StreamWriter(write_transport, write_protocol, reader, loop)
+        return reader, writer
+
+    async def wait_banner(self, reader):
+        """Ждет приветствие "Grbl ..." после перезагрузки контроллера, все до него отбрасывается"""
+        async def read_banner():
+            while not (await reader.readline()).strip().startswith(b"Grbl"):
+                pass
+
+        try:
+            await asyncio.wait_for(read_banner(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"GRBL на {self.port} не ответил за {self.connect_timeout:.0f} с") from None
+
+    async def stream(self, commands):
+        """
+        Отправляет строки из любого итерируемого источника, например Machine.iter_gcode.
+        Номера строк в отчете об ошибке - номера в источнике, с 1
+        """
+        stats = SenderStats()
+        reader, writer = await self.connect(self.open_port())
+        pending = deque()
+        buffered = 0
+
+        async def wait_ack():
+            nonlocal buffered
+            while True:
+                try:
+                    response = (await asyncio.wait_for(reader.readline(), self.response_timeout)).strip()
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"GRBL не ответил за {self.response_timeout:.0f} с") from None
+                if response == b"ok" or response.startswith((b"error", b"ALARM")):
+                    break
+            line_number, sent_line = pending.popleft()
+            buffered -= len(sent_line)
+            stats.acks += 1
+            if response != b"ok":
+                error = GrblError(line_number, sent_line.decode().strip(), response.decode())
+                stats.errors.append(error)
+                raise error
+
+        start = time.perf_counter()
+        try:
+            await self.wait_banner(reader)
+            for line_number, command in enumerate(commands, 1):
+                command = command.strip()
+                if not command:
+                    continue
+                line = (command + "\n").encode()
+                stall_start = time.perf_counter()
+                while pending and buffered + len(line) > self.rx_buffer_size:
+                    await wait_ack()
+                stats.stall_time += time.perf_counter() - stall_start
+
+                writer.write(line)
+                await writer.drain()
+                pending.append((line_number, line))
+                buffered += len(line)
+                stats.lines += 1
+                stats.bytes += len(line)
+
+            while pending:
+                await wait_ack()
+        except GrblError as error:
+            # Строки после ошибки не отправляются, уже принятые контроллером дорабатывают
+            stats.stopped = error
+        finally:
+            stats.elapsed = time.perf_counter() - start
+            writer.close()
+        return stats
+
+    def stream_commands(self, commands):
+        return asyncio.run(self.stream(commands))
+
+    def stream_file(self, filename):
+        with open(filename, "r", encoding="utf-8") as f:
+            return self.stream_commands(f)
+
+
+if __name__ == '__main__':
+    # python -m core.sender laser_F_Cu.gcode /dev/ttyUSB0
+    sender = GrblSender(sys.argv[2])
+    print(sender.stream_file(sys.argv[1]))
@@ -6,27 +6,80 @@ class PluginConfig:
     COPPER_LAYERS = {0: "F_Cu", 2: "B_Cu"}
     SORT_TYPES = {0: "NNa", 1: "K-opt"}
     VIEW_TYPES = {0: "WX", 1: "MPL"}
+    INSET_ENGINES = {0: "Shapely", 1: "Растр EDT"}
+    PANEL_ROTATIONS = {0: "0°", 90: "90°", 180: "180°", 270: "270°"}
+    SWEEP_MODES = {0: "Выкл", 1: "Файл на вариант", 2: "Варианты рядом в одном файле"}
+    ROI_MODES = {0: "Вся плата", 1: "Выделение в KiCad", 2: "Прямоугольник"}
+    PUNCH_MODES = {0: "Кольца вокруг керна", 1: "Отдельный файл", 2: "В конце задания слоя"}
+    # Вкладки окна настроек: поле без "group" попадает на первую
+    GROUPS = {"main": "Основные", "inset": "Отступы", "machine": "Станок",
+              "panel": "Панель и стол", "verify": "Проверка и просмотр", "startup": "Запуск и потоки"}
 
     FIELDS = {
         "user_dir":             {"default": "/home/user", "type": str, "label": "Рабочая директория"},
         "copper_layer":         {"default": 2, "type": int, "label": "Слой меди", "choices": COPPER_LAYERS},
+        "both_layers":          {"default": False, "type": bool, "label": "Обе стороны за один запуск"},
         "laser_beam_wide":      {"default": 25000, "type": int, "label": "Диаметр лазерного луча (нм)"},
         "laser_power":          {"default": 255, "type": int, "label": "Мощность лазера (S)"},
         "base_speed":           {"default": 900, "type": int, "label": "Базовая скорость (F)"},
         "short_speed":          {"default": 750, "type": int, "label": "Скорость коротких участков (F)"},
         "arc_segments":         {"default": 32, "type": int, "label": "Сегментация окружностей (ед)"},
         "round_um":             {"default": 2, "type": int, "label": "Округление координат (мкм)"},
+        "snap_grid":            {"default": False, "type": bool, "label": "Привязка к сетке округления"},
         "min_length_um":        {"default": 400, "type": int, "label": "Минимальная длина пути (мкм)"},
         "max_contour_length":   {"default": 15, "type": int, "label": "Макс. длина контура (мм)"},
         "min_contour_length":   {"default": 1, "type": int, "label": "Мин. длина контура (мм)"},
         "sort_type":            {"default": 1, "type": int, "label": "Тип сортировки путей", "choices": SORT_TYPES},
-        "view_type":            {"default": 0, "type": int, "label": "Класс просмотра", "choices": VIEW_TYPES},
-        "show_preview":         {"default": False, "type": bool, "label": "Предпросмотр платы"},
-        "show_paths":           {"default": False, "type": bool, "label": "Показать пути"},
+        "inset_engine":         {"default": 0, "type": int, "label": "Генератор отступов", "choices": INSET_ENGINES, "group": "inset"},
+        "raster_scale":         {"default": 5, "type": int, "label": "Растр: пиксель (x округление)", "group": "inset"},
+        "raster_check":         {"default": False, "type": bool, "label": "Растр: сверять с Shapely", "group": "inset"},
+        "primitive_insets":     {"default": True, "type": bool, "label": "Простые фигуры без buffer", "group": "inset"},
+        "prune_percent":        {"default": 0, "type": int, "label": "Отбрасывать кольца с новым засветом < (%)", "group": "inset"},
+        "link_rings":           {"default": False, "type": bool, "label": "Связывать кольца в спираль", "group": "inset"},
+        "feed_plan":            {"default": False, "type": bool, "label": "Подача по отрезкам", "group": "machine"},
+        "feed_threshold":       {"default": 50, "type": int, "label": "Порог смены подачи (F)", "group": "machine"},
+        "save_toolpath":        {"default": False, "type": bool, "label": "Сохранять пути (.ltp)"},
+        "estimate_job":         {"default": True, "type": bool, "label": "Оценивать время работы", "group": "machine"},
+        "verify_coverage":      {"default": False, "type": bool, "label": "Проверять засвет меди (растр)", "group": "verify"},
+        "verify_scale":         {"default": 1, "type": int, "label": "Проверка засвета: пиксель (x округление)", "group": "verify"},
+        "acceleration":         {"default": 1500, "type": int, "label": "Ускорение станка (мм/с²)", "group": "machine"},
+        "junction_um":          {"default": 10, "type": int, "label": "Отклонение на стыках (мкм)", "group": "machine"},
+        "rapid_rate":           {"default": 3000, "type": int, "label": "Скорость G0 (мм/мин)", "group": "machine"},
+        "inset_tile_mm":        {"default": 0, "type": int, "label": "Тайлы крупных фигур (мм, 0 - выкл)", "group": "inset"},
+        "tile_size_mm":         {"default": 10, "type": int, "label": "Размер тайла обхода фигур (мм)", "group": "inset"},
+        "chunk_size":           {"default": 256, "type": int, "label": "Фигур в пакете обработки", "group": "startup"},
+        "workers":              {"default": 1, "type": int, "label": "Потоков обработки", "group": "startup"},
+        "auto_tune":            {"default": False, "type": bool, "label": "Автовыбор числа потоков", "group": "startup"},
+        "warm_up_imports":      {"default": False, "type": bool, "label": "Прогревать модули при старте KiCad", "group": "startup"},
+        "sweep_mode":           {"default": 0, "type": int, "label": "Калибровка: режим", "choices": SWEEP_MODES, "group": "panel"},
+        "sweep_beam_wide":      {"default": "", "type": str, "label": "Калибровка: диаметры луча (нм)", "group": "panel"},
+        "sweep_power":          {"default": "", "type": str, "label": "Калибровка: мощности (S)", "group": "panel"},
+        "sweep_speed":          {"default": "", "type": str, "label": "Калибровка: скорости (F)", "group": "panel"},
+        "bed_jobs":             {"default": "", "type": str, "label": "Стол: пути других плат (.ltp через ;)", "group": "panel"},
+        "bed_width_mm":         {"default": 300, "type": int, "label": "Стол: ширина (мм)", "group": "panel"},
+        "bed_height_mm":        {"default": 200, "type": int, "label": "Стол: высота (мм)", "group": "panel"},
+        "view_type":            {"default": 0, "type": int, "label": "Класс просмотра", "choices": VIEW_TYPES, "group": "verify"},
+        "preview_rasterized":   {"default": False, "type": bool, "label": "MPL: растровый вывод просмотра", "group": "verify"},
+        "show_preview":         {"default": False, "type": bool, "label": "Предпросмотр платы", "group": "verify"},
+        "show_paths":           {"default": False, "type": bool, "label": "Показать пути", "group": "verify"},
+        "live_preview":         {"default": False, "type": bool, "label": "Живой просмотр расчета (WX)", "group": "verify"},
         "tent_th":              {"default": False, "type": bool, "label": "Тентовать TH"},
         "tent_via":             {"default": False, "type": bool, "label": "Тентовать VIA"},
-        "punch_holes":          {"default": False, "type": bool, "label": "Кернить отверстия"},
+        "punch_holes":          {"default": False, "type": bool, "label": "Кернить отверстия", "group": "machine"},
+        "punch_mode":           {"default": 0, "type": int, "label": "Кернение: вывод", "choices": PUNCH_MODES, "group": "machine"},
+        "punch_dwell_ms":       {"default": 100, "type": int, "label": "Кернение: выдержка (мс)", "group": "machine"},
+        "punch_spiral_um":      {"default": 0, "type": int, "label": "Кернение: радиус спирали (мкм, 0 - точка)", "group": "machine"},
         "only_pad":             {"default": False, "type": bool, "label": "Только пады"},
+        "track_centerlines":    {"default": False, "type": bool, "label": "Дорожки по осевым линиям"},
+        "track_max_levels":     {"default": 4, "type": int, "label": "Дорожки по осям: макс. проходов на сторону"},
+        "roi_mode":             {"default": 0, "type": int, "label": "Область", "choices": ROI_MODES, "group": "panel"},
+        "roi_rect_mm":          {"default": "", "type": str, "label": "Область: x1,y1,x2,y2 (мм KiCad)", "group": "panel"},
+        "roi_margin_um":        {"default": 500, "type": int, "label": "Область: поле вокруг (мкм)", "group": "panel"},
+        "panel_rows":           {"default": 1, "type": int, "label": "Панель: рядов", "group": "panel"},
+        "panel_cols":           {"default": 1, "type": int, "label": "Панель: колонок", "group": "panel"},
+        "panel_spacing_um":     {"default": 2000, "type": int, "label": "Панель: зазор между платами (мкм)", "group": "panel"},
+        "panel_rotation":       {"default": 0, "type": int, "label": "Панель: поворот платы",
+                                 "choices": PANEL_ROTATIONS, "group": "panel"},
 
     }
 
@@ -39,23 +92,92 @@ class PluginConfig:
         self.tent_via = False
         self.show_preview = False
         self.show_paths = False
+        self.live_preview = False
         self.only_pad = False
+        self.track_centerlines = False
+        self.track_max_levels = 4
+        self.roi_mode = 0
+        self.roi_rect_mm = ""
+        self.roi_margin_um = 500
+        self.panel_rows = 1
+        self.panel_cols = 1
+        self.panel_spacing_um = 2000
+        self.panel_rotation = 0
         self.punch_holes = False
+        self.punch_mode = 0
+        self.punch_dwell_ms = 100
+        self.punch_spiral_um = 0
         self.sort_type = 1
         self.min_length_um = 400
         self.copper_layer = 0
+        self.both_layers = False
         self.laser_beam_wide = 25000
         self.base_speed = 900
         self.short_speed = 750
         self.laser_power = 255
         self.round_um = 2
+        self.snap_grid = False
+        self.sweep_mode = 0
+        self.sweep_beam_wide = ""
+        self.sweep_power = ""
+        self.sweep_speed = ""
+        self.bed_jobs = ""
+        self.bed_width_mm = 300
+        self.bed_height_mm = 200
         self.view_type = 0
+        self.preview_rasterized = False
+        self.inset_engine = 0
+        self.raster_scale = 5
+        self.raster_check = False
+        self.primitive_insets = True
+        self.prune_percent = 0
+        self.link_rings = False
+        self.feed_plan = False
+        self.feed_threshold = 50
+        self.save_toolpath = False
+        self.estimate_job = True
+        self.verify_coverage = False
+        self.verify_scale = 1
+        self.acceleration = 1500
+        self.junction_um = 10
+        self.rapid_rate = 3000
+        self.inset_tile_mm = 0
+        self.tile_size_mm = 10
+        self.chunk_size = 256
+        self.workers = 1
+        self.auto_tune = False
+        self.warm_up_imports = False
         self.user_dir = "/home/user"
         self._config_file_name = os.path.join(os.path.dirname(__file__), "config.json")
 
         for key, meta in self.FIELDS.items():
             setattr(self, key, meta["default"])
 
+    def get_machine_settings(self):
+        """Параметры Machine.generate_gcode_to_file / Machine.iter_gcode"""
+        return {
+            "base_speed": self.base_speed,
+            "short_speed": self.short_speed,
+            "laser_power": self.laser_power,
+            "round_um": self.round_um,
+            "min_contour_length": self.min_contour_length,
+            "max_contour_length": self.max_contour_length,
+            "plan_feed": self.feed_plan,
+            "acceleration": self.acceleration,
+            "feed_threshold": self.feed_threshold,
+        }
+
+    def get_punch_settings(self):
+        """Параметры Punch.iter_marks"""
+        return {
+            "laser_power": self.laser_power,
+            "dwell_ms": self.punch_dwell_ms,
+            "spiral_radius": self.punch_spiral_um * 1000,
+            "pitch": self.laser_beam_wide,
+            "speed": self.short_speed,
+            "round_um": self.round_um,
+        }
+
     def load_config(self):
         if not os.path.isfile(self._config_file_name):
             return
@@ -0,0 +1,47 @@
+import importlib
+import sys
+import threading
+import time
+
+# Время импорта (с), заполняется при регистрации, прогреве и первом запуске
+IMPORT_TIMES = {}
+
+# Тяжелые модули, которые можно загрузить заранее в фоне. wx-модули плагина сюда не входят:
+# создавать что-либо из wx можно только в главном потоке
+WARM_UP_MODULES = ("numpy", "shapely", "core.geometry", "core.machine", "core.pipeline", "core.estimator")
+
+WARM_UP_DELAY = 5.0
+
+
+def timed_import(name):
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def warm_up(modules=WARM_UP_MODULES):
+    for name in modules:
+        try:
+            timed_import(name)
+        except ImportError as e:
+            print(f"Laser: не удалось загрузить {name}: {e}")
+
+
+def schedule_warm_up(delay=WARM_UP_DELAY):
+    """
+    Прогрев импортов в фоновом потоке после того, как KiCad закончит загрузку:
+    поток стартует из очереди событий wx, то есть когда главный цикл уже работает.
+    """
+    def worker():
+        time.sleep(delay)
+        warm_up()
+
+    def start():
+        threading.Thread(target=worker, name="laser-warm-up", daemon=True).start()
+
+    wx = sys.modules.get("wx")
+    if wx is not None and wx.GetApp() is not None:
+        wx.CallAfter(start)
+    else:
+        start()
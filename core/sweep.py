@@ -0,0 +1,134 @@
+import copy
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+
+from core.machine import Machine
+from core.panel import Panel
+from core.pipeline import Pipeline
+
+SWEEP_FIELDS = ("laser_beam_wide", "laser_power", "base_speed")
+
+
+class Sweep:
+    """
+    Калибровочная серия: перебор диаметра луча, мощности и скорости по заданным диапазонам.
+    Геометрия слоя готовится один раз, отступы считаются по одному разу на каждый диаметр луча
+    (параллельно), мощность и скорость меняются только при выпуске G-кода.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.ranges = {
+            "laser_beam_wide": self.parse_values(config.sweep_beam_wide, config.laser_beam_wide),
+            "laser_power": self.parse_values(config.sweep_power, config.laser_power),
+            "base_speed": self.parse_values(config.sweep_speed, config.base_speed),
+        }
+
+    @staticmethod
+    def parse_values(text, default):
+        """
+        Значения параметра: "" - текущее значение, "a,b,c" - список, "start:stop:step" - диапазон
+        с концом включительно. Неверная строка - сообщение и текущее значение.
+        """
+        text = text.strip()
+        if not text:
+            return [default]
+        try:
+            if ":" in text:
+                start, stop, step = (int(value) for value in text.split(":"))
+                if step <= 0 or stop < start:
+                    raise ValueError
+                return list(range(start, stop + 1, step))
+            return [int(value) for value in text.split(",")]
+        except ValueError:
+            print(f"Неверный диапазон '{text}': ожидается 'a,b,c' или 'start:stop:step', "
+                  f"используется {default}")
+            return [default]
+
+    def get_variants(self):
+        """Все сочетания значений: список словарей {поле: значение}"""
+        return [dict(zip(SWEEP_FIELDS, values)) for values in product(*(self.ranges[key] for key in SWEEP_FIELDS))]
+
+    def get_variant_config(self, variant):
+        config = copy.copy(self.config)
+        for key, value in variant.items():
+            setattr(config, key, value)
+        if "base_speed" in variant:
+            # Скорость коротких участков меняется пропорционально базовой
+            config.short_speed = int(self.config.short_speed * variant["base_speed"] / max(1, self.config.base_speed))
+        return config
+
+    def compute_paths(self, geom, origin_x, origin_y, mirror_y=False):
+        """Пути для каждого диаметра луча: {laser_beam_wide: paths}"""
+        widths = self.ranges["laser_beam_wide"]
+
+        def worker(width):
+            pipeline = Pipeline(self.get_variant_config({"laser_beam_wide": width}))
+            return list(pipeline.iter_paths(pipeline.iter_figures(geom, origin_x, origin_y, mirror_y)))
+
+        # Число потоков ограничено настройкой и числом ядер, а не числом диаметров
+        max_workers = min(len(widths), max(1, self.config.workers), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers) as executor:
+            return dict(zip(widths, executor.map(worker, widths)))
+
+    @staticmethod
+    def get_bounds(width_paths):
+        """Общий габарит путей всех диаметров: шаг сетки по самому широкому варианту"""
+        bounds = [Panel.get_bounds(paths) for paths in width_paths.values() if paths]
+        if not bounds:
+            return 0, 0, 0, 0
+        min_x, min_y, max_x, max_y = zip(*bounds)
+        return min(min_x), min(min_y), max(max_x), max(max_y)
+
+    @staticmethod
+    def get_variant_name(variant):
+        return f"w{variant['laser_beam_wide']}_p{variant['laser_power']}_f{variant['base_speed']}"
+
+    def run(self, geom, origin_x, origin_y, layer_name, mirror_y=False):
+        """Выпуск серии: файл на вариант или все варианты рядом в одном файле. Возвращает строки отчета"""
+        config = self.config
+        variants = self.get_variants()
+        width_paths = self.compute_paths(geom, origin_x, origin_y, mirror_y)
+        base_filename = os.path.join(config.user_dir, f"laser_{layer_name}")
+        report = [f"Калибровка: {len(variants)} вариантов, {len(width_paths)} расчетов отступов"]
+
+        if config.sweep_mode == 1:
+            for variant in variants:
+                filename = f"{base_filename}_{self.get_variant_name(variant)}.gcode"
+                Machine.generate_gcode_to_file(
+                    paths=width_paths[variant["laser_beam_wide"]],
+                    filename=filename,
+                    **self.get_variant_config(variant).get_machine_settings())
+                report.append(f"Сохранен файл {filename}")
+            return report
+
+        # Варианты рядом: сетка как у панели, ряды снизу вверх, в ряду слева направо
+        cols = math.ceil(math.sqrt(len(variants)))
+        rows = math.ceil(len(variants) / cols)
+        panel = Panel(
+            paths=width_paths[variants[0]["laser_beam_wide"]],
+            rows=rows,
+            cols=cols,
+            spacing=config.panel_spacing_um * 1000,
+            outline=self.get_bounds(width_paths))
+
+        def iter_variants():
+            for index, variant in enumerate(variants):
+                row, col = divmod(index, cols)
+                transform = panel.get_transform(row, col)
+                paths = (
+                    [[transform(x, y) for x, y in contour] for contour in figure]
+                    for figure in width_paths[variant["laser_beam_wide"]])
+                settings = self.get_variant_config(variant).get_machine_settings()
+                yield from Machine.iter_commands(paths, **settings)
+
+        filename = f"{base_filename}_sweep.gcode"
+        Machine.generate_gcode_to_file(
+            paths=[], filename=filename, extra_commands=iter_variants(), **config.get_machine_settings())
+        report.append(f"Сохранен файл {filename}")
+        for index, variant in enumerate(variants):
+            row, col = divmod(index, cols)
+            report.append(f"  ряд {row + 1}, колонка {col + 1}: {self.get_variant_name(variant)}")
+        return report
@@ -0,0 +1,149 @@
+import os
+import struct
+import sys
+
+import numpy as np
+
+from core.machine import Machine
+
+# Заголовок: сигнатура, версия, число точек, контуров, фигур, смещения секций (байты),
+# габарит платы (Edge.Cuts) в координатах станка (нм), нули - габарит не задан,
+# число меток кернения и смещение их секции
+TOOLPATH_MAGIC = b"LTP1"
+TOOLPATH_VERSION = 3
+HEADER_FORMAT = "<4sIQQQQQQ4iQQ"
+HEADER_SIZE = 96
+# Версия 2 - без меток кернения, версия 1 - еще и без габарита платы
+HEADER_FORMAT_V2 = "<4sIQQQQQQ4i"
+HEADER_SIZE_V2 = 80
+HEADER_FORMAT_V1 = "<4sIQQQQQQ"
+HEADER_SIZE_V1 = 64
+# Метаданные фигуры: габарит в координатах станка (нм)
+FIGURE_DTYPE = np.dtype([("bounds", "<i4", (4,))])
+
+
+class Toolpath:
+    """
+    Бинарный контейнер путей (.ltp) для передачи и повторного использования без пересчета.
+    Секции: точки int32 (нм, N x 2), начала контуров int64 (индексы точек),
+    начала фигур int64 (индексы контуров), метаданные фигур и метки кернения int32 (нм, N x 2).
+    Файл пишется потоком за один проход и открывается через numpy.memmap без загрузки в память.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        self.file_size = os.path.getsize(filename)
+        if len(header) < HEADER_SIZE_V1:
+            raise ValueError(f"{filename}: файл путей поврежден")
+        magic, version = struct.unpack_from("<4sI", header)
+        if magic != TOOLPATH_MAGIC or version not in (1, 2, TOOLPATH_VERSION):
+            raise ValueError(f"{filename}: неизвестный формат путей")
+        header_format, points_pos = {1: (HEADER_FORMAT_V1, HEADER_SIZE_V1), 2: (HEADER_FORMAT_V2, HEADER_SIZE_V2),
+                                     TOOLPATH_VERSION: (HEADER_FORMAT, HEADER_SIZE)}[version]
+        if len(header) < points_pos:
+            raise ValueError(f"{filename}: файл путей поврежден")
+        _, _, n_points, n_contours, n_figures, contours_pos, figures_pos, meta_pos, *extra = \
+            struct.unpack_from(header_format, header)
+        self.outline = tuple(extra[:4]) if any(extra[:4]) else None
+        n_marks, marks_pos = extra[4:] or (0, 0)
+
+        self.points = self.map_section(np.dtype("<i4"), points_pos, (n_points, 2))
+        self.contour_offsets = self.map_section(np.dtype("<i8"), contours_pos, (n_contours + 1,))
+        self.figure_offsets = self.map_section(np.dtype("<i8"), figures_pos, (n_figures + 1,))
+        self.figures = self.map_section(FIGURE_DTYPE, meta_pos, (n_figures,))
+        # Метки кернения платы в координатах станка (N x 2), в файлах до версии 3 их нет
+        self.marks = self.map_section(np.dtype("<i4"), marks_pos, (n_marks, 2))
+
+    def map_section(self, dtype, offset, shape):
+        if not np.prod(shape):
+            return np.zeros(shape, dtype=dtype)
+        # Секция за концом файла - файл оборван при записи
+        if offset + dtype.itemsize * int(np.prod(shape)) > self.file_size:
+            raise ValueError(f"{self.filename}: файл путей поврежден")
+        return np.memmap(self.filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    def __len__(self):
+        return len(self.figures)
+
+    def get_figure(self, index):
+        """Контуры фигуры - срезы общего буфера точек, без копирования"""
+        start, end = self.figure_offsets[index], self.figure_offsets[index + 1]
+        offsets = self.contour_offsets[start:end + 1]
+        return [self.points[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+    def iter_paths(self):
+        """Фигуры в формате paths (контуры - массивы N x 2)"""
+        for index in range(len(self)):
+            yield self.get_figure(index)
+
+    def to_gcode(self, filename, **machine_settings):
+        """Постпроцессор: G-код с любыми настройками Machine.generate_gcode_to_file"""
+        # Контуры фигуры переводятся в списки: построчная генерация G-кода с ними быстрее, чем со скалярами numpy
+        paths = ([contour.tolist() for contour in figure] for figure in self.iter_paths())
+        Machine.generate_gcode_to_file(paths=paths, filename=filename, **machine_settings)
+
+    @staticmethod
+    def iter_write(paths, filename, outline=None, marks=None):
+        """
+        Пропускает фигуры paths дальше, попутно записывая их в filename.
+        Файл завершается, когда paths исчерпан. outline - габарит платы (Edge.Cuts), marks - метки
+        кернения (N x 2), все в координатах станка
+        """
+        marks = np.rint(marks if marks is not None else np.zeros((0, 2))).astype("<i4").reshape(-1, 2)
+        contour_offsets = [0]
+        figure_offsets = [0]
+        figure_bounds = []
+        n_points = 0
+        with open(filename, "wb") as f:
+            f.write(bytes(HEADER_SIZE))
+            for figure in paths:
+                contours = [np.asarray(contour, dtype=float) for contour in figure if len(contour)]
+                if contours:
+                    points = np.rint(np.concatenate(contours)).astype("<i4")
+                    f.write(points.tobytes())
+                    for contour in contours:
+                        n_points += len(contour)
+                        contour_offsets.append(n_points)
+                    figure_bounds.append((*points.min(axis=0), *points.max(axis=0)))
+                else:
+                    figure_bounds.append((0, 0, 0, 0))
+                figure_offsets.append(len(contour_offsets) - 1)
+                yield figure
+
+            contours_pos = f.tell()
+            f.write(np.array(contour_offsets, dtype="<i8").tobytes())
+            figures_pos = f.tell()
+            f.write(np.array(figure_offsets, dtype="<i8").tobytes())
+            meta_pos = f.tell()
+            meta = np.zeros(len(figure_bounds), dtype=FIGURE_DTYPE)
+            meta["bounds"] = np.array(figure_bounds, dtype="<i4").reshape(-1, 4)
+            f.write(meta.tobytes())
+            marks_pos = f.tell()
+            f.write(marks.tobytes())
+
+            f.seek(0)
+            f.write(struct.pack(
+                HEADER_FORMAT, TOOLPATH_MAGIC, TOOLPATH_VERSION, n_points, len(contour_offsets) - 1,
+                len(figure_bounds), contours_pos, figures_pos, meta_pos,
+                *np.rint(outline if outline is not None else (0, 0, 0, 0)).astype(int), len(marks), marks_pos))
+
+    @classmethod
+    def save(cls, paths, filename, outline=None, marks=None):
+        for _ in cls.iter_write(paths, filename, outline, marks):
+            pass
+
+
+if __name__ == '__main__':
+    # Перевыпуск G-кода с текущими настройками плагина: python -m core.toolpath laser_F_Cu.ltp [laser_F_Cu.gcode]
+    from core.settings import PluginConfig
+
+    config = PluginConfig()
+    config.load_config()
+    source = sys.argv[1]
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + ".gcode"
+    toolpath = Toolpath(source)
+    toolpath.to_gcode(target, **config.get_machine_settings())
+    print(f"Фигур: {len(toolpath)}, контуров: {len(toolpath.contour_offsets) - 1}, точек: {len(toolpath.points)}")
+    print(f"Сохранен файл {target}")
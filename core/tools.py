@@ -1,4 +1,6 @@
+import json
 import math
+import os
 import numpy as np
 
 
@@ -108,3 +110,20 @@ def sort_paths(paths):
 
     sorted_paths = [paths[i] for i in sorted_indices]
     return sorted_paths
+
+
+def save_metrics(filename, metrics):
+    """Дописывает метрики задания в JSON файл, существующие ключи перезаписываются"""
+    data = {}
+    if os.path.isfile(filename):
+        try:
+            with open(filename, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Ошибка при чтении метрик: {e}")
+    data.update(metrics)
+    try:
+        with open(filename, "w") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+    except Exception as e:
+        print(f"Ошибка при сохранении метрик: {e}")
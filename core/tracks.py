@@ -0,0 +1,169 @@
+import numpy as np
+from shapely import (LineString, MultiLineString, STRtree, difference, line_merge, offset_curve, get_parts, prepare,
+                     unary_union)
+from shapely.affinity import affine_transform
+
+from core.punch import Punch
+
+CAP_SEGMENTS = 8
+
+
+class TrackPaths:
+    """
+    Пути дорожек по осевым линиям вместо отступов от полигонов.
+    Дорожки (отрезки x1, y1, x2, y2, ширина в нм) одной ширины сшиваются в цепочки, для каждой
+    цепочки строятся те же проходы, что дали бы кольца отступов: пары параллельных линий
+    на расстоянии ширина / 2 - k * шаг от оси. Проходы соединяются на концах дорожки
+    (торцы закрыты), и вся цепочка идет одним путем без холостых переходов.
+    """
+
+    @staticmethod
+    def get_levels(width, step):
+        """Число уровней отступа k * step < width / 2, как у колец полигона дорожки"""
+        return int(np.ceil(width / 2 / step)) - 1
+
+    @staticmethod
+    def get_width_range(step, max_levels):
+        """Ширины дорожек (min, max], которые идут по осевым линиям: от 1 до max_levels уровней"""
+        return 2 * step, 2 * step * (max_levels + 1)
+
+    @staticmethod
+    def get_bounds(segments):
+        """Габарит дорожек с учетом ширины"""
+        half_width = segments[:, 4] / 2
+        x = np.concatenate((segments[:, 0] - half_width, segments[:, 2] - half_width,
+                            segments[:, 0] + half_width, segments[:, 2] + half_width))
+        y = np.concatenate((segments[:, 1] - half_width, segments[:, 3] - half_width,
+                            segments[:, 1] + half_width, segments[:, 3] + half_width))
+        return x.min(), y.min(), x.max(), y.max()
+
+    @staticmethod
+    def merge_lines(segments):
+        """Цепочки дорожек одной ширины: список (LineString, ширина)"""
+        chains = []
+        for width in np.unique(segments[:, 4]):
+            group = segments[segments[:, 4] == width]
+            lines = MultiLineString([((x1, y1), (x2, y2)) for x1, y1, x2, y2, _ in group if (x1, y1) != (x2, y2)])
+            if lines.is_empty:
+                continue
+            chains.extend((line, width) for line in get_parts(line_merge(lines)))
+        return chains
+
+    @staticmethod
+    def get_cap(center, direction, start_angle, end_angle, start_radius, end_radius):
+        """Дуга вокруг конца цепочки: углы от направления цепочки, радиус меняется линейно"""
+        tangent = np.asarray(direction) / max(np.hypot(*direction), 1e-9)
+        normal = np.array((-tangent[1], tangent[0]))
+        angle = np.linspace(start_angle, end_angle, CAP_SEGMENTS + 1)[1:-1]
+        radius = np.linspace(start_radius, end_radius, CAP_SEGMENTS + 1)[1:-1]
+        points = (np.asarray(center) + (radius * np.cos(angle))[:, np.newaxis] * tangent
+                  + (radius * np.sin(angle))[:, np.newaxis] * normal)
+        return [tuple(point) for point in points]
+
+    @classmethod
+    def get_chain_path(cls, line, width, step):
+        """
+        Точки пути цепочки. На каждом уровне левый проход вперед, полуокружность вокруг конца,
+        правый проход назад и полуокружность вокруг начала, сходящаяся к следующему уровню.
+        Первый уровень начинается, а последний заканчивается полной полуокружностью, как кольцо.
+        """
+        coords = list(line.coords)
+        start, end = coords[0], coords[-1]
+        start_direction = np.subtract(coords[1], coords[0])
+        end_direction = np.subtract(coords[-1], coords[-2])
+        distances = [width / 2 - level * step for level in range(1, cls.get_levels(width, step) + 1)]
+
+        if not distances:
+            return []
+        # Начало - полуокружность вокруг начала на первом уровне, как у кольца
+        path = [tuple(offset_curve(line, -distances[0]).coords[0])]
+        path.extend(cls.get_cap(start, start_direction, -np.pi / 2, -3 * np.pi / 2, distances[0], distances[0]))
+        for index, distance in enumerate(distances):
+            next_distance = distances[index + 1] if index + 1 < len(distances) else distance
+            left = offset_curve(line, distance, join_style="round")
+            right = offset_curve(line, -distance, join_style="round")
+            path.extend(point for part in get_parts(left) for point in part.coords)
+            path.extend(cls.get_cap(end, end_direction, np.pi / 2, -np.pi / 2, distance, distance))
+            path.extend([point for part in get_parts(right) for point in part.coords][::-1])
+            path.extend(cls.get_cap(start, start_direction, -np.pi / 2, -3 * np.pi / 2, distance, next_distance))
+        path.append(tuple(offset_curve(line, distances[-1]).coords[0]))
+        return path
+
+    @staticmethod
+    def get_copper(chains, obstacles=None):
+        """
+        Медь цепочек (линия, ширина) в координатах линий без перекрытий: из каждой цепочки вычитаются
+        предыдущие, пересекающиеся с ней (стыки и ответвления), и obstacles - отверстия и остальная медь
+        """
+        coppers = np.array([line.buffer(width / 2, CAP_SEGMENTS) for line, width, *_ in chains], dtype=object)
+        if not len(coppers):
+            return coppers
+        figures = coppers.copy()
+        index, other = STRtree(coppers).query(coppers, predicate="intersects")
+        earlier = other < index
+        for i in np.unique(index[earlier]):
+            figures[i] = figures[i].difference(unary_union(coppers[other[earlier & (index == i)]]))
+        if obstacles is not None:
+            figures = difference(figures, obstacles)
+        return figures
+
+    @classmethod
+    def notify(cls, listener, chains, paths, obstacles=None):
+        """Передает listener медь каждой цепочки и ее пути (куски пути вне отверстий и остальной меди)"""
+        ends = [chain_start for _, _, chain_start in chains[1:]] + [len(paths)]
+        for figure, (_, _, chain_start), chain_end in zip(cls.get_copper(chains, obstacles), chains, ends):
+            if not figure.is_empty:
+                listener(figure, [contour for figure_paths in paths[chain_start:chain_end] for contour in figure_paths])
+
+    @staticmethod
+    def get_obstacles(matrix, holes=None, copper=None):
+        """Отверстия и остальная медь слоя (пады, полигоны) в координатах станка, None - если их нет"""
+        parts = [geom for geom in (holes, copper) if geom is not None and not geom.is_empty]
+        if not parts:
+            return None
+        obstacles = affine_transform(unary_union(parts), matrix)
+        prepare(obstacles)
+        return obstacles
+
+    @classmethod
+    def generate_paths(cls, segments, step, matrix, holes=None, listener=None, copper=None, min_length_um=0):
+        """
+        Пути дорожек в координатах станка (формат paths, фигура на кусок цепочки).
+        matrix - та же матрица, что у меди слоя; holes - отверстия, copper - остальная медь слоя
+        в координатах платы: участки проходов над ними вырезаются (медь засвечивают ее собственные кольца).
+        Куски короче min_length_um отбрасываются, как короткие кольца.
+        listener(figure, figure_paths) - как подписчик Pipeline.subscribe: медь каждой цепочки и ее пути
+        """
+        obstacles = cls.get_obstacles(matrix, holes, copper)
+        min_length = min_length_um * 1000
+
+        paths = []
+        chains = []
+        for line, width in cls.merge_lines(segments):
+            line = affine_transform(line, matrix)
+            coords = cls.get_chain_path(line, width, step)
+            if len(coords) < 2:
+                continue
+            chain_start = len(paths)
+            chains.append((line, width, chain_start))
+            path = LineString(coords)
+            if obstacles is None or not path.intersects(obstacles):
+                if path.length >= min_length:
+                    paths.append([coords])
+                continue
+            # Разность разбивает путь и в точках самопересечения, смежные куски сшиваются обратно
+            pieces = []
+            for part in get_parts(path.difference(obstacles)):
+                part_coords = list(part.coords)
+                if pieces and pieces[-1][-1] == part_coords[0]:
+                    pieces[-1].extend(part_coords[1:])
+                else:
+                    pieces.append(part_coords)
+            paths.extend([piece] for piece in pieces if len(piece) > 1 and LineString(piece).length >= min_length)
+
+        if listener is not None:
+            cls.notify(listener, chains, paths, obstacles)
+        if not paths:
+            return paths
+        starts = np.array([figure[0][0] for figure in paths])
+        return [paths[index] for index in Punch.get_order(starts)]
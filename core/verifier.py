@@ -0,0 +1,379 @@
+import heapq
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from scipy import ndimage
+from shapely import STRtree, box, buffer, get_coordinates, get_num_coordinates, get_parts, get_rings
+from shapely import bounds as get_bounds
+
+# Сторона тайла растра (пиксели): память проверки ограничена несколькими массивами такого размера
+TILE_PIXELS = 1024
+# Сколько самых крупных пятен непокрытой и лишней засветки попадает в отчет
+HOTSPOT_COUNT = 10
+# Вершин фигур и точек путей в партии: партия проверяется и отпускается, как только набрана
+BATCH_POINTS = 1000000
+
+
+class CoverageVerifier:
+    """
+    Проверка засвета по растру: медь фигур и след луча вдоль путей переводятся в маски numpy
+    с пикселем round_um, тайлами с полями, без buffer и объединений Shapely.
+    Непокрытая медь - пиксели глубже edge от края фигуры, до которых ни один путь не ближе
+    половины луча (полосу edge у края раскладка колец оставляет по построению: первое кольцо
+    на шаг от края, луч - половина шага в каждую сторону). Лишний засвет - след луча вне меди.
+    Фигуры и пути - в координатах станка (нм), как их выдает Pipeline.
+    Фигуры проверяются партиями по ходу расчета (Pipeline выдает их по соседству, тайлами)
+    и сразу отпускаются: в памяти остаются только площади по фигурам и крупнейшие пятна.
+    Фигуры одной партии не должны перекрываться.
+    """
+
+    def __init__(self, step, pixel, edge=None, tile_pixels=TILE_PIXELS, workers=1, batch_points=BATCH_POINTS):
+        self.step = step
+        self.pixel = pixel
+        self.edge = step / 2 if edge is None else edge
+        self.tile_pixels = tile_pixels
+        self.workers = workers
+        self.batch_points = batch_points
+        # След луча считается по пикселям осевой линии: их центры отстоят от линии до полудиагонали
+        self.beam_radius = step / 2 / pixel + math.sqrt(2) / 2
+        self.halo = int(math.ceil(self.beam_radius)) + 2
+
+        # Текущая партия
+        self.figures = []
+        self.figure_paths = []
+        self.batch_size = 0
+        # Итоги проверенных партий
+        self.figure_count = 0
+        self.results = {"copper": [], "uncovered": [], "over_exposed": []}
+        self.hotspots = {"uncovered": [], "over_exposed": []}
+
+    def add_figure(self, figure, figure_paths):
+        """Подписчик Pipeline.subscribe: добавляет фигуру и ее пути (точки int32) в партию"""
+        contours = [np.asarray(contour, dtype=float)[:, :2] for contour in figure_paths or [] if len(contour) >= 2]
+        self.figures.append(figure)
+        self.figure_paths.append([np.rint(contour).astype(np.int32) for contour in contours])
+        self.batch_size += get_num_coordinates(figure) + sum(len(contour) for contour in contours)
+        if self.batch_size >= self.batch_points:
+            self.flush()
+
+    def flush(self):
+        """Проверяет накопленную партию и отпускает ее фигуры и пути"""
+        if not self.figures:
+            return
+        copper, uncovered, over_exposed, hotspots = self.verify_batch(np.asarray(self.figures, dtype=object))
+        for key, values in (("copper", copper), ("uncovered", uncovered), ("over_exposed", over_exposed)):
+            self.results[key].append(values)
+        for kind, spots in hotspots.items():
+            spots = [(area, x, y, figure + self.figure_count) for area, x, y, figure in spots]
+            self.hotspots[kind] = heapq.nlargest(HOTSPOT_COUNT, self.hotspots[kind] + spots)
+        self.figure_count += len(self.figures)
+        self.figures = []
+        self.figure_paths = []
+        self.batch_size = 0
+
+    @staticmethod
+    def get_disc(radius):
+        size = int(math.floor(radius))
+        y, x = np.mgrid[-size:size + 1, -size:size + 1]
+        return x ** 2 + y ** 2 <= radius ** 2
+
+    @staticmethod
+    def dilate(mask, radius):
+        """
+        Расширение маски кругом радиуса radius (пиксели). Круг - набор горизонтальных отрезков:
+        отрезок полуширины w считается по накопленным суммам строк, затем сдвигается по вертикали
+        """
+        size = int(math.floor(radius))
+        height, width = mask.shape
+        sums = np.zeros((height, width + 2 * size + 1), dtype=np.int32)
+        np.cumsum(mask, axis=1, out=sums[:, size + 1:size + 1 + width])
+        sums[:, size + 1 + width:] = sums[:, size + width:size + 1 + width]
+        runs = {}
+        result = np.zeros_like(mask, dtype=bool)
+        for dy in range(-size, size + 1):
+            half = int(math.floor(math.sqrt(radius ** 2 - dy ** 2)))
+            if half not in runs:
+                runs[half] = (sums[:, size + half + 1:size + half + 1 + width] -
+                              sums[:, size - half:size - half + width]) > 0
+            top, bottom = max(0, -dy), height - max(0, dy)
+            result[top:bottom] |= runs[half][top + dy:bottom + dy]
+        return result
+
+    @staticmethod
+    def group_by_figure(values, figure_index, figure_count):
+        """Строки values, упорядоченные по фигурам, и начала групп фигур (figure_count + 1)"""
+        order = np.argsort(figure_index, kind="stable")
+        offsets = np.searchsorted(figure_index[order], np.arange(figure_count + 1))
+        return values[order], offsets
+
+    def get_edges(self, figures):
+        """Ребра колец фигур (x0, y0, x1, y1) и начала групп фигур. Фигуры - полигоны или мультиполигоны"""
+        parts, part_index = get_parts(figures, return_index=True)
+        rings, ring_part = get_rings(parts, return_index=True)
+        figure_index = part_index[ring_part]
+        points, ring_index = get_coordinates(rings, return_index=True)
+        same = ring_index[1:] == ring_index[:-1]
+        edges = np.column_stack((points[:-1], points[1:]))[same]
+        return self.group_by_figure(edges, figure_index[ring_index[:-1][same]], len(self.figures))
+
+    def get_segments(self):
+        """Отрезки путей всех фигур (x0, y0, x1, y1) и начала групп фигур"""
+        segments = []
+        figure_index = []
+        for index, contours in enumerate(self.figure_paths):
+            for contour in contours:
+                segments.append(np.column_stack((contour[:-1], contour[1:])))
+                figure_index.append(np.full(len(contour) - 1, index))
+        if not segments:
+            return np.empty((0, 4)), np.zeros(len(self.figures) + 1, dtype=np.int64)
+        return self.group_by_figure(np.concatenate(segments).astype(float), np.concatenate(figure_index),
+                                    len(self.figures))
+
+    @staticmethod
+    def gather(values, offsets, indices):
+        """Строки групп indices одним массивом и номер группы каждой строки"""
+        counts = offsets[indices + 1] - offsets[indices]
+        if not counts.sum():
+            return values[:0], indices[:0]
+        starts = np.repeat(offsets[indices] - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        rows = starts + np.arange(counts.sum())
+        return values[rows], np.repeat(indices, counts)
+
+    @staticmethod
+    def fill(edges, labels, shape):
+        """
+        Растр многоугольников построчно: метка фигуры + 1 в пикселях, центры которых внутри (чет-нечет).
+        edges - ребра в пикселях окна, фигуры не пересекаются друг с другом
+        """
+        height, width = shape
+        y_min = np.minimum(edges[:, 1], edges[:, 3])
+        y_max = np.maximum(edges[:, 1], edges[:, 3])
+        # Строки, центры которых ребро пересекает: y_min <= r + 0.5 < y_max
+        first = np.clip(np.ceil(y_min - 0.5), 0, height).astype(np.int64)
+        last = np.clip(np.ceil(y_max - 0.5), 0, height).astype(np.int64)
+        counts = last - first
+        image = np.zeros(shape, dtype=np.int32)
+        if not counts.sum():
+            return image
+        edge_index = np.repeat(np.arange(len(edges)), counts)
+        rows = np.repeat(first - np.concatenate(([0], np.cumsum(counts)[:-1])), counts) + np.arange(counts.sum())
+        x0, y0, x1, y1 = edges[edge_index].T
+        x = x0 + (rows + 0.5 - y0) * (x1 - x0) / (y1 - y0)
+        label = labels[edge_index]
+
+        # Пересечения строки одной фигуры попарно ограничивают заполненные отрезки
+        order = np.lexsort((x, rows, label))
+        x, rows, label = x[order], rows[order], label[order]
+        start = np.clip(np.ceil(x[0::2] - 0.5), 0, width).astype(np.int64)
+        end = np.clip(np.ceil(x[1::2] - 0.5), 0, width).astype(np.int64)
+        value = label[0::2] + 1
+        difference = np.zeros((height, width + 1), dtype=np.int32)
+        np.add.at(difference, (rows[0::2], start), value)
+        np.add.at(difference, (rows[0::2], end), -value)
+        image[:] = np.cumsum(difference, axis=1)[:, :width]
+        return image
+
+    @staticmethod
+    def trace(segments, labels, shape):
+        """Пиксели осевых линий путей: метка фигуры + 1. Точки вдоль отрезка - не реже полпикселя"""
+        image = np.zeros(shape, dtype=np.int32)
+        # Отрезки крупных фигур, целиком лежащие за окном, не разбиваются на точки
+        near = ((np.maximum(segments[:, 0], segments[:, 2]) >= 0) & (np.minimum(segments[:, 0], segments[:, 2]) < shape[1]) &
+                (np.maximum(segments[:, 1], segments[:, 3]) >= 0) & (np.minimum(segments[:, 1], segments[:, 3]) < shape[0]))
+        segments, labels = segments[near], labels[near]
+        if not len(segments):
+            return image
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        counts = np.ceil(lengths * 2).astype(np.int64) + 1
+        segment_index = np.repeat(np.arange(len(segments)), counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        t = (np.arange(counts.sum()) - np.repeat(starts, counts)) / np.repeat(np.maximum(counts - 1, 1), counts)
+        x0, y0, x1, y1 = segments[segment_index].T
+        columns = np.floor(x0 + t * (x1 - x0)).astype(np.int64)
+        rows = np.floor(y0 + t * (y1 - y0)).astype(np.int64)
+        inside = (columns >= 0) & (columns < shape[1]) & (rows >= 0) & (rows < shape[0])
+        image[rows[inside], columns[inside]] = labels[segment_index[inside]] + 1
+        return image
+
+    def get_hotspots(self, mask, figure_image, origin):
+        """Связные пятна маски: (площадь нм², x, y центра в нм, номер фигуры)"""
+        components, count = ndimage.label(mask)
+        if not count:
+            return []
+        rows, columns = np.nonzero(components)
+        component = components[rows, columns] - 1
+        sizes = np.bincount(component, minlength=count)
+        center_x = np.bincount(component, weights=columns, minlength=count) / sizes
+        center_y = np.bincount(component, weights=rows, minlength=count) / sizes
+        figure = np.zeros(count, dtype=np.int64)
+        figure[component] = figure_image[rows, columns] - 1
+        pixel_area = self.pixel ** 2
+        return [(float(size * pixel_area), origin[0] + (cx + 0.5) * self.pixel, origin[1] + (cy + 0.5) * self.pixel,
+                 int(index))
+                for size, cx, cy, index in zip(sizes, center_x, center_y, figure)]
+
+    def iter_tiles(self, figures):
+        """
+        Тайлы с медью: (x0, y0 ядра в нм, размер ядра в пикселях (ширина, высота), номера фигур рядом).
+        Ядро тайла обрезается по габариту его фигур на сетке пикселей: мелкие пады не растрируются целым тайлом
+        """
+        tree = STRtree(figures)
+        bounds = get_bounds(figures)
+        min_x, min_y = bounds[:, :2].min(axis=0)
+        tile_size = self.tile_pixels * self.pixel
+        halo = self.halo * self.pixel
+        # Тайлы, ядра которых задевают габарит хотя бы одной фигуры: пустые участки платы не обходятся
+        first = np.floor((bounds[:, :2] - (min_x, min_y)) / tile_size).astype(np.int64)
+        last = np.floor((bounds[:, 2:] - (min_x, min_y)) / tile_size).astype(np.int64)
+        counts = last - first + 1
+        figure_index = np.repeat(np.arange(len(figures)), counts[:, 0] * counts[:, 1])
+        local = np.arange(len(figure_index)) - np.repeat(
+            np.concatenate(([0], np.cumsum(counts[:, 0] * counts[:, 1])[:-1])), counts[:, 0] * counts[:, 1])
+        columns = first[figure_index, 0] + local % counts[figure_index, 0]
+        rows = first[figure_index, 1] + local // counts[figure_index, 0]
+        for row, column in np.unique(np.column_stack((rows, columns)), axis=0):
+            x, y = min_x + column * tile_size, min_y + row * tile_size
+            indices = tree.query(box(x - halo, y - halo, x + tile_size + halo, y + tile_size + halo),
+                                 predicate="intersects")
+            if len(indices):
+                indices = np.sort(indices)
+                # Габарит фигур внутри ядра тайла, с округлением наружу до целых пикселей
+                low = np.clip(bounds[indices, :2].min(axis=0), (x, y), (x + tile_size, y + tile_size))
+                high = np.clip(bounds[indices, 2:].max(axis=0), (x, y), (x + tile_size, y + tile_size))
+                low = np.floor((low - (x, y)) / self.pixel).astype(np.int64)
+                high = np.ceil((high - (x, y)) / self.pixel).astype(np.int64)
+                size = np.maximum(high - low, 1)
+                yield x + low[0] * self.pixel, y + low[1] * self.pixel, size, indices
+
+    def verify(self):
+        """
+        Проверяет оставшиеся фигуры и возвращает итог: площади (нм²) меди, непокрытой меди и лишнего засвета
+        по фигурам (в порядке добавления) и самые крупные пятна каждого вида
+        """
+        self.flush()
+        result = {key: np.concatenate(values) if values else np.zeros(0) for key, values in self.results.items()}
+        result["hotspots"] = {kind: list(spots) for kind, spots in self.hotspots.items()}
+        return result
+
+    def verify_batch(self, figures):
+        """
+        Площади (нм²) меди, непокрытой меди и лишнего засвета по фигурам партии и ее пятна.
+        Тайлы независимы: при workers > 1 идут в потоках (numpy отпускает GIL на заливке и расширении)
+        """
+        figure_count = len(figures)
+        uncovered = np.zeros(figure_count)
+        over_exposed = np.zeros(figure_count)
+        copper = np.zeros(figure_count)
+        hotspots = {"uncovered": [], "over_exposed": []}
+
+        edges = self.get_edges(figures)
+        # Медь без полосы у края: один отступ на фигуру, без колец и объединений
+        target_edges = self.get_edges(buffer(figures, -self.edge))
+        segments = self.get_segments()
+        task = partial(self.verify_tile, edges=edges, target_edges=target_edges, segments=segments,
+                       figure_count=figure_count)
+        executor = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            tiles = self.iter_tiles(figures)
+            for tile_copper, tile_uncovered, tile_over, tile_hotspots in \
+                    (executor.map(task, tiles) if executor else map(task, tiles)):
+                copper += tile_copper
+                uncovered += tile_uncovered
+                over_exposed += tile_over
+                for kind, spots in tile_hotspots.items():
+                    hotspots[kind] = heapq.nlargest(HOTSPOT_COUNT, hotspots[kind] + spots)
+        finally:
+            if executor:
+                executor.shutdown()
+        return copper, uncovered, over_exposed, hotspots
+
+    def verify_tile(self, tile, edges, target_edges, segments, figure_count):
+        """Площади (нм²) меди, непокрытой меди и лишнего засвета по фигурам и пятна одного тайла"""
+        x, y, (columns, rows), indices = tile
+        shape = (rows + 2 * self.halo, columns + 2 * self.halo)
+        core = (slice(self.halo, self.halo + rows), slice(self.halo, self.halo + columns))
+        origin = np.array((x - self.halo * self.pixel, y - self.halo * self.pixel))
+        scale = np.tile(origin, 2)
+        tile_edges, edge_labels = self.gather(*edges, indices)
+        tile_segments, segment_labels = self.gather(*segments, indices)
+        tile_target_edges, target_labels = self.gather(*target_edges, indices)
+        figure_image = self.fill((tile_edges - scale) / self.pixel, edge_labels, shape)
+        target = self.fill((tile_target_edges - scale) / self.pixel, target_labels, shape) > 0
+        path_image = self.trace((tile_segments - scale) / self.pixel, segment_labels, shape)
+
+        pixel_area = self.pixel ** 2
+        swept = self.dilate(path_image > 0, self.beam_radius)
+        core_figures = figure_image[core]
+        missed = (target & ~swept)[core]
+        spill = (swept & (figure_image == 0))[core]
+        core_origin = origin + self.halo * self.pixel
+
+        copper = np.bincount(core_figures.ravel(), minlength=figure_count + 1)[1:] * pixel_area
+        uncovered = np.zeros(figure_count)
+        over_exposed = np.zeros(figure_count)
+        hotspots = {"uncovered": [], "over_exposed": []}
+        if missed.any():
+            uncovered = np.bincount(core_figures[missed], minlength=figure_count + 1)[1:] * pixel_area
+            hotspots["uncovered"] = self.get_hotspots(missed, core_figures, core_origin)
+        if spill.any():
+            # Лишний засвет вне меди относится к фигуре ближайшего пути
+            spill_figures = ndimage.grey_dilation(path_image, footprint=self.get_disc(self.beam_radius))[core]
+            over_exposed = np.bincount(spill_figures[spill], minlength=figure_count + 1)[1:] * pixel_area
+            hotspots["over_exposed"] = self.get_hotspots(spill, spill_figures, core_origin)
+        return copper, uncovered, over_exposed, hotspots
+
+    @staticmethod
+    def get_metrics(result):
+        """Метрики для .metrics.json: итоги, фигуры с отклонениями и пятна (мм, мм²)"""
+        figures = np.flatnonzero((result["uncovered"] > 0) | (result["over_exposed"] > 0))
+        return {
+            "copper_mm2": float(result["copper"].sum() / 1e12),
+            "uncovered_mm2": float(result["uncovered"].sum() / 1e12),
+            "over_exposed_mm2": float(result["over_exposed"].sum() / 1e12),
+            "figures": {int(index): {"uncovered_mm2": float(result["uncovered"][index] / 1e12),
+                                     "over_exposed_mm2": float(result["over_exposed"][index] / 1e12)}
+                        for index in figures},
+            "hotspots": {kind: [{"area_mm2": area / 1e12, "x_mm": x / 1e6, "y_mm": y / 1e6, "figure": figure}
+                                for area, x, y, figure in spots]
+                         for kind, spots in result["hotspots"].items()},
+        }
+
+    @staticmethod
+    def format_report(result):
+        copper = result["copper"].sum()
+        uncovered = result["uncovered"].sum()
+        report = [
+            f"Засвет: не покрыто {uncovered / 1e12:.4f} мм² из {copper / 1e12:.2f} мм² меди "
+            f"({np.count_nonzero(result['uncovered'])} фигур), "
+            f"вне меди {result['over_exposed'].sum() / 1e12:.4f} мм² ({np.count_nonzero(result['over_exposed'])} фигур)",
+        ]
+        for kind, label in (("uncovered", "Не покрыто"), ("over_exposed", "Вне меди")):
+            for area, x, y, figure in result["hotspots"][kind][:3]:
+                report.append(f"{label}: {area / 1e6:.0f} мкм² у X{x / 1e6:.3f} Y{y / 1e6:.3f} (фигура {figure})")
+        return report
+
+
+if __name__ == '__main__':
+    # Проверка засвета с текущими настройками на синтетических фигурах: python -m core.verifier [число фигур]
+    import time
+
+    from core.autotune import get_synthetic_figures
+    from core.pipeline import Pipeline
+    from core.settings import PluginConfig
+
+    config = PluginConfig()
+    config.load_config()
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pipeline = Pipeline(config)
+    verifier = CoverageVerifier(config.laser_beam_wide, config.round_um * 1000 * max(1, config.verify_scale),
+                                workers=config.workers)
+    pipeline.subscribe(verifier.add_figure)
+    start = time.perf_counter()
+    for _ in pipeline.iter_paths(get_synthetic_figures(count, pour_size_mm=(1.5, 4))):
+        pass
+    coverage = verifier.verify()
+    print("\n".join(CoverageVerifier.format_report(coverage)))
+    print(f"Фигур: {verifier.figure_count}, расчет с проверкой {time.perf_counter() - start:.1f} с")
@@ -1,10 +1,11 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
 import pcbnew
 
-from core.gui import GUI
-from core.extractor import PCB
-from core.machine import Machine
-from core.geometry import GeometryTool
+from core.startup import IMPORT_TIMES
 
 
 class Laser(pcbnew.ActionPlugin):
@@ -20,6 +21,15 @@ class Laser(pcbnew.ActionPlugin):
         self.icon_file_name = os.path.join(os.path.dirname(__file__), "icons/icon.svg")
 
     def Run(self):
+        # Тяжелые модули (wx-диалоги, shapely, numpy) грузятся только при запуске, а не при регистрации кнопки
+        import_start = time.perf_counter()
+        from core.gui import GUI
+        from core.extractor import PCB
+        from core.geometry import GeometryTool
+        from core.pipeline import Pipeline
+        from shapely import box
+        IMPORT_TIMES.setdefault("first_run", time.perf_counter() - import_start)
+
         gui = GUI(self.title)
 
         config = gui.get_gui_config()
@@ -40,65 +50,349 @@ class Laser(pcbnew.ActionPlugin):
                          "границы платы")
             gui.destroy_spinner()
             return
+        board_bounds = PCB.get_board_bounds_from_edges(board)
+
+        # Выгрузка области: в полигоны идут только объекты у области, габарит слоя считается по всей плате
+        index = roi = items = None
+        if config.roi_mode:
+            from core.roi import BoardIndex
+            index = BoardIndex(board)
+            try:
+                roi = index.get_selection_bounds() if config.roi_mode == 1 else BoardIndex.parse_rect(config.roi_rect_mm)
+            except ValueError as e:
+                gui.show_msq(str(e))
+                gui.destroy_spinner()
+                return
+            if roi is None:
+                gui.show_msq("Нет выделенных объектов: выделите область платы или задайте прямоугольник")
+                gui.destroy_spinner()
+                return
+            items = index.query(roi, config.roi_margin_um * 1000)
 
-        poly_coords, hole_coords = PCB.get_cu_geometry(
+        # В режиме обеих сторон плата обходится один раз, а слои считаются параллельно
+        layers = [pcbnew.F_Cu, pcbnew.B_Cu] if config.both_layers else [config.copper_layer]
+        # Отдельное кернение: вместо полигонов керна в меди - точки в центрах отверстий
+        punch_job = config.punch_holes and config.punch_mode
+        hole_centers = PCB.get_hole_centers(board, config.tent_via, config.tent_th) if punch_job else None
+        # Дорожки по осевым линиям; калибровка считает только полигоны, поэтому для нее режим не включается
+        centerline_widths = None
+        if config.track_centerlines and not config.sweep_mode:
+            from core.tracks import TrackPaths
+            centerline_widths = TrackPaths.get_width_range(config.laser_beam_wide, config.track_max_levels)
+        layers_coords, hole_coords, layers_tracks = PCB.get_cu_layers_geometry(
             board=board,
-            copper_layer=config.copper_layer,
+            copper_layers=layers,
             tent_via=config.tent_via,
             tent_th=config.tent_th,
             only_pad=config.only_pad,
             punch_holes=config.punch_holes,
-            arc_segments=config.arc_segments)
+            arc_segments=config.arc_segments,
+            skip_holes=punch_job,
+            centerline_widths=centerline_widths,
+            items=items)
 
-        if not poly_coords:
+        layers = [layer for layer in layers if layers_coords[layer] or len(layers_tracks[layer])]
+        if not layers:
             gui.show_msq("На выбранном слое нет медных объектов")
             gui.destroy_spinner()
             return
 
-        shapely_multy = GeometryTool.get_shapely_complete_multy_poly(poly_coords, hole_coords)
-        shapely_multy = GeometryTool.offset_geometry(shapely_multy, origin_x, origin_y)
-        shapely_multy = GeometryTool.mirror_geometry(shapely_multy)
+        holes = GeometryTool.get_holes(hole_coords)
+        layers_multy = GeometryTool.get_shapely_layers({layer: layers_coords[layer] for layer in layers}, holes)
+        item_counts = {layer: len(layers_coords[layer]) for layer in layers}
+        del layers_coords, hole_coords
 
-        if config.copper_layer == pcbnew.B_Cu:
-            shapely_multy = GeometryTool.mirror_geometry(shapely_multy, 'y')
+        layers_bounds = {}
+        if roi is not None:
+            layers_bounds = {layer: index.get_layer_bounds(layer, PCB.get_item_bounds, include_tracks=not config.only_pad)
+                             for layer in layers}
+            # Медь обрезается по области с полем, чтобы кольца у края области совпадали с полным заданием
+            margin = config.roi_margin_um * 1000
+            roi_box = box(roi[0] - margin, roi[1] - margin, roi[2] + margin, roi[3] + margin)
+            layers_multy = {layer: geom.intersection(roi_box) for layer, geom in layers_multy.items()}
+            if hole_centers is not None:
+                inside = ((hole_centers[:, 0] >= roi[0]) & (hole_centers[:, 0] <= roi[2]) &
+                          (hole_centers[:, 1] >= roi[1]) & (hole_centers[:, 1] <= roi[3]))
+                hole_centers = hole_centers[inside]
 
-        polygons = GeometryTool.extract_sorted_polygons(shapely_multy)
+        # Автовыбор числа потоков по статистике слоев, настройки не меняются
+        tunings = {layer: None for layer in layers}
+        workers = config.workers
+        tune_report = []
+        if config.auto_tune and not config.sweep_mode:
+            from core.autotune import AutoTune
+            try:
+                tunings = {layer: AutoTune(config) for layer in layers}
+            except (OSError, ValueError) as e:
+                gui.show_msq(f"Не удалось загрузить модель автовыбора: {e}")
+                gui.destroy_spinner()
+                return
+            for layer in layers:
+                tune_report += tunings[layer].plan(layers_multy[layer], item_counts[layer])
+            workers = max(tuning.workers for tuning in tunings.values())
+
+        try:
+            pipelines = {layer: Pipeline(config, workers) for layer in layers}
+        except ImportError as e:
+            gui.show_msq(f"Для растрового генератора нужны numpy, scipy и contourpy: {e}")
+            gui.destroy_spinner()
+            return
+        if config.verify_coverage:
+            try:
+                import core.verifier  # noqa: F401
+            except ImportError as e:
+                gui.show_msq(f"Для проверки засвета нужен scipy: {e}")
+                gui.destroy_spinner()
+                return
+
+        if config.sweep_mode:
+            from core.sweep import Sweep
+            sweep = Sweep(config)
+            message = []
+            for layer in layers:
+                message += sweep.run(
+                    layers_multy[layer], origin_x, origin_y, config.COPPER_LAYERS[layer], mirror_y=layer == pcbnew.B_Cu)
+            gui.destroy_spinner()
+            gui.show_msq("\n".join(message))
+            return
 
         if config.view_type:
             from core.previewer_mpl import Plotter
+            plt = Plotter(self.title, rasterized=config.preview_rasterized)
         else:
             from core.previewer_wx import Plotter
+            plt = Plotter(self.title)
 
-        plt = Plotter(self.title)
-        if config.show_preview:
-            plt.render_preview(polygons)
-
-        paths = []
-        for figure in polygons:
-            figure_paths = GeometryTool.generate_inset_paths(
-                current_geom=figure,
-                step=config.laser_beam_wide,
-                min_length_um=config.min_length_um,
-                sort_type=config.sort_type)
-            if figure_paths:
-                paths.append(figure_paths)
-
-        if config.show_paths:
-            plt.plot_inset_paths(paths)
+        # Режим стола: к плате добавляются сохраненные ранее пути других плат, для каждого слоя - свои файлы
+        bed_boards = {layer: [] for layer in layers}
+        try:
+            from core.nesting import Nesting
+            from core.toolpath import Toolpath
+            for bed_file in config.bed_jobs.split(";"):
+                if bed_file.strip():
+                    for layer in layers:
+                        bed_boards[layer].append(Toolpath(Nesting.get_layer_file(
+                            bed_file.strip(), config.COPPER_LAYERS[layer], config.COPPER_LAYERS.values())))
+        except (OSError, ValueError) as e:
+            gui.show_msq(f"Не удалось открыть файл путей: {e}")
+            gui.destroy_spinner()
+            return
 
-        filename = f"laser_{config.COPPER_LAYERS[config.copper_layer]}.gcode"
-        output_filename = os.path.join(config.user_dir, filename)
+        try:
+            if len(layers) == 1:
+                layer = layers[0]
+                results = [self.process_layer(
+                    config, layer, layers_multy[layer], pipelines[layer], origin_x, origin_y, hole_centers,
+                    bed_boards[layer], plt, layers_tracks[layer], holes, roi, layers_bounds.get(layer), board_bounds,
+                    tunings[layer])]
+            else:
+                # Окна просмотра создаются только в главном потоке, поэтому для двух слоев просмотра нет
+                with ThreadPoolExecutor(len(layers)) as executor:
+                    results = list(executor.map(
+                        lambda layer: self.process_layer(
+                            config, layer, layers_multy[layer], pipelines[layer], origin_x, origin_y, hole_centers,
+                            bed_boards[layer], tracks=layers_tracks[layer], holes=holes, roi=roi,
+                            layer_bounds=layers_bounds.get(layer), board_bounds=board_bounds,
+                            tuning=tunings[layer]),
+                        layers))
+        except ValueError as e:
+            gui.show_msq(str(e))
+            gui.destroy_spinner()
+            plt.destroy_all()
+            return
 
-        Machine.generate_gcode_to_file(
-            paths=paths,
-            filename=output_filename,
-            base_speed=config.base_speed,
-            short_speed=config.short_speed,
-            laser_power=config.laser_power,
-            round_um=config.round_um,
-            min_contour_length=config.min_contour_length,
-            max_contour_length=config.max_contour_length)
+        message = list(tune_report)
+        for output_filename, report in results:
+            message += [f"Сохранен файл {output_filename}"] + report
 
         gui.destroy_spinner()
-        gui.show_msq(f"Сохранен файл {output_filename}")
+        gui.show_msq("\n".join(message))
         plt.destroy_all()
+
+    @staticmethod
+    def process_layer(config, layer, shapely_multy, pipeline, origin_x, origin_y, hole_centers=None, bed_boards=None,
+                      plt=None, tracks=None, holes=None, roi=None, layer_bounds=None, board_bounds=None,
+                      tuning=None):
+        """
+        Отступы, G-код и оценка одного слоя: (имя файла, строки отчета).
+        tracks - отрезки дорожек по осевым линиям (N x 5), holes - отверстия для их обрезки.
+        roi - область платы, по которой обрезаются пути; layer_bounds - габарит меди слоя по всей плате;
+        board_bounds - габарит Edge.Cuts, по нему шагают копии панели; tuning - AutoTune слоя для метрик
+        """
+        from core.estimator import Estimator
+        from core.geometry import GeometryTool
+        from core.machine import Machine
+        from core.nesting import Nesting
+        from core.panel import Panel
+        from core.pipeline import Pipeline
+        from core.punch import Punch
+        from core.toolpath import Toolpath
+        from core.tools import save_metrics
+        from core.tracks import TrackPaths
+        from shapely import box
+        from shapely.affinity import affine_transform
+
+        mirror_y = layer == pcbnew.B_Cu
+        has_tracks = tracks is not None and len(tracks)
+        # Габарит слоя - по меди и дорожкам вместе, чтобы положение на станке не зависело от режима дорожек
+        bounds = shapely_multy.bounds
+        if layer_bounds is not None:
+            bounds = layer_bounds
+        elif has_tracks:
+            track_bounds = TrackPaths.get_bounds(tracks)
+            if shapely_multy.is_empty:
+                bounds = track_bounds
+            else:
+                bounds = (min(bounds[0], track_bounds[0]), min(bounds[1], track_bounds[1]),
+                          max(bounds[2], track_bounds[2]), max(bounds[3], track_bounds[3]))
+        figures = pipeline.iter_figures(shapely_multy, origin_x, origin_y, mirror_y=mirror_y, bounds=bounds)
+
+        # Живой просмотр есть только в WX, для MPL остается обычный просмотр после расчета
+        live = plt is not None and config.live_preview and not config.view_type
+        if live:
+            plt.live_preview(pipeline, Pipeline.get_bounds(shapely_multy, origin_x, origin_y, mirror_y, bounds))
+        elif plt is not None and config.show_preview:
+            figures = list(figures)
+            plt.render_preview(figures)
+
+        filename = f"laser_{config.COPPER_LAYERS[layer]}.gcode"
+        output_filename = os.path.join(config.user_dir, filename)
+
+        verifier = None
+        if config.verify_coverage:
+            # Фигуры проверяются партиями по ходу расчета и сразу отпускаются
+            from core.verifier import CoverageVerifier
+            verifier = CoverageVerifier(config.laser_beam_wide, config.round_um * 1000 * max(1, config.verify_scale),
+                                        workers=pipeline.workers)
+            pipeline.subscribe(verifier.add_figure)
+
+        matrix = GeometryTool.get_board_transform(bounds, origin_x, origin_y, mirror_y)
+        # Габарит платы в координатах станка: медь может не доходить до края, а копии не должны перекрываться
+        outline = affine_transform(box(*board_bounds), matrix).bounds if board_bounds is not None else None
+        paths = pipeline.iter_paths(figures)
+        track_paths = []
+        # Медь цепочек дорожек и их пути для проверки засвета: отдельной партией после фигур,
+        # дорожки заходят на пады и в одной партии с ними перекрывались бы
+        track_figures = []
+        if has_tracks:
+            # Дорожки уже готовые пути: идут после фигур меди тем же потоком
+            track_paths = TrackPaths.generate_paths(
+                tracks, config.laser_beam_wide, matrix, holes,
+                listener=(lambda figure, figure_paths: track_figures.append((figure, figure_paths)))
+                if verifier is not None else None,
+                copper=shapely_multy, min_length_um=config.min_length_um)
+            paths = chain(paths, track_paths)
+        if roi is not None:
+            paths = GeometryTool.clip_paths(paths, affine_transform(box(*roi), matrix))
+            output_filename = os.path.splitext(output_filename)[0] + "_roi.gcode"
+        marks = None
+        if hole_centers is not None and len(hole_centers):
+            marks = Punch.transform(hole_centers, matrix)
+        if config.save_toolpath:
+            # Пути и метки платы без панели пишутся в бинарный файл попутно, по мере выдачи
+            toolpath_filename = os.path.splitext(output_filename)[0] + ".ltp"
+            paths = Toolpath.iter_write(paths, toolpath_filename, outline, marks)
+        is_panel = config.panel_rows * config.panel_cols > 1
+        show_paths = plt is not None and config.show_paths and not live
+        # Предпросмотр, панель и стол требуют всех путей платы сразу, иначе пути идут в файл потоком.
+        # Копии панели в память не собираются
+        if show_paths or is_panel or bed_boards:
+            paths = list(paths)
+
+        if show_paths:
+            plt.plot_inset_paths(paths)
+
+        gcode_paths = paths
+        if is_panel:
+            # Копии платы строятся на лету при записи файла
+            panel = Panel(
+                paths=paths,
+                rows=config.panel_rows,
+                cols=config.panel_cols,
+                spacing=config.panel_spacing_um * 1000,
+                rotation=config.panel_rotation,
+                outline=outline)
+            gcode_paths = panel.iter_paths()
+            if marks is not None:
+                marks = panel.get_points(marks)
+
+        nesting = layout = None
+        if bed_boards:
+            # Плата (или панель) раскладывается на столе вместе с остальными, задание пишется в отдельный файл
+            nesting = Nesting(config.bed_width_mm * 1000000, config.bed_height_mm * 1000000,
+                              config.panel_spacing_um * 1000)
+            # Панель раскладывается по своему габариту, нижний слой - зеркально, как и сами платы
+            boards = [panel if is_panel else paths] + bed_boards
+            layout = nesting.layout(boards, [None if is_panel else outline] + [None] * len(bed_boards),
+                                    mirror_x=mirror_y)
+            # Метки всех плат стола: этой - посчитанные выше, остальных - из их файлов путей
+            if hole_centers is not None:
+                marks = nesting.get_marks(boards, layout, [marks] + [None] * len(bed_boards))
+            output_filename = os.path.splitext(output_filename)[0] + "_bed.gcode"
+
+        punch_commands = None
+        if marks is not None:
+            punch_commands = Punch.iter_marks(Punch.order_centers(marks), **config.get_punch_settings())
+
+        append_marks = config.punch_mode == 2
+        if nesting:
+            nesting.generate_gcode_to_file(
+                boards,
+                output_filename,
+                layout=layout,
+                extra_commands=punch_commands if append_marks else None,
+                **config.get_machine_settings())
+        else:
+            Machine.generate_gcode_to_file(
+                paths=gcode_paths,
+                filename=output_filename,
+                extra_commands=punch_commands if append_marks else None,
+                **config.get_machine_settings())
+        if live:
+            plt.finish_live_preview()
+        report = pipeline.get_report()
+        if roi is not None:
+            report.append(f"Область: {(roi[2] - roi[0]) / 1000000:.1f} x {(roi[3] - roi[1]) / 1000000:.1f} мм")
+        if has_tracks:
+            report.append(f"Дорожки по осям: {len(tracks)} отрезков, {len(track_paths)} путей")
+        if nesting:
+            report.append(f"Стол: {len(boards)} плат в одном задании")
+        if config.save_toolpath:
+            report.append(f"Пути: {toolpath_filename}")
+
+        if punch_commands is not None:
+            if append_marks:
+                report.append(f"Кернение: {len(marks)} меток в конце задания")
+            else:
+                punch_filename = os.path.splitext(output_filename)[0] + "_punch.gcode"
+                Machine.generate_gcode_to_file(
+                    paths=[], filename=punch_filename, extra_commands=punch_commands,
+                    **config.get_machine_settings())
+                report.append(f"Кернение: {len(marks)} меток, файл {punch_filename}")
+
+        if config.estimate_job:
+            estimator = Estimator(
+                acceleration=config.acceleration,
+                junction_deviation=config.junction_um / 1000,
+                rapid_rate=config.rapid_rate)
+            job_metrics = estimator.estimate_file(output_filename)
+            report.append(Estimator.format_metrics(job_metrics))
+            metrics_filename = os.path.splitext(output_filename)[0] + ".metrics.json"
+            save_metrics(metrics_filename, {"estimate": job_metrics, "import_times": IMPORT_TIMES})
+
+        if verifier is not None:
+            verifier.flush()
+            for figure, figure_paths in track_figures:
+                verifier.add_figure(figure, figure_paths)
+            coverage = verifier.verify()
+            report += CoverageVerifier.format_report(coverage)
+            metrics_filename = os.path.splitext(output_filename)[0] + ".metrics.json"
+            save_metrics(metrics_filename, {"coverage": CoverageVerifier.get_metrics(coverage)})
+
+        if tuning:
+            # Прогноз и факт по движкам - для проверки и уточнения модели (python -m core.autotune refit)
+            metrics_filename = os.path.splitext(output_filename)[0] + ".metrics.json"
+            save_metrics(metrics_filename, {"autotune": tuning.get_metrics(pipeline.engine_times)})
+            tuning.log(pipeline.engine_times)
+
+        return output_filename, report
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули плагина импортируются как core.*, как из laser_action.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,37 @@
+from shapely import MultiPolygon, Point, box
+
+from core.autotune import ENGINES, AutoTune, CostModel
+from core.settings import PluginConfig
+
+MODEL = CostModel({
+    "primitive": {"c": 1e-4, "a": 1e-7, "p": 1.0},
+    "buffer": {"c": 1e-3, "a": 1e-6, "p": 1.5},
+    "tiled": {"c": 0.0, "a": 1e-6, "p": 1.0},
+})
+PAD = box(0, 0, 400000, 300000)
+PLANE = Point(0, 0).buffer(15000000, 64).difference(box(-1000000, -1000000, 1000000, 1000000))
+
+
+def get_tune(**settings):
+    config = PluginConfig()
+    for key, value in settings.items():
+        setattr(config, key, value)
+    return AutoTune(config, MODEL)
+
+
+def test_engines_follow_settings():
+    tune = get_tune(inset_tile_mm=2)
+    _, engines = tune.predict(tune.get_features([PAD, PLANE]))
+    assert [ENGINES[index] for index in engines] == ["primitive", "tiled"]
+    tune = get_tune(primitive_insets=False)
+    _, engines = tune.predict(tune.get_features([PAD, PLANE]))
+    assert [ENGINES[index] for index in engines] == ["buffer", "buffer"]
+
+
+def test_plan_sets_workers_without_touching_config():
+    tune = get_tune(workers=1)
+    report = tune.plan(MultiPolygon([PAD, PLANE]))
+    assert tune.workers >= 1 and tune.config.workers == 1
+    assert tune.decisions["engines"] == {"primitive": 1, "buffer": 1}
+    assert sum(tune.predicted.values()) == tune.decisions["predicted_total_s"]
+    assert report[0].startswith("Автовыбор: потоков")
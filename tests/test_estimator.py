@@ -0,0 +1,30 @@
+import pytest
+
+from core.estimator import Estimator
+
+EMPTY_JOB = b"G21 G17 G90\nG0Z0\nM4\nM5\nG0X0Y0\nM30\n"
+# Квадрат 10 x 10 мм на F600 с холостым подходом
+SQUARE_JOB = (b"G21 G17 G90\nM4\nG0X10Y10\nG1X20Y10F600S255\nX20Y20\nX10Y20\nX10Y10\n"
+              b"G4P0.5\nM5\nG0X0Y0\nM30\n")
+
+
+def test_empty_job():
+    metrics = Estimator().estimate_bytes(EMPTY_JOB)
+    assert metrics["time_s"] == 0.0 and metrics["cut_length_mm"] == 0.0
+
+
+def test_square_job():
+    metrics = Estimator(acceleration=1e9).estimate_bytes(SQUARE_JOB)
+    assert metrics["cut_length_mm"] == pytest.approx(40)
+    assert metrics["rapid_length_mm"] == pytest.approx(2 * 200 ** 0.5)
+    assert metrics["laser_transitions"] == 1
+    # 40 мм на 10 мм/с, холостые на 50 мм/с и выдержка
+    assert metrics["time_s"] == pytest.approx(4 + 2 * 200 ** 0.5 / 50 + 0.5, rel=1e-3)
+
+
+def test_file_matches_bytes(tmp_path):
+    filename = tmp_path / "job.gcode"
+    filename.write_bytes(SQUARE_JOB)
+    assert Estimator().estimate_file(filename) == Estimator().estimate_bytes(SQUARE_JOB)
+    filename.write_bytes(b"")
+    assert Estimator().estimate_file(filename)["time_s"] == 0.0
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from shapely import LineString, Point, box, unary_union
+
+from core.geometry import GeometryTool
+
+
+def test_snap_to_grid_drops_collapsed_parts():
+    # Отступ круглого пада на 4 шага после привязки - только схлопнувшиеся в линии осколки
+    pad = GeometryTool.snap_to_grid(Point(0, 0).buffer(109000, 8), 2000)
+    assert GeometryTool.snap_to_grid(pad.buffer(-100000), 2000).is_empty
+
+
+def test_inset_levels_snapped_round_pad():
+    pad = GeometryTool.snap_to_grid(Point(0, 0).buffer(109000, 8), 2000)
+    inset_levels = GeometryTool.get_inset_levels(pad, 25000, 400, 2000)
+    assert inset_levels
+    assert all(len(ring) >= 4 and ring[0] == ring[-1] for ring in inset_levels)
+    assert all(x % 2000 == 0 and y % 2000 == 0 for ring in inset_levels for x, y in ring)
+
+
+
+def test_prune_keeps_single_ring_figure():
+    # Узкая дорожка: после отбрасывания остается одно кольцо, фигура не должна пропасть
+    track = box(0, 0, 1000000, 102000)
+    paths = GeometryTool.generate_inset_paths(track, 25000, 0, True, prune_fraction=0.6)
+    assert paths
+
+
+def test_prune_keeps_rings_without_neighbours():
+    # Кольцо, стороны которого засвечивают одну полосу, без соседей не отбрасывается
+    track = box(0, 0, 1000000, 60000)
+    inset_levels = GeometryTool.get_inset_levels(track, 25000, 0)
+    assert GeometryTool.prune_covered_rings(inset_levels, 25000, 0.9) == inset_levels
+
+
+def test_prune_drops_covered_ring():
+    # Второе кольцо лежит в засвете первого: новой площади почти нет
+    outer = list(box(0, 0, 1000000, 500000).exterior.coords)
+    inner = list(box(5000, 5000, 995000, 495000).exterior.coords)
+    assert GeometryTool.prune_covered_rings([outer, inner], 25000, 0.5) == [outer]
+
+
+def test_tiled_inset_levels_match_buffer():
+    plane = box(0, 0, 6000000, 4000000).difference(
+        unary_union([Point(x, y).buffer(300000, 8) for x in range(1000000, 6000000, 1500000)
+                     for y in range(1000000, 4000000, 1500000)]))
+    inset_levels = GeometryTool.get_inset_levels(plane, 25000, 400)
+    length = sum(LineString(ring).length for ring in inset_levels)
+    # Тайл 2 мм: все уровни за один проход, результат совпадает с buffer
+    with ThreadPoolExecutor(2) as executor:
+        tiled = GeometryTool.get_inset_levels_tiled(plane, 25000, 400, 2000000, executor=executor)
+    assert len(tiled) == len(inset_levels)
+    assert abs(sum(LineString(ring).length for ring in tiled) - length) < 1
+    # Тайл 1 мм: глубокие уровни из сшитого, расхождение - только аппроксимация дуг
+    tiled = GeometryTool.get_inset_levels_tiled(plane, 25000, 400, 1000000)
+    assert abs(sum(LineString(ring).length for ring in tiled) - length) < length * 1e-4
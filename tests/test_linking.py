@@ -0,0 +1,35 @@
+from shapely import LineString, MultiPolygon, box
+
+from core.geometry import GeometryTool
+
+STEP = 25000
+PLATE = box(0, 0, 2000000, 1500000)
+# Пластина с прорезью: кольца по разные стороны прорези не связываются через нее
+SLOTTED = PLATE.difference(box(900000, 400000, 1100000, 1500000))
+
+
+def get_rings(figure):
+    return GeometryTool.generate_inset_paths(figure, STEP, 0, True)
+
+
+def test_linked_rings_stay_inside_and_keep_order():
+    for figure in (PLATE, SLOTTED):
+        rings = get_rings(figure)
+        linked = GeometryTool.link_inset_rings(rings, figure, STEP)
+        assert len(linked) < len(rings)
+        # Порядок колец и точек не меняется, добавляются только переходы между ними
+        assert [point for path in linked for point in path] == [point for ring in rings for point in ring]
+        inner = figure.buffer(-STEP / 2 + 1)
+        for path in linked:
+            assert inner.covers(LineString(path))
+
+
+def test_no_link_across_gap():
+    left, right = box(0, 0, 500000, 500000), box(520000, 0, 1020000, 500000)
+    rings = [list(left.buffer(-STEP / 2).exterior.coords), list(right.buffer(-STEP / 2).exterior.coords)]
+    assert len(GeometryTool.link_inset_rings(rings, MultiPolygon([left, right]), STEP)) == 2
+
+
+def test_single_ring_unchanged():
+    rings = [list(PLATE.buffer(-STEP / 2).exterior.coords)]
+    assert GeometryTool.link_inset_rings(rings, PLATE, STEP) == rings
@@ -0,0 +1,40 @@
+import re
+
+import numpy as np
+
+from core.machine import Machine
+
+BASE, SHORT = 900, 750
+MM = 1000000
+
+
+def test_straight_line_full_speed():
+    points = np.array([(0, 0), (50, 0), (100, 0)], dtype=float)
+    assert Machine.plan_segment_speeds(points, BASE, SHORT, 1500).tolist() == [BASE, BASE]
+
+
+def test_corner_speed_capped():
+    # Без разгона подача отрезка - меньшая из подач вершин на его концах
+    points = np.array([(0, 0), (10, 0), (10, 10), (20, 10), (10, 10)], dtype=float)
+    speeds = Machine.plan_segment_speeds(points, BASE, SHORT, 0)
+    # Старт с остановки, между двумя поворотами на 90° - середина диапазона, разворот - short_speed
+    assert speeds.tolist() == [SHORT, (BASE + SHORT) // 2, SHORT, SHORT]
+    # На длинном отрезке станок разгоняется до base_speed
+    points = np.array([(0, 0), (100, 0), (100, 100), (200, 100)], dtype=float)
+    assert Machine.plan_segment_speeds(points, BASE, SHORT, 1500)[1] == BASE
+
+
+def get_feeds(contour, threshold=50):
+    lines = list(Machine.iter_commands([[contour]], BASE, SHORT, plan_feed=True, acceleration=0,
+                                       feed_threshold=threshold))
+    return [int(match.group(1)) for line in lines for match in [re.search(r"F(\d+)", line)] if match]
+
+
+def test_feed_emitted_only_on_change():
+    # Прямая: одна подача на весь контур
+    assert len(get_feeds([(0, 0), (50 * MM, 0), (100 * MM, 0)])) == 1
+    contour = [(0, 0), (10 * MM, 0), (10 * MM, 10 * MM), (20 * MM, 10 * MM), (20 * MM, 20 * MM)]
+    feeds = get_feeds(contour)
+    assert feeds == [SHORT, (BASE + SHORT) // 2, SHORT]
+    # Изменения меньше порога не выводятся
+    assert get_feeds(contour, threshold=100) == [SHORT]
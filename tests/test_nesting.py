@@ -0,0 +1,84 @@
+from core.nesting import Nesting
+from core.panel import Panel
+from core.toolpath import Toolpath
+
+# Плата 10 x 8 мм, медь - квадрат 2 x 2 мм в середине
+OUTLINE = (0, 0, 10000000, 8000000)
+PATHS = [[[(4000000, 3000000), (6000000, 3000000), (6000000, 5000000), (4000000, 5000000), (4000000, 3000000)]]]
+
+
+def get_places(layout, outlines):
+    shifts, _ = layout
+    return [(min_x + dx, min_y + dy, max_x + dx, max_y + dy)
+            for (dx, dy), (min_x, min_y, max_x, max_y) in zip(shifts, outlines)]
+
+
+def test_layout_packs_outlines():
+    nesting = Nesting(100000000, 100000000, 1000000)
+    layout = nesting.layout([PATHS, PATHS], [OUTLINE, OUTLINE])
+    first, second = get_places(layout, [OUTLINE, OUTLINE])
+    # Платы не перекрываются и стоят с зазором
+    assert second[0] - first[2] >= 1000000 or second[1] - first[3] >= 1000000
+
+
+def test_layout_uses_toolpath_outline(tmp_path):
+    filename = str(tmp_path / "board.ltp")
+    Toolpath.save(PATHS, filename, OUTLINE)
+    toolpath = Toolpath(filename)
+    assert toolpath.outline == OUTLINE
+    nesting = Nesting(100000000, 100000000, 1000000)
+    layout = nesting.layout([PATHS, toolpath], [OUTLINE, None])
+    first, second = get_places(layout, [OUTLINE, OUTLINE])
+    assert second[0] - first[2] >= 1000000 or second[1] - first[3] >= 1000000
+
+
+def test_toolpath_without_outline(tmp_path):
+    filename = str(tmp_path / "board.ltp")
+    Toolpath.save(PATHS, filename)
+    toolpath = Toolpath(filename)
+    assert toolpath.outline is None
+    assert [contour.tolist() for contour in toolpath.get_figure(0)] == [[list(point) for point in PATHS[0][0]]]
+
+
+def test_layout_with_marks(tmp_path):
+    filename = str(tmp_path / "board.ltp")
+    Toolpath.save(PATHS, filename, OUTLINE, marks=[(5000000, 4000000)])
+    toolpath = Toolpath(filename)
+    assert toolpath.marks.tolist() == [[5000000, 4000000]]
+    nesting = Nesting(100000000, 100000000, 1000000)
+    boards = [PATHS, toolpath]
+    layout = nesting.layout(boards, [OUTLINE, None])
+    marks = nesting.get_marks(boards, layout, [[(1000000, 1000000)], None])
+    (dx0, dy0), (dx1, dy1) = layout[0]
+    # Метки обеих плат сдвинуты вместе со своими платами
+    assert marks.tolist() == [[1000000 + dx0, 1000000 + dy0], [5000000 + dx1, 4000000 + dy1]]
+    assert nesting.get_marks([PATHS], nesting.layout([PATHS], [OUTLINE])) is None
+
+
+def test_panel_nested_lazily():
+    panel = Panel(PATHS, 2, 3, 500000, outline=OUTLINE)
+    nesting = Nesting(100000000, 100000000, 1000000)
+    assert len(list(nesting.iter_paths([panel, PATHS], nesting.layout([panel, PATHS], [None, OUTLINE])))) == 7
+    # Копии панели на столе - те же, что дает Panel.iter_paths, со сдвигом на место панели
+    layout = nesting.layout([panel])
+    (dx, dy), = layout[0]
+    figures = sorted(tuple(map(tuple, figure[0])) for figure in nesting.iter_paths([panel], layout))
+    expected = sorted(tuple((x + dx, y + dy) for x, y in figure[0]) for figure in panel.iter_paths())
+    assert figures == expected
+
+
+def test_bottom_layer_layout_mirrored():
+    nesting = Nesting(100000000, 100000000, 1000000)
+    wide = (0, 0, 20000000, 8000000)
+    top = get_places(nesting.layout([PATHS, PATHS], [OUTLINE, wide]), [OUTLINE, wide])
+    bottom = get_places(nesting.layout([PATHS, PATHS], [OUTLINE, wide], mirror_x=True), [OUTLINE, wide])
+    used_width = max(place[2] for place in top)
+    for top_place, bottom_place in zip(top, bottom):
+        assert bottom_place == (used_width - top_place[2], top_place[1], used_width - top_place[0], top_place[3])
+
+
+def test_layer_file():
+    names = ("F_Cu", "B_Cu")
+    assert Nesting.get_layer_file("/tmp/laser_F_Cu.ltp", "B_Cu", names) == "/tmp/laser_B_Cu.ltp"
+    assert Nesting.get_layer_file("/tmp/laser_F_Cu.ltp", "F_Cu", names) == "/tmp/laser_F_Cu.ltp"
+    assert Nesting.get_layer_file("/tmp/board.ltp", "B_Cu", names) == "/tmp/board.ltp"
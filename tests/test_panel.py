@@ -0,0 +1,30 @@
+from core.panel import Panel
+from core.sweep import Sweep
+
+# Плата 10 x 8 мм, медь - квадрат 2 x 2 мм в углу
+OUTLINE = (0, 0, 10000000, 8000000)
+PATHS = [[[(1000000, 1000000), (3000000, 1000000), (3000000, 3000000), (1000000, 3000000), (1000000, 1000000)]]]
+
+
+def test_pitch_from_outline():
+    panel = Panel(PATHS, 2, 3, 500000, outline=OUTLINE)
+    assert (panel.pitch_x, panel.pitch_y) == (10500000, 8500000)
+    assert panel.get_transform(1, 2)(0, 0) == (21000000, 8500000)
+
+
+def test_pitch_from_paths_without_outline():
+    panel = Panel(PATHS, 1, 2, 500000)
+    assert panel.pitch_x == 2500000
+
+
+def test_rotated_pitch_from_outline():
+    panel = Panel(PATHS, 1, 2, 500000, rotation=90, outline=OUTLINE)
+    assert panel.pitch_x == 8500000
+    # Повернутая копия остается в габарите своей ячейки
+    x, y = panel.get_transform(0, 1)(*PATHS[0][0][0])
+    assert 8500000 <= x <= 17000000 and 0 <= y <= 10000000
+
+
+def test_sweep_bounds_cover_all_widths():
+    wide = [[[(0, 0), (4000000, 0), (4000000, 5000000), (0, 0)]]]
+    assert Sweep.get_bounds({100: PATHS, 200: wide, 300: []}) == (0, 0, 4000000, 5000000)
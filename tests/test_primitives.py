@@ -0,0 +1,29 @@
+import pytest
+from shapely import LinearRing, Point, Polygon, box
+from shapely.affinity import rotate
+
+from core.geometry import GeometryTool
+from core.primitives import PrimitiveInset
+
+STEP = 25000
+MIN_LENGTH_UM = 400
+
+
+@pytest.mark.parametrize("figure", [
+    box(0, 0, 1000000, 600000),
+    rotate(box(0, 0, 900000, 300000), 30),
+    Point(0, 0).buffer(500000, 8),
+    Polygon([(0, 0), (800000, 0), (300000, 500000)]),
+])
+def test_primitive_inset_matches_buffer(figure):
+    expected = GeometryTool.get_inset_levels(figure, STEP, MIN_LENGTH_UM)
+    rings = PrimitiveInset.get_inset_levels(PrimitiveInset.get_vertices(figure), STEP, MIN_LENGTH_UM)
+    assert len(rings) == len(expected)
+    for ring, expected_ring in zip(rings, expected):
+        assert LinearRing(ring).hausdorff_distance(LinearRing(expected_ring)) < 1
+        assert LinearRing(ring).is_ccw == LinearRing(expected_ring).is_ccw
+
+
+def test_non_convex_has_no_vertices():
+    assert PrimitiveInset.get_vertices(box(0, 0, 10, 10).difference(box(5, 5, 10, 10))) is None
+    assert PrimitiveInset.get_vertices(box(0, 0, 10, 10).difference(box(4, 4, 6, 6))) is None
@@ -0,0 +1,49 @@
+import numpy as np
+
+from core.punch import Punch
+
+MM = 1000000
+
+
+def test_order_is_tour_over_grid():
+    # Решетка 4 x 4 на кривой Гильберта второго порядка: каждый шаг - к соседней точке
+    grid = np.array([(x, y) for x in range(4) for y in range(4)], dtype=float)
+    np.random.default_rng(1).shuffle(grid)
+    order = Punch.get_order(grid, order=2)
+    assert sorted(order.tolist()) == list(range(len(grid)))
+    tour = Punch.order_centers(grid, order=2)
+    steps = np.hypot(*np.diff(tour, axis=0).T)
+    assert steps.tolist() == [1.0] * (len(grid) - 1)
+
+
+def test_order_keeps_clusters_together():
+    rng = np.random.default_rng(2)
+    left = rng.uniform(0, MM, (20, 2))
+    right = rng.uniform(0, MM, (20, 2)) + (100 * MM, 0)
+    centers = np.concatenate((left, right))[rng.permutation(40)]
+    tour = Punch.order_centers(centers)
+    # Между группами маршрут переходит один раз
+    is_right = tour[:, 0] > 50 * MM
+    assert np.count_nonzero(is_right[1:] != is_right[:-1]) == 1
+    # Две точки - без перестановки
+    assert Punch.get_order(centers[:2]).tolist() == [0, 1]
+
+
+def test_dwell_mark_commands():
+    centers = np.array([(MM, 2 * MM), (3 * MM, 4 * MM)])
+    assert list(Punch.iter_marks(centers, laser_power=200, dwell_ms=150)) == [
+        "G0X1.000Y2.000S0", "M3S200", "G4P0.150", "M4S0",
+        "G0X3.000Y4.000S0", "M3S200", "G4P0.150", "M4S0",
+    ]
+
+
+def test_spiral_mark_commands():
+    centers = np.array([(MM, 2 * MM)])
+    lines = list(Punch.iter_marks(centers, laser_power=200, spiral_radius=50000, pitch=25000, speed=600))
+    # Два витка по SPIRAL_POINTS_PER_TURN точек, первая точка - центр
+    assert len(lines) == 1 + 32
+    assert lines[0] == "G0X1.000Y2.000S0"
+    assert lines[1].startswith("G1X") and lines[1].endswith("F600S200")
+    assert all(line.startswith("X") for line in lines[2:])
+    # Спираль заканчивается на радиусе
+    assert lines[-1] == "X1.050Y2.000"
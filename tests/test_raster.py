@@ -0,0 +1,36 @@
+import pytest
+from shapely import MultiLineString, Point, Polygon, box
+from shapely.affinity import rotate
+
+from core.geometry import GeometryTool
+
+pytest.importorskip("scipy")
+pytest.importorskip("contourpy")
+from core.raster import RasterInset  # noqa: E402
+
+STEP = 25000
+MIN_LENGTH_UM = 400
+PIXEL = 5000
+
+
+# Ширина фигур не кратна шагу: уровень точно на оси фигуры вырождается в растре и в buffer по-разному
+@pytest.mark.parametrize("figure", [
+    box(0, 0, 1000000, 610000),
+    rotate(box(0, 0, 900000, 310000), 30),
+    Point(0, 0).buffer(510000, 16),
+    box(0, 0, 1000000, 1000000).difference(box(340000, 340000, 660000, 660000)),
+    Polygon([(0, 0), (800000, 0), (800000, 800000), (0, 800000), (0, 510000), (510000, 510000), (510000, 290000),
+             (0, 290000)]),
+])
+def test_raster_inset_matches_buffer(figure):
+    expected = GeometryTool.get_inset_levels(figure, STEP, MIN_LENGTH_UM)
+    rings = RasterInset.get_inset_levels(figure, STEP, MIN_LENGTH_UM, PIXEL)
+    assert len(rings) == len(expected)
+    # Все уровни в пределах расчетной погрешности растра, около пикселя
+    bound = RasterInset.get_deviation_bound(figure, PIXEL)
+    assert bound < 1.5 * PIXEL
+    assert MultiLineString(rings).hausdorff_distance(MultiLineString(expected)) <= bound
+
+
+def test_thin_figure_has_no_levels():
+    assert RasterInset.get_inset_levels(box(0, 0, 1000000, STEP), STEP, MIN_LENGTH_UM, PIXEL) == []
@@ -0,0 +1,117 @@
+import pytest
+from shapely import LineString, box
+
+from core.geometry import GeometryTool
+from core.roi import BoardIndex
+
+MM = 1000000
+
+
+class Rect:
+    def __init__(self, bounds):
+        self.bounds = bounds
+
+    def GetLeft(self):
+        return self.bounds[0]
+
+    def GetTop(self):
+        return self.bounds[1]
+
+    def GetRight(self):
+        return self.bounds[2]
+
+    def GetBottom(self):
+        return self.bounds[3]
+
+
+class Item:
+    """Объект платы KiCad: габарит и выделение"""
+
+    def __init__(self, bounds, selected=False):
+        self.bounds = bounds
+        self.selected = selected
+
+    def GetBoundingBox(self):
+        return Rect(self.bounds)
+
+    def IsSelected(self):
+        return self.selected
+
+
+class Footprint(Item):
+    def __init__(self, pads):
+        super().__init__((0, 0, 0, 0))
+        self.pads = pads
+
+    def Pads(self):
+        return self.pads
+
+
+class Board:
+    def __init__(self, pads, tracks, drawings=()):
+        self.footprints = [Footprint(pads)]
+        self.tracks = list(tracks)
+        self.drawings = list(drawings)
+
+    def GetFootprints(self):
+        return self.footprints
+
+    def GetTracks(self):
+        return self.tracks
+
+    def Drawings(self):
+        return self.drawings
+
+    def Zones(self):
+        return []
+
+
+def test_clip_path_crossing_roi():
+    roi = box(0, 0, 10 * MM, 10 * MM)
+    inside = [(1 * MM, 1 * MM), (2 * MM, 1 * MM)]
+    crossing = [(5 * MM, 5 * MM), (15 * MM, 5 * MM)]
+    figures = list(GeometryTool.clip_paths([[inside, crossing]], roi))
+    assert len(figures) == 1
+    # Контур внутри не меняется, контур на границе обрезается по краю области
+    assert figures[0][0] is inside
+    assert figures[0][1] == [(5 * MM, 5 * MM), (10 * MM, 5 * MM)]
+
+
+def test_clip_ring_crossing_roi_joined_at_start():
+    # Кольцо начинается внутри и выходит за область: кусок до и после точки замыкания - один путь
+    ring = [(5 * MM, 2 * MM), (15 * MM, 2 * MM), (15 * MM, 8 * MM), (5 * MM, 8 * MM), (5 * MM, 2 * MM)]
+    roi = box(0, 0, 10 * MM, 10 * MM)
+    (figure,) = GeometryTool.clip_paths([[ring]], roi)
+    assert len(figure) == 1
+    line = LineString(figure[0])
+    assert line.length == pytest.approx(16 * MM)
+    assert roi.covers(line)
+
+
+def test_clip_drops_figure_outside_roi():
+    roi = box(0, 0, 10 * MM, 10 * MM)
+    outside = [[(20 * MM, 20 * MM), (30 * MM, 20 * MM), (30 * MM, 30 * MM), (20 * MM, 20 * MM)]]
+    inside = [[(1 * MM, 1 * MM), (2 * MM, 2 * MM)]]
+    assert list(GeometryTool.clip_paths([outside, inside, outside], roi)) == [inside]
+
+
+def test_parse_rect():
+    assert BoardIndex.parse_rect("10,20,5,8") == (5 * MM, 8 * MM, 10 * MM, 20 * MM)
+    with pytest.raises(ValueError):
+        BoardIndex.parse_rect("10,20,5")
+    with pytest.raises(ValueError):
+        BoardIndex.parse_rect("1,1,1,5")
+
+
+def test_query_and_selection():
+    pads = [Item((0, 0, MM, MM)), Item((50 * MM, 50 * MM, 51 * MM, 51 * MM), selected=True)]
+    tracks = [Item((0, 0, 20 * MM, MM)), Item((40 * MM, 0, 60 * MM, MM))]
+    index = BoardIndex(Board(pads, tracks))
+    assert index.get_selection_bounds() == (50 * MM, 50 * MM, 51 * MM, 51 * MM)
+    found_pads, found_tracks, found_drawings = index.query((2 * MM, 0, 10 * MM, 10 * MM))
+    assert found_pads == [] and found_tracks == [tracks[0]] and found_drawings == []
+    # Поле области захватывает пад рядом с ней
+    found_pads, _, _ = index.query((2 * MM, 0, 10 * MM, 10 * MM), margin=MM)
+    assert found_pads == [(index.footprints[0], pads[0])]
+    # Объекты целиком вне области не попадают в выгрузку
+    assert index.query((100 * MM, 100 * MM, 110 * MM, 110 * MM)) == ([], [], [])
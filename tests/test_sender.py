@@ -0,0 +1,30 @@
+import pytest
+
+from core.grbl_emulator import GrblEmulator
+from core.sender import GrblSender
+
+JOB = ["G21 G17 G90", "M4"] + [f"G1X{i % 100}.123Y{i // 100}.456F900S255" for i in range(500)] + ["M5", "M30"]
+
+
+def test_stream_through_emulator():
+    # Контроллер перезагружается после открытия порта: строки до приветствия потерялись бы
+    with GrblEmulator(reset_time=0.2) as emulator:
+        stats = GrblSender(emulator.port).stream_commands(JOB)
+    assert stats.stopped is None and not stats.errors
+    assert stats.lines == stats.acks == len(JOB)
+    assert emulator.lines == JOB and emulator.lost_bytes == 0
+    assert emulator.overflows == 0 and emulator.max_rx_fill <= emulator.rx_buffer_size
+
+
+def test_error_stops_with_line_number():
+    job = JOB[:50] + ["", "?bad"] + JOB[50:]
+    with GrblEmulator() as emulator:
+        stats = GrblSender(emulator.port).stream_commands(job)
+    assert stats.stopped.line_number == 52 and stats.stopped.response == "error:20"
+    assert len(emulator.lines) < len(job) - 1
+
+
+def test_no_banner_times_out():
+    with GrblEmulator(banner=False) as emulator:
+        with pytest.raises(TimeoutError):
+            GrblSender(emulator.port, connect_timeout=0.3).stream_commands(JOB)
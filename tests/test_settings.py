@@ -0,0 +1,8 @@
+from core.settings import PluginConfig
+
+
+def test_fields_grouped_into_known_tabs():
+    groups = [meta.get("group", "main") for meta in PluginConfig.FIELDS.values()]
+    assert set(groups) <= set(PluginConfig.GROUPS)
+    # Ни одна вкладка не разрастается до плоского списка всех полей
+    assert max(groups.count(group) for group in PluginConfig.GROUPS) <= 20
@@ -0,0 +1,15 @@
+from core.sweep import Sweep
+
+
+def test_parse_values():
+    assert Sweep.parse_values("", 900) == [900]
+    assert Sweep.parse_values(" 100, 200,300 ", 900) == [100, 200, 300]
+    # Диапазон с концом включительно
+    assert Sweep.parse_values("100:300:100", 900) == [100, 200, 300]
+    assert Sweep.parse_values("100:250:100", 900) == [100, 200]
+
+
+def test_parse_values_malformed(capsys):
+    for text in ("100,,abc", "abc", "100:200", "300:100:50", "100:200:0"):
+        assert Sweep.parse_values(text, 900) == [900]
+        assert f"Неверный диапазон '{text}'" in capsys.readouterr().out
@@ -0,0 +1,67 @@
+import struct
+
+import numpy as np
+import pytest
+
+from core.toolpath import HEADER_FORMAT_V1, HEADER_SIZE, HEADER_SIZE_V1, TOOLPATH_MAGIC, Toolpath
+
+PATHS = [
+    [[(0, 0), (1000, 0), (1000, 1000), (0, 0)], [(200, 200), (300, 200)]],
+    [[(5000, 5000), (6000, 7000)]],
+]
+OUTLINE = (-100, -200, 7000, 8000)
+MARKS = [(500, 500), (5500, 6000)]
+
+
+def test_round_trip(tmp_path):
+    filename = tmp_path / "board.ltp"
+    # iter_write пропускает фигуры дальше без изменений
+    assert list(Toolpath.iter_write(PATHS, filename, OUTLINE, MARKS)) == PATHS
+    toolpath = Toolpath(filename)
+    assert len(toolpath) == len(PATHS)
+    assert [[contour.tolist() for contour in figure] for figure in toolpath.iter_paths()] == \
+        [[[list(point) for point in contour] for contour in figure] for figure in PATHS]
+    assert toolpath.outline == OUTLINE
+    assert toolpath.marks.tolist() == [list(mark) for mark in MARKS]
+    assert toolpath.figures["bounds"].tolist() == [[0, 0, 1000, 1000], [5000, 5000, 6000, 7000]]
+
+
+def test_empty_round_trip(tmp_path):
+    filename = tmp_path / "empty.ltp"
+    Toolpath.save([], filename)
+    toolpath = Toolpath(filename)
+    assert len(toolpath) == 0 and toolpath.outline is None and len(toolpath.marks) == 0
+
+
+def test_v1_file_without_outline_and_marks(tmp_path):
+    # Версия 1 читается: габарита и меток в ней нет
+    filename = tmp_path / "v1.ltp"
+    points = np.array([(0, 0), (1000, 0)], dtype="<i4")
+    contours = np.array([0, 2], dtype="<i8")
+    figures = np.array([0, 1], dtype="<i8")
+    meta = np.array([(0, 0, 1000, 0)], dtype="<i4")
+    contours_pos = HEADER_SIZE_V1 + points.nbytes
+    figures_pos = contours_pos + contours.nbytes
+    meta_pos = figures_pos + figures.nbytes
+    with open(filename, "wb") as f:
+        header = struct.pack(HEADER_FORMAT_V1, TOOLPATH_MAGIC, 1, 2, 1, 1, contours_pos, figures_pos, meta_pos)
+        f.write(header.ljust(HEADER_SIZE_V1, b"\0"))
+        for section in (points, contours, figures, meta):
+            f.write(section.tobytes())
+    toolpath = Toolpath(filename)
+    assert toolpath.get_figure(0)[0].tolist() == [[0, 0], [1000, 0]]
+    assert toolpath.outline is None and len(toolpath.marks) == 0
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:10],
+    lambda data: b"XXXX" + data[4:],
+    lambda data: data[:4] + struct.pack("<I", 99) + data[8:],
+    lambda data: data[:HEADER_SIZE + 8],
+])
+def test_corrupt_header_rejected(tmp_path, corrupt):
+    filename = tmp_path / "board.ltp"
+    Toolpath.save(PATHS, filename, OUTLINE, MARKS)
+    filename.write_bytes(corrupt(filename.read_bytes()))
+    with pytest.raises(ValueError):
+        Toolpath(filename)
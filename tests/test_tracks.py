@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from shapely import LineString, box
+
+from core.tracks import TrackPaths
+
+STEP = 25000
+IDENTITY = [1, 0, 0, 1, 0, 0]
+TRACK = np.array([(0, 0, 2000000, 0, 175000)], dtype=float)
+# Пад на конце дорожки
+PAD = box(1500000, -300000, 2500000, 300000)
+
+
+@pytest.mark.parametrize("width, levels", [(50000, 0), (100000, 1), (175000, 3), (200000, 3)])
+def test_levels_below_half_width(width, levels):
+    assert TrackPaths.get_levels(width, STEP) == levels
+
+
+def test_merge_lines_by_width():
+    segments = np.array([
+        (0, 0, 1000, 0, 100), (1000, 0, 2000, 0, 100),  # стыкуются в одну цепочку
+        (0, 500, 1000, 500, 200),  # другая ширина
+        (3000, 0, 3000, 0, 100),  # нулевая длина
+    ], dtype=float)
+    chains = sorted((width, line.length) for line, width in TrackPaths.merge_lines(segments))
+    assert chains == [(100, 2000), (200, 1000)]
+
+
+def test_cap_is_half_circle_around_end():
+    points = np.array(TrackPaths.get_cap((0, 0), (1, 0), np.pi / 2, -np.pi / 2, 10, 10))
+    assert np.allclose(np.hypot(points[:, 0], points[:, 1]), 10)
+    assert (points[:, 0] > 0).all()
+    # Радиус меняется линейно от начального к конечному
+    points = np.array(TrackPaths.get_cap((0, 0), (1, 0), np.pi / 2, -np.pi / 2, 10, 20))
+    assert np.all(np.diff(np.hypot(points[:, 0], points[:, 1])) > 0)
+
+
+def test_chain_path_stays_inside_track():
+    line = LineString([(0, 0), (2000000, 0)])
+    path = LineString(TrackPaths.get_chain_path(line, 175000, STEP))
+    assert line.buffer(175000 / 2 - STEP + 1).contains(path)
+
+
+def test_paths_clipped_by_other_copper():
+    paths = TrackPaths.generate_paths(TRACK, STEP, IDENTITY, copper=PAD)
+    assert paths
+    for figure in paths:
+        for contour in figure:
+            assert LineString(contour).intersection(PAD.buffer(-1)).length == 0
+    figures = []
+    TrackPaths.generate_paths(TRACK, STEP, IDENTITY, copper=PAD,
+                              listener=lambda figure, figure_paths: figures.append(figure))
+    assert figures[0].intersection(PAD).area < 1
+
+
+def test_short_pieces_dropped():
+    assert TrackPaths.generate_paths(TRACK, STEP, IDENTITY, copper=PAD)
+    # Все куски пути короче 20 мм
+    assert not TrackPaths.generate_paths(TRACK, STEP, IDENTITY, copper=PAD, min_length_um=20000)
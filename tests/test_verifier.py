@@ -0,0 +1,54 @@
+import numpy as np
+from shapely import box
+
+from core.geometry import GeometryTool
+from core.tracks import TrackPaths
+from core.verifier import CoverageVerifier
+
+STEP = 25000
+PIXEL = 2000
+
+
+def get_pads():
+    return [box(x, 0, x + 400000, 275000) for x in range(0, 4000000, 800000)]
+
+
+def add_pads(verifier):
+    for pad in get_pads():
+        verifier.add_figure(pad, GeometryTool.generate_inset_paths(pad, STEP, 0, True))
+
+
+def test_pads_covered():
+    verifier = CoverageVerifier(STEP, PIXEL)
+    add_pads(verifier)
+    result = verifier.verify()
+    assert len(result["copper"]) == 5
+    assert result["uncovered"].sum() < result["copper"].sum() * 1e-2
+    assert not result["over_exposed"].sum()
+
+
+def test_batches_match_single_pass():
+    single = CoverageVerifier(STEP, PIXEL)
+    add_pads(single)
+    batched = CoverageVerifier(STEP, PIXEL, batch_points=50)
+    add_pads(batched)
+    assert not batched.figures or len(batched.figures) < 5
+    single, batched = single.verify(), batched.verify()
+    assert np.allclose(single["copper"], batched["copper"], rtol=1e-2)
+    assert np.allclose(single["uncovered"], batched["uncovered"], atol=PIXEL ** 2 * 50)
+
+
+def test_track_paths_verified():
+    # Т-образный стык двух дорожек: медь цепочек без перекрытий, пути покрывают ее целиком
+    tracks = np.array([(0, 0, 3000000, 0, 175000), (1500000, 0, 1500000, 2000000, 175000)], dtype=float)
+    figures = []
+    TrackPaths.generate_paths(tracks, STEP, [1, 0, 0, 1, 0, 0],
+                              listener=lambda figure, figure_paths: figures.append((figure, figure_paths)))
+    assert len(figures) == 2
+    assert figures[0][0].intersection(figures[1][0]).area < 1
+    verifier = CoverageVerifier(STEP, PIXEL)
+    for figure, figure_paths in figures:
+        verifier.add_figure(figure, figure_paths)
+    result = verifier.verify()
+    assert result["copper"].sum() > 0
+    assert result["uncovered"].sum() < result["copper"].sum() * 1e-2